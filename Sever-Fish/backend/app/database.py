@@ -1,14 +1,22 @@
 # app/database.py
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
+import threading
+import time
 from decimal import Decimal
-from typing import Dict, Any
+from typing import AsyncGenerator, Dict, Any, Optional
 import logging
 
-from app.utils.config import DATABASE_URL
+from app.utils.config import (
+    DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    PG_POOL_MIN, PG_POOL_MAX, PG_POOL_TIMEOUT, PG_POOL_HEALTH_CHECK
+)
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +25,10 @@ try:
     engine = create_engine(
         DATABASE_URL,
         pool_pre_ping=True,  # Проверка соединения перед запросом
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
         echo=False  # Установите True для вывода SQL-запросов в лог
     )
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -27,6 +39,37 @@ except Exception as e:
     raise
 
 
+def get_async_database_url(url: str = DATABASE_URL) -> str:
+    """
+    Возвращает DATABASE_URL с асинхронным драйвером asyncpg
+    """
+    return make_url(url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+
+# Асинхронный engine для обработчиков, которые не должны блокировать event loop
+try:
+    async_engine = create_async_engine(
+        get_async_database_url(),
+        pool_pre_ping=True,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        echo=False
+    )
+    # expire_on_commit=False: после commit атрибуты объектов остаются доступными
+    # без повторной (синхронной) загрузки при сериализации ответа
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False
+    )
+except Exception as e:
+    logger.error(f"Error creating async SQLAlchemy engine: {e}")
+    raise
+
+
 def get_db():
     """
     Dependency для получения сессии БД.
@@ -39,31 +82,142 @@ def get_db():
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency для получения асинхронной сессии БД.
+    Используется с Depends(get_async_db) в async-обработчиках.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+class PsycopgPool:
+    """
+    Пул «сырых» psycopg2 соединений на основе ThreadedConnectionPool.
+    При исчерпании пула запрос ждет свободное соединение до PG_POOL_TIMEOUT секунд,
+    перед выдачей соединение проверяется и при необходимости заменяется.
+    """
+
+    def __init__(self, url: str, minconn: int, maxconn: int, timeout: float):
+        self.url = url
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._pool: Optional[psycopg2.pool.ThreadedConnectionPool] = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "checkouts": 0,
+            "in_use": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "discarded": 0,
+        }
+
+    def connect_kwargs(self) -> Dict[str, Any]:
+        # Тот же разбор URL, что и у SQLAlchemy engine (включая %-экранирование пароля)
+        return make_url(self.url).translate_connect_args(username="user", database="dbname")
+
+    def _get_pool(self) -> psycopg2.pool.ThreadedConnectionPool:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = psycopg2.pool.ThreadedConnectionPool(
+                        self.minconn, self.maxconn, **self.connect_kwargs()
+                    )
+                    logger.info(f"psycopg2 connection pool created (min={self.minconn}, max={self.maxconn})")
+        return self._pool
+
+    def _count(self, name: str, value: float = 1):
+        with self._stats_lock:
+            self.stats[name] += value
+
+    def _is_healthy(self, connection) -> bool:
+        if connection.closed:
+            return False
+        if not PG_POOL_HEALTH_CHECK:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        started = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            self._count("waits")
+            if not self._slots.acquire(timeout=self.timeout):
+                self._count("timeouts")
+                raise psycopg2.pool.PoolError(
+                    f"Нет свободных соединений в пуле за {self.timeout} с"
+                )
+            waited = time.monotonic() - started
+            with self._stats_lock:
+                self.stats["wait_time_total"] += waited
+                self.stats["wait_time_max"] = max(self.stats["wait_time_max"], waited)
+
+        try:
+            pool = self._get_pool()
+            connection = pool.getconn()
+            if not self._is_healthy(connection):
+                self._count("discarded")
+                pool.putconn(connection, close=True)
+                connection = pool.getconn()
+            connection.autocommit = True
+        except Exception:
+            self._slots.release()
+            raise
+
+        self._count("checkouts")
+        self._count("in_use")
+        return connection
+
+    def putconn(self, connection):
+        try:
+            self._get_pool().putconn(connection, close=connection.closed != 0)
+        finally:
+            self._count("in_use", -1)
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+                logger.info("psycopg2 connection pool closed")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "min": self.minconn,
+            "max": self.maxconn,
+            "initialized": self._pool is not None,
+            **self.stats,
+            "wait_time_total": round(self.stats["wait_time_total"], 3),
+            "wait_time_max": round(self.stats["wait_time_max"], 3),
+        }
+
+
+psycopg_pool = PsycopgPool(DATABASE_URL, PG_POOL_MIN, PG_POOL_MAX, PG_POOL_TIMEOUT)
+
+
 def get_psycopg_db():
     """
-    Dependency для получения psycopg2 соединения (для обратной совместимости)
+    Dependency для получения psycopg2 соединения из пула (для обратной совместимости)
     """
     try:
-        # Используем те же настройки, что и в DATABASE_URL
-        conn_params = DATABASE_URL.replace('postgresql+psycopg2://', '').split('@')
-        user_pass = conn_params[0].split(':')
-        host_db = conn_params[1].split('/')
-
-        connection = psycopg2.connect(
-            host=host_db[0].split(':')[0],
-            port=host_db[0].split(':')[1] if ':' in host_db[0] else 5432,
-            user=user_pass[0],
-            password=user_pass[1],
-            dbname=host_db[1]
-        )
-        connection.autocommit = True
-        yield connection
+        connection = psycopg_pool.getconn()
     except Exception as e:
         logger.error(f"Error connecting to database with psycopg2: {str(e)}")
         raise
+    try:
+        yield connection
     finally:
-        if 'connection' in locals():
-            connection.close()
+        psycopg_pool.putconn(connection)
 
 
 def row_to_dict(row, cursor_description) -> Dict[str, Any]:
@@ -1,7 +1,6 @@
 # app/main.py
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
 from starlette.middleware.sessions import SessionMiddleware
 import logging
@@ -12,7 +11,11 @@ from datetime import datetime
 
 from app.routers import auth, products, cart, orders, users
 from app.api.api import api_router
-from app.services import ais_integration, discount_service
+from app.database import engine, psycopg_pool
+from app.services import ais_integration, discount_service, image_pipeline
+from app.services.cart_pricing import cart_summary_cache
+from app.services.catalog_projection import catalog_projection
+from app.utils.images import ImmutableStaticFiles
 from app.utils.config import (
     PORT, HOST, PRODUCTS_IMAGES_DIR, SECRET_KEY, DEBUG,
     PROJECT_NAME, PROJECT_VERSION, ALLOWED_HOSTS,
@@ -53,6 +56,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Заголовки курсорной пагинации каталога должны быть доступны фронтенду
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Total-Count-Exact", "ETag"],
 )
 
 # Добавляем поддержку сессий
@@ -119,6 +124,8 @@ async def startup_event():
 async def shutdown_event():
     """Выполняется при остановке приложения"""
     logger.info("Остановка приложения")
+    psycopg_pool.close()
+    image_pipeline.shutdown()
 
 
 # Монтирование основных маршрутов под двумя префиксами (для обратной совместимости)
@@ -137,15 +144,16 @@ if API_GATEWAY_ENABLED:
     app.include_router(api_router, prefix="/sever-ryba")
 
 # Монтирование статических файлов для изображений продуктов
+# (варианты с хешем содержимого в имени отдаются с immutable-кешированием)
 if os.path.exists(PRODUCTS_IMAGES_DIR):
-    app.mount("/images", StaticFiles(directory=PRODUCTS_IMAGES_DIR), name="images")
+    app.mount("/images", ImmutableStaticFiles(directory=PRODUCTS_IMAGES_DIR), name="images")
     logger.info(f"Mounted images directory: {PRODUCTS_IMAGES_DIR}")
 else:
     logger.warning(f"Products images directory not found: {PRODUCTS_IMAGES_DIR}")
     # Создаем директорию, если её нет
     os.makedirs(PRODUCTS_IMAGES_DIR, exist_ok=True)
     logger.info(f"Created products images directory: {PRODUCTS_IMAGES_DIR}")
-    app.mount("/images", StaticFiles(directory=PRODUCTS_IMAGES_DIR), name="images")
+    app.mount("/images", ImmutableStaticFiles(directory=PRODUCTS_IMAGES_DIR), name="images")
 
 
 @app.get("/")
@@ -185,6 +193,7 @@ async def get_routes():
         {"path": "/api/cart/{cart_id}", "method": "DELETE", "description": "Удалить товар из корзины"},
         {"path": "/api/cart", "method": "DELETE", "description": "Очистить корзину"},
         {"path": "/api/cart/count", "method": "GET", "description": "Получить количество товаров в корзине"},
+        {"path": "/api/cart/summary", "method": "GET", "description": "Корзина с ценами, скидками и итогами"},
         {"path": "/api/orders", "method": "GET", "description": "Получить заказы пользователя"},
         {"path": "/api/orders", "method": "POST", "description": "Создать новый заказ"},
         {"path": "/api/orders/{order_id}", "method": "GET", "description": "Получить данные заказа"},
@@ -222,6 +231,39 @@ async def ais_integration_status():
         )
 
 
+@app.get("/db-pool-status")
+async def db_pool_status():
+    """Состояние пулов соединений с БД"""
+    return {
+        "sqlalchemy": {
+            "size": engine.pool.size(),
+            "checked_out": engine.pool.checkedout(),
+            "overflow": engine.pool.overflow(),
+        },
+        "psycopg2": psycopg_pool.status(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+@app.get("/catalog-status")
+async def catalog_status():
+    """Состояние проекции каталога (готовые страницы списка товаров)"""
+    return {
+        **catalog_projection.stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+@app.get("/discount-status")
+async def discount_status():
+    """Состояние индекса правил скидок и кеша расчета корзин"""
+    return {
+        **discount_service.discount_index.stats(),
+        "cart_summary_cache": cart_summary_cache.stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
 # Запуск сервера через функцию для удобства разработки
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host=HOST, port=PORT, reload=DEBUG)
\ No newline at end of file
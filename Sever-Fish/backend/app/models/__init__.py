@@ -8,6 +8,7 @@ from app.models.user import User
 from app.models.product import Product, Category
 from app.models.cart import CartItem
 from app.models.order import Order, OrderItem
+from app.models.discount import Discount
 
 # Теперь определим отношения между моделями
 # Это нужно делать после того, как все классы импортированы
@@ -0,0 +1,30 @@
+# app/models/discount.py
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean
+from sqlalchemy.sql import func
+
+from app.database import Base
+
+
+class Discount(Base):
+    """
+    Скидка на товар или категорию либо промо-код на корзину.
+    Окно действия starts_at/ends_at задается в UTC; пустая граница - без ограничения.
+    """
+    __tablename__ = "discounts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=True)
+    # product | category | promo
+    scope = Column(String(20), nullable=False)
+    # ID товара или категории для scope product/category
+    target_id = Column(Integer, nullable=True)
+    # Промо-код (в верхнем регистре) для scope promo
+    code = Column(String(50), nullable=True, unique=True)
+    # percentage | fixed
+    discount_type = Column(String(20), nullable=False, default="percentage")
+    value = Column(Float, nullable=False)
+    starts_at = Column(DateTime, nullable=True)
+    ends_at = Column(DateTime, nullable=True)
+    is_active = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
@@ -1,6 +1,6 @@
 # app/models/order.py
-from sqlalchemy import Column, ForeignKey, Integer, String, Float, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, ForeignKey, Integer, String, Float, DateTime, Text
+from sqlalchemy.orm import relationship, synonym
 from datetime import datetime
 
 from app.database import Base
@@ -14,6 +14,16 @@ class Order(Base):
     status = Column(String, default="pending")
     created_at = Column(DateTime, default=datetime.now)
     total_amount = Column(Float)
+    # API отдает сумму заказа как total
+    total = synonym("total_amount")
+
+    # Поля доставки и контактной информации (миграция 458fca4f9a75 в АИС)
+    delivery_address = Column(String(255))
+    phone = Column(String(20))
+    email = Column(String(100))
+    name = Column(String(100))
+    comment = Column(Text)
+    payment_method = Column(String(50), server_default='cash')
 
     user = relationship("User", back_populates="orders")
     items = relationship("OrderItem", back_populates="order")
@@ -24,9 +34,11 @@ class OrderItem(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(Integer, ForeignKey("orders.id"))
-    product_id = Column(Integer, ForeignKey("products.id"))
+    # NULL, если товар удален из каталога (название и цена остаются в позиции)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="SET NULL"), nullable=True)
     quantity = Column(Integer)
     price = Column(Float)  # Цена на момент заказа
+    product_name = Column(String)  # Название на момент заказа
 
     order = relationship("Order", back_populates="items")
     product = relationship("Product", back_populates="order_items")
\ No newline at end of file
@@ -1,10 +1,11 @@
 # app/models/product.py
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from sqlalchemy.sql import func
 
 from app.database import Base
+from app.utils.images import image_variant_urls
 
 
 class Category(Base):
@@ -31,10 +32,17 @@ class Product(Base):
     image_url = Column(String, nullable=True)
     # Добавляем поле weight
     weight = Column(String(50), nullable=True)
+    # Манифест вариантов изображения (миниатюра, AVIF/WebP/JPEG по ширинам)
+    image_variants = Column(JSON, nullable=True)
     created_at = Column(DateTime, default=func.now())
 
 
     category = relationship("Category", back_populates="products")
     # Используем строковые литералы для всех отношений
     cart_items = relationship("CartItem", back_populates="product")
-    order_items = relationship("OrderItem", back_populates="product")
\ No newline at end of file
+    order_items = relationship("OrderItem", back_populates="product")
+
+    @property
+    def images(self):
+        """Адреса вариантов изображения для ответов API (None, если не обработано)"""
+        return image_variant_urls(self.image_variants)
\ No newline at end of file
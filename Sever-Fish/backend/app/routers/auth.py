@@ -9,6 +9,7 @@ from pydantic import BaseModel, EmailStr
 from app.database import get_db
 from app.models import User
 from app.schemas import Token, ApiResponse, UserProfile
+from app.services.cart_store import merge_anonymous_cart
 from app.utils.auth import (
     verify_password, create_access_token, get_password_hash,
     decode_token, extract_token_from_header
@@ -30,6 +31,17 @@ router = APIRouter(prefix="/auth", tags=["Authentication"])
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 
+async def merge_cart_on_login(request: Request, user_id: int) -> None:
+    """
+    Переносит анонимную корзину сессии в корзину пользователя.
+    Ошибка переноса не должна мешать входу, поэтому только логируется.
+    """
+    try:
+        await merge_anonymous_cart(request, user_id)
+    except Exception as e:
+        logger.error(f"Ошибка при объединении корзин пользователя {user_id}: {str(e)}")
+
+
 # Модель для входа через JSON
 class LoginRequest(BaseModel):
     email: str
@@ -58,6 +70,7 @@ class PasswordResetConfirm(BaseModel):
 @router.post("/register", response_model=Token)
 async def register(
         user_data: RegisterRequest,
+        request: Request,
         db: Session = Depends(get_db)
 ):
     """
@@ -102,6 +115,8 @@ async def register(
         token_data = {"sub": user_data.email, "user_id": new_user.id}
         access_token = create_access_token(token_data)
 
+        await merge_cart_on_login(request, new_user.id)
+
         return {
             "access_token": access_token,
             "token_type": "bearer"
@@ -121,6 +136,7 @@ async def register(
 @router.post("/login", response_model=Token)
 async def login(
         login_data: LoginRequest,
+        request: Request,
         db: Session = Depends(get_db)
 ):
     """
@@ -152,6 +168,8 @@ async def login(
         token_data = {"sub": user.email, "user_id": user.id}
         access_token = create_access_token(data=token_data)
 
+        await merge_cart_on_login(request, user.id)
+
         return {
             "access_token": access_token,
             "token_type": "bearer"
@@ -169,6 +187,7 @@ async def login(
 
 @router.post("/oauth/token", response_model=Token)
 async def login_oauth(
+        request: Request,
         form_data: OAuth2PasswordRequestForm = Depends(),
         db: Session = Depends(get_db)
 ):
@@ -200,6 +219,8 @@ async def login_oauth(
     token_data = {"sub": user.email, "user_id": user.id}
     access_token = create_access_token(data=token_data)
 
+    await merge_cart_on_login(request, user.id)
+
     return {
         "access_token": access_token,
         "token_type": "bearer"
@@ -1,15 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Header
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Header, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Any, List, Optional
-from datetime import datetime
 import logging
 from pydantic import BaseModel  # Добавлен импорт BaseModel
 
 from starlette import status
 
-from app.database import get_db
+from app.database import get_async_db
 from app.models import Product
-from app.schemas import CartItemCreate, CartItemResponse, CartItemUpdate, ApiResponse
+from app.schemas import CartItemCreate, CartItemResponse, CartItemUpdate, CartSummaryResponse, ApiResponse
+from app.services.cart_pricing import summarize_cart
+from app.services.cart_store import CartLimitError, open_cart, merge_anonymous_cart
+from app.services.product_loader import load_products
 from app.utils.auth import extract_token_from_header, decode_token
 
 class ApiResponse(BaseModel):
@@ -26,75 +28,62 @@ router = APIRouter()
 MAX_QUANTITY = 99
 
 
+def get_user_id(authorization: Optional[str]) -> Optional[int]:
+    """
+    Извлекает user_id из заголовка Authorization.
+    При отсутствии или ошибке проверки токена возвращает None (анонимная корзина).
+    """
+    if not authorization:
+        return None
+
+    try:
+        token = extract_token_from_header(authorization)
+        if token:
+            # Проверяем токен и получаем user_id
+            payload = decode_token(token)
+            if payload and "user_id" in payload:
+                return payload.get('user_id')
+    except Exception as e:
+        # В случае ошибки проверки токена - продолжаем без авторизации
+        logger.error(f"Ошибка проверки токена: {e}")
+
+    return None
+
+
 @router.post("/", response_model=CartItemResponse)
 async def add_to_cart(
         cart_item: CartItemCreate,
         request: Request,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
         authorization: Optional[str] = Header(None)
 ):
     """
     Добавляет товар в корзину пользователя.
-    Если пользователь авторизован, корзина сохраняется в сессии с привязкой к user_id.
-    Если пользователь не авторизован, корзина сохраняется в анонимной сессии.
+    Если пользователь авторизован, корзина хранится в БД (cart_items).
+    Если пользователь не авторизован, корзина хранится на сервере,
+    а в сессии остается только ее идентификатор.
     """
     # Проверка существования продукта
-    product = db.query(Product).filter(Product.id == cart_item.product_id).first()
+    product = await db.get(Product, cart_item.product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Товар не найден")
 
-    # Инициализируем user_id как None
-    user_id = None
-
-    # Если передан токен авторизации, пытаемся извлечь user_id
-    if authorization:
-        try:
-            auth_parts = authorization.split()
-            if len(auth_parts) == 2 and auth_parts[0].lower() == 'bearer':
-                token = auth_parts[1]
-                # Проверяем токен и получаем user_id
-                payload = decode_token(token)
-                if payload and "user_id" in payload:
-                    user_id = payload.get('user_id')
-        except Exception as e:
-            # В случае ошибки проверки токена - продолжаем без авторизации
-            logger.error(f"Ошибка проверки токена: {e}")
-            pass
-
-    # Получаем корзину из сессии, связанную с user_id, если он есть
-    cart_key = f'cart_{user_id}' if user_id else 'cart'
-    cart = request.session.get(cart_key, [])
-
-    # Проверяем, есть ли уже такой товар в корзине
-    for item in cart:
-        if item['product_id'] == cart_item.product_id:
-            # Обновляем количество
-            new_quantity = item['quantity'] + cart_item.quantity
-            if new_quantity > MAX_QUANTITY:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Максимальное количество товара - {MAX_QUANTITY}"
-                )
-            item['quantity'] = new_quantity
-            # Добавляем время обновления
-            item['updated_at'] = datetime.utcnow().isoformat()
-            break
-    else:
-        # Если товара нет, добавляем новый
-        cart.append({
-            'product_id': cart_item.product_id,
-            'quantity': cart_item.quantity,
-            'added_at': datetime.utcnow().isoformat()
-        })
-
-    # Сохраняем корзину в сессии
-    request.session[cart_key] = cart
-
-    # Возвращаем добавленный товар с информацией о продукте
+    user_id = get_user_id(authorization)
+    store, cart_id = await open_cart(request, db, user_id, create=True)
+
+    try:
+        item = await store.add_item(cart_id, cart_item.product_id, cart_item.quantity, MAX_QUANTITY)
+    except CartLimitError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Максимальное количество товара - {MAX_QUANTITY}"
+        )
+
+    # Возвращаем позицию корзины (итоговое количество) с информацией о продукте
     return {
-        'id': len(cart) - 1,  # Индекс последнего элемента
-        'product_id': cart_item.product_id,
-        'quantity': cart_item.quantity,
+        'id': item['id'],
+        'product_id': item['product_id'],
+        'quantity': item['quantity'],
         'user_id': user_id,
         'product': product
     }
@@ -103,49 +92,32 @@ async def add_to_cart(
 @router.get("/", response_model=List[CartItemResponse])
 async def get_cart(
         request: Request,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
         authorization: Optional[str] = Header(None)
 ):
     """
     Получает содержимое корзины пользователя.
     Если пользователь авторизован, возвращает корзину, связанную с user_id.
-    Если пользователь не авторизован, возвращает корзину из анонимной сессии.
+    Если пользователь не авторизован, возвращает анонимную корзину текущей сессии.
     """
-    # Инициализируем user_id как None
-    user_id = None
-
-    # Если передан токен авторизации, пытаемся извлечь user_id
-    if authorization:
-        try:
-            auth_parts = authorization.split()
-            if len(auth_parts) == 2 and auth_parts[0].lower() == 'bearer':
-                token = auth_parts[1]
-                # Проверяем токен и получаем user_id
-                payload = decode_token(token)
-                if payload and "user_id" in payload:
-                    user_id = payload.get('user_id')
-        except Exception as e:
-            # В случае ошибки проверки токена - продолжаем без авторизации
-            logger.error(f"Ошибка проверки токена: {e}")
-            pass
-
-    # Получаем корзину из сессии, связанную с user_id, если он есть
-    cart_key = f'cart_{user_id}' if user_id else 'cart'
-    cart = request.session.get(cart_key, [])
-
-    # Загружаем полную информацию о продуктах
+    user_id = get_user_id(authorization)
+    store, cart_id = await open_cart(request, db, user_id)
+    cart = await store.get_items(cart_id)
+
+    # Загружаем полную информацию о продуктах одним запросом
+    products = await load_products(db, (item['product_id'] for item in cart))
+
     cart_with_products = []
-    for index, item in enumerate(cart):
-        product = db.query(Product).filter(Product.id == item['product_id']).first()
+    for item in cart:
+        product = products.get(item['product_id'])
         if product:  # Проверяем, что продукт существует
             # Проверяем наличие на складе и обновляем quantity если необходимо
             if product.stock_quantity < item['quantity']:
                 item['quantity'] = product.stock_quantity
-                cart[index]['quantity'] = product.stock_quantity
-                request.session[cart_key] = cart
+                await store.set_quantity(cart_id, item['id'], product.stock_quantity)
 
             cart_with_products.append({
-                'id': index,
+                'id': item['id'],
                 'product_id': item['product_id'],
                 'quantity': item['quantity'],
                 'user_id': user_id,
@@ -156,16 +128,46 @@ async def get_cart(
     return cart_with_products
 
 
+@router.get("/summary", response_model=CartSummaryResponse)
+async def get_cart_summary(
+        request: Request,
+        promo_code: Optional[str] = Query(None, max_length=50, description="Промо-код на сумму корзины"),
+        db: AsyncSession = Depends(get_async_db),
+        authorization: Optional[str] = Header(None)
+):
+    """
+    Возвращает корзину с ценами: скидки по позициям, эффект промо-кода и итоги.
+    Расчет кешируется до изменения корзины, правил скидок или цен каталога.
+    """
+    user_id = get_user_id(authorization)
+    store, cart_id = await open_cart(request, db, user_id)
+    items = await store.get_items(cart_id)
+
+    cart_key = None
+    if cart_id is not None:
+        cart_key = ("user", cart_id) if user_id else ("session", cart_id)
+
+    try:
+        return await summarize_cart(db, cart_key, items, promo_code)
+    except Exception as e:
+        logger.error(f"Ошибка при расчете корзины: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка сервера при расчете корзины: {str(e)}"
+        )
+
+
 @router.put("/{cart_id}", response_model=CartItemResponse)
 async def update_cart_quantity(
         cart_id: int,
         item_update: CartItemUpdate,
         request: Request,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
         authorization: Optional[str] = Header(None)
 ):
     """
     Обновляет количество товара в корзине.
+    cart_id - идентификатор позиции корзины (поле id из GET /cart).
     """
     # Проверка количества
     if item_update.quantity < 1 or item_update.quantity > MAX_QUANTITY:
@@ -174,39 +176,16 @@ async def update_cart_quantity(
             detail=f"Количество должно быть от 1 до {MAX_QUANTITY}"
         )
 
-    # Инициализируем user_id как None
-    user_id = None
-
-    # Если передан токен авторизации, пытаемся извлечь user_id
-    if authorization:
-        try:
-            auth_parts = authorization.split()
-            if len(auth_parts) == 2 and auth_parts[0].lower() == 'bearer':
-                token = auth_parts[1]
-                # Проверяем токен и получаем user_id
-                payload = decode_token(token)
-                if payload and "user_id" in payload:
-                    user_id = payload.get('user_id')
-        except Exception as e:
-            # В случае ошибки проверки токена - продолжаем без авторизации
-            logger.error(f"Ошибка проверки токена: {e}")
-            pass
-
-    # Получаем корзину из сессии, связанную с user_id, если он есть
-    cart_key = f'cart_{user_id}' if user_id else 'cart'
-    cart = request.session.get(cart_key, [])
-
-    # Проверяем, что cart_id корректный
-    if cart_id < 0 or cart_id >= len(cart):
-        raise HTTPException(status_code=404, detail="Товар в корзине не найден")
+    user_id = get_user_id(authorization)
+    store, cart_key = await open_cart(request, db, user_id)
 
-    # Обновляем количество
-    cart[cart_id]['quantity'] = item_update.quantity
-    cart[cart_id]['updated_at'] = datetime.utcnow().isoformat()
-    request.session[cart_key] = cart
+    # Находим позицию корзины
+    item = next((entry for entry in await store.get_items(cart_key) if entry['id'] == cart_id), None)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Товар в корзине не найден")
 
     # Загружаем информацию о продукте
-    product = db.query(Product).filter(Product.id == cart[cart_id]['product_id']).first()
+    product = await db.get(Product, item['product_id'])
 
     if not product:
         raise HTTPException(status_code=404, detail="Товар не найден в базе данных")
@@ -218,14 +197,19 @@ async def update_cart_quantity(
             detail=f"Недостаточно товара на складе. В наличии: {product.stock_quantity}"
         )
 
+    # Обновляем количество
+    item = await store.set_quantity(cart_key, cart_id, item_update.quantity)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Товар в корзине не найден")
+
     return {
         'id': cart_id,
-        'product_id': cart[cart_id]['product_id'],
+        'product_id': item['product_id'],
         'quantity': item_update.quantity,
         'user_id': user_id,
         'product': product,
-        'added_at': cart[cart_id].get('added_at'),
-        'updated_at': cart[cart_id].get('updated_at')
+        'added_at': item.get('added_at'),
+        'updated_at': item.get('updated_at')
     }
 
 
@@ -233,40 +217,19 @@ async def update_cart_quantity(
 async def remove_from_cart(
         cart_id: int,
         request: Request,
+        db: AsyncSession = Depends(get_async_db),
         authorization: Optional[str] = Header(None)
 ):
     """
     Удаляет товар из корзины.
     """
-    # Инициализируем user_id как None
-    user_id = None
-
-    # Если передан токен авторизации, пытаемся извлечь user_id
-    if authorization:
-        try:
-            auth_parts = authorization.split()
-            if len(auth_parts) == 2 and auth_parts[0].lower() == 'bearer':
-                token = auth_parts[1]
-                # Проверяем токен и получаем user_id
-                payload = decode_token(token)
-                if payload and "user_id" in payload:
-                    user_id = payload.get('user_id')
-        except Exception as e:
-            # В случае ошибки проверки токена - продолжаем без авторизации
-            logger.error(f"Ошибка проверки токена: {e}")
-            pass
-
-    # Получаем корзину из сессии, связанную с user_id, если он есть
-    cart_key = f'cart_{user_id}' if user_id else 'cart'
-    cart = request.session.get(cart_key, [])
-
-    # Проверяем, что cart_id корректный
-    if cart_id < 0 or cart_id >= len(cart):
-        raise HTTPException(status_code=404, detail="Товар в корзине не найден")
+    user_id = get_user_id(authorization)
+    store, cart_key = await open_cart(request, db, user_id)
 
     # Удаляем товар
-    removed_item = cart.pop(cart_id)
-    request.session[cart_key] = cart
+    removed_item = await store.remove_item(cart_key, cart_id)
+    if removed_item is None:
+        raise HTTPException(status_code=404, detail="Товар в корзине не найден")
 
     return {
         "success": True,
@@ -278,38 +241,17 @@ async def remove_from_cart(
 @router.delete("/", response_model=ApiResponse)
 async def clear_cart(
         request: Request,
+        db: AsyncSession = Depends(get_async_db),
         authorization: Optional[str] = Header(None)
 ):
     """
     Очищает корзину пользователя.
     """
-    # Инициализируем user_id как None
-    user_id = None
-
-    # Если передан токен авторизации, пытаемся извлечь user_id
-    if authorization:
-        try:
-            auth_parts = authorization.split()
-            if len(auth_parts) == 2 and auth_parts[0].lower() == 'bearer':
-                token = auth_parts[1]
-                # Проверяем токен и получаем user_id
-                payload = decode_token(token)
-                if payload and "user_id" in payload:
-                    user_id = payload.get('user_id')
-        except Exception as e:
-            # В случае ошибки проверки токена - продолжаем без авторизации
-            logger.error(f"Ошибка проверки токена: {e}")
-            pass
-
-    # Получаем ключ корзины, связанный с user_id, если он есть
-    cart_key = f'cart_{user_id}' if user_id else 'cart'
-
-    # Получаем текущее количество товаров в корзине перед очисткой
-    cart = request.session.get(cart_key, [])
-    item_count = len(cart)
-
-    # Очищаем корзину
-    request.session[cart_key] = []
+    user_id = get_user_id(authorization)
+    store, cart_id = await open_cart(request, db, user_id)
+
+    # Очищаем корзину, получая количество удаленных позиций
+    item_count = await store.clear(cart_id)
 
     return {
         "success": True,
@@ -321,32 +263,15 @@ async def clear_cart(
 @router.get("/count", response_model=dict)
 async def get_cart_count(
         request: Request,
+        db: AsyncSession = Depends(get_async_db),
         authorization: Optional[str] = Header(None)
 ):
     """
     Возвращает количество товаров в корзине.
     """
-    # Инициализируем user_id как None
-    user_id = None
-
-    # Если передан токен авторизации, пытаемся извлечь user_id
-    if authorization:
-        try:
-            auth_parts = authorization.split()
-            if len(auth_parts) == 2 and auth_parts[0].lower() == 'bearer':
-                token = auth_parts[1]
-                # Проверяем токен и получаем user_id
-                payload = decode_token(token)
-                if payload and "user_id" in payload:
-                    user_id = payload.get('user_id')
-        except Exception as e:
-            # В случае ошибки проверки токена - продолжаем без авторизации
-            logger.error(f"Ошибка проверки токена: {e}")
-            pass
-
-    # Получаем корзину из сессии, связанную с user_id, если он есть
-    cart_key = f'cart_{user_id}' if user_id else 'cart'
-    cart = request.session.get(cart_key, [])
+    user_id = get_user_id(authorization)
+    store, cart_id = await open_cart(request, db, user_id)
+    cart = await store.get_items(cart_id)
 
     # Считаем общее количество товаров
     total_items = sum(item['quantity'] for item in cart)
@@ -358,11 +283,12 @@ async def get_cart_count(
 async def merge_carts(
         request: Request,
         authorization: Optional[str] = Header(None),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Объединяет анонимную корзину с корзиной авторизованного пользователя.
-    Используется при входе пользователя, если у него была анонимная корзина.
+    Вход (/auth/login) выполняет объединение сам; эндпоинт оставлен для клиентов,
+    которые вызывают его явно.
     """
     if not authorization:
         raise HTTPException(
@@ -371,63 +297,22 @@ async def merge_carts(
         )
 
     # Получаем user_id из токена
-    user_id = None
-    try:
-        auth_parts = authorization.split()
-        if len(auth_parts) == 2 and auth_parts[0].lower() == 'bearer':
-            token = auth_parts[1]
-            payload = decode_token(token)
-            if payload and "user_id" in payload:
-                user_id = payload.get('user_id')
-    except Exception as e:
-        logger.error(f"Ошибка проверки токена: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Неверный токен авторизации"
-        )
-
+    user_id = get_user_id(authorization)
     if not user_id:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный токен авторизации"
         )
 
-    # Получаем анонимную корзину
-    anonymous_cart = request.session.get('cart', [])
-
-    if not anonymous_cart:
+    merged = await merge_anonymous_cart(request, user_id, db)
+    if not merged:
         return {"success": True, "message": "Нет анонимной корзины для объединения"}
 
-    # Получаем корзину пользователя
-    user_cart_key = f'cart_{user_id}'
-    user_cart = request.session.get(user_cart_key, [])
-
-    # Объединяем корзины
-    for anon_item in anonymous_cart:
-        # Проверяем, есть ли такой товар в корзине пользователя
-        for user_item in user_cart:
-            if user_item['product_id'] == anon_item['product_id']:
-                # Обновляем количество
-                new_quantity = user_item['quantity'] + anon_item['quantity']
-                if new_quantity > MAX_QUANTITY:
-                    new_quantity = MAX_QUANTITY
-                user_item['quantity'] = new_quantity
-                user_item['updated_at'] = datetime.utcnow().isoformat()
-                break
-        else:
-            # Если товара нет в корзине пользователя, добавляем его
-            user_cart.append({
-                'product_id': anon_item['product_id'],
-                'quantity': anon_item['quantity'],
-                'added_at': datetime.utcnow().isoformat()
-            })
-
-    # Сохраняем объединенную корзину и очищаем анонимную
-    request.session[user_cart_key] = user_cart
-    request.session['cart'] = []
+    store, cart_id = await open_cart(request, db, user_id)
+    user_cart = await store.get_items(cart_id)
 
     return {
         "success": True,
         "message": "Корзины успешно объединены",
         "data": {"items_count": len(user_cart)}
-    }
\ No newline at end of file
+    }
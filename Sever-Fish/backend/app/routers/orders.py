@@ -1,12 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, Body, status
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Any, List, Optional
 from datetime import datetime
 from pydantic import BaseModel
 
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app.models import Order, OrderItem, Product, User
 from app.schemas import OrderCreate, OrderResponse, OrderStatus, ApiResponse, OrderUpdate
+from app.services.cart_store import open_cart
+from app.services.stock_reservation import (
+    InsufficientStockError, aggregate_quantities, reserve_stock, release_stock_sync
+)
 from app.utils.auth import require_auth, get_current_user_id, require_admin
 
 class ApiResponse(BaseModel):
@@ -22,7 +28,7 @@ router = APIRouter()
 async def create_order(
         order_data: OrderCreate,
         request: Request,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Создает новый заказ на основе корзины пользователя.
@@ -31,9 +37,9 @@ async def create_order(
     # Получаем user_id из токена авторизации
     user_id = await get_current_user_id(request)
 
-    # Получаем корзину из сессии
-    cart_key = f'cart_{user_id}' if user_id else 'cart'
-    cart = request.session.get(cart_key, [])
+    # Получаем корзину из серверного хранилища
+    cart_store, cart_id = await open_cart(request, db, user_id)
+    cart = await cart_store.get_items(cart_id)
 
     if not cart:
         raise HTTPException(
@@ -41,38 +47,50 @@ async def create_order(
             detail="Корзина пуста, невозможно создать заказ"
         )
 
-    # Вычисляем общую сумму заказа и проверяем наличие товаров
+    # Резервируем товары: блокировка строк, проверка и списание остатков
+    # выполняются в той же транзакции, что и запись заказа
+    quantities = aggregate_quantities((item['product_id'], item['quantity']) for item in cart)
+    try:
+        products = await reserve_stock(db, quantities)
+    except InsufficientStockError as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    # Вычисляем общую сумму заказа (товары, которых больше нет в базе, пропускаются)
     total = 0
     order_items = []
 
-    for item in cart:
-        product = db.query(Product).filter(Product.id == item['product_id']).first()
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
         if not product:
-            continue  # Пропускаем товары, которых больше нет в базе
-
-        # Проверка наличия на складе
-        if product.stock_quantity < item['quantity']:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Недостаточно товара '{product.name}' на складе. В наличии: {product.stock_quantity}"
-            )
+            continue
 
         # Вычисляем стоимость позиции
-        item_price = product.price * item['quantity']
+        item_price = product.price * quantity
         total += item_price
 
         # Добавляем товар в список позиций заказа
         order_items.append({
             "product_id": product.id,
-            "quantity": item['quantity'],
+            "quantity": quantity,
             "price": product.price,
             "product_name": product.name
         })
 
-    # Создаем заказ
+    if not order_items:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Корзина пуста, невозможно создать заказ"
+        )
+
+    # Создаем заказ; flush выдает id без завершения транзакции
     new_order = Order(
         user_id=user_id,
-        status=OrderStatus.PENDING,
+        status=OrderStatus.PENDING.value,
         created_at=datetime.utcnow(),
         total=total,
         delivery_address=order_data.delivery_address,
@@ -84,29 +102,19 @@ async def create_order(
     )
 
     db.add(new_order)
-    db.commit()
-    db.refresh(new_order)
-
-    # Добавляем позиции в заказ и уменьшаем количество товаров на складе
-    for item_data in order_items:
-        order_item = OrderItem(
-            order_id=new_order.id,
-            product_id=item_data["product_id"],
-            quantity=item_data["quantity"],
-            price=item_data["price"],
-            product_name=item_data["product_name"]
-        )
+    await db.flush()
 
-        db.add(order_item)
-
-        # Уменьшаем количество товара на складе
-        product = db.query(Product).filter(Product.id == item_data["product_id"]).first()
-        product.stock_quantity -= item_data["quantity"]
+    # Позиции заказа одной пакетной вставкой
+    await db.execute(
+        insert(OrderItem),
+        [dict(item_data, order_id=new_order.id) for item_data in order_items]
+    )
 
-    db.commit()
+    # Один commit: заказ, позиции и списание остатков фиксируются вместе
+    await db.commit()
 
     # Очищаем корзину после создания заказа
-    request.session[cart_key] = []
+    await cart_store.clear(cart_id)
 
     # Формируем ответ
     order_response = {
@@ -253,8 +261,9 @@ async def cancel_order(
     # Получаем текущего пользователя
     user = await require_auth(request, db)
 
-    # Находим заказ
-    order = db.query(Order).filter(Order.id == order_id).first()
+    # Находим заказ и блокируем его строку: параллельная отмена того же заказа
+    # дождется commit и увидит статус "cancelled" (без повторного возврата товаров)
+    order = db.query(Order).filter(Order.id == order_id).with_for_update().first()
     if not order:
         raise HTTPException(status_code=404, detail="Заказ не найден")
 
@@ -265,6 +274,12 @@ async def cancel_order(
             detail="У вас нет доступа к этому заказу"
         )
 
+    if order.status == OrderStatus.CANCELLED:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Заказ уже отменен"
+        )
+
     # Проверяем возможность отмены
     if order.status in [OrderStatus.SHIPPED, OrderStatus.DELIVERED]:
         raise HTTPException(
@@ -272,16 +287,16 @@ async def cancel_order(
             detail=f"Невозможно отменить заказ в статусе '{order.status}'"
         )
 
-    # Меняем статус на "отменен"
-    order.status = OrderStatus.CANCELLED
-    db.commit()
+    # Меняем статус на "отменен" и возвращаем товары на склад в одной транзакции
+    order.status = OrderStatus.CANCELLED.value
 
-    # Возвращаем товары на склад
     order_items = db.query(OrderItem).filter(OrderItem.order_id == order_id).all()
-    for item in order_items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        if product:
-            product.stock_quantity += item.quantity
+    release_stock_sync(
+        db, aggregate_quantities(
+            (item.product_id, item.quantity) for item in order_items
+            if item.product_id is not None
+        )
+    )
 
     db.commit()
 
@@ -1,26 +1,35 @@
 # app/routers/products.py
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Query, Path, File, UploadFile, Form
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Set
 import logging
-import os
-import uuid
-import shutil
 from datetime import datetime
 
 from app import schemas
 from app.database import get_db
 from app.models import Product, Category
+from app.services import image_pipeline, product_search
+from app.services.image_storage import UploadTooLargeError, image_storage, read_upload
+from app.services.catalog_projection import catalog_projection
 from app.schemas import ProductResponse, CategoryResponse, ProductCreate, ProductUpdate, CategoryCreate
 from app.utils.auth import require_auth, require_admin
-from app.utils.config import PRODUCTS_IMAGES_DIR
+from app.utils.common import parse_pagination_params, slugify
+from app.utils.config import IMAGE_MAX_UPLOAD_SIZE
+from app.utils.images import absolute_image_url, image_url, image_variant_urls
+from app.utils.pagination import (
+    PRODUCT_SORT_KEYS, InvalidCursorError, estimate_total, paginate_products, pagination_headers
+)
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Сериализация страниц каталога по тем же схемам, что и response_model
+product_list_adapter = TypeAdapter(List[schemas.Product])
+category_product_list_adapter = TypeAdapter(List[ProductResponse])
+
 
 # Получить все товары с пагинацией и фильтрацией
 @router.get("/", response_model=List[schemas.Product])
@@ -29,54 +38,68 @@ def get_products(
         skip: int = 0,
         limit: int = 100,
         category_id: Optional[int] = None,
-        sort_by: str = Query("name", description="Поле для сортировки"),
+        sort_by: str = Query("name", description="Поле для сортировки (name, price, price_desc, category, created_at)"),
+        cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+        with_total: bool = Query(False, description="Вернуть оценку общего количества в X-Total-Count"),
         db: Session = Depends(get_db)
 ):
     """
     Получить список всех продуктов.
     Можно фильтровать по категории, используя query parameter category_id.
+    Пагинация курсорная: следующая страница запрашивается с cursor из заголовка
+    X-Next-Cursor (skip поддерживается для обратной совместимости).
+    Страницы отдаются из проекции каталога с ETag (If-None-Match -> 304).
     """
     try:
-        query = db.query(Product)
-
-        if category_id:
-            query = query.filter(Product.category_id == category_id)
-
-        # Применяем сортировку
-        if sort_by == "name":
-            query = query.order_by(Product.name)
-        elif sort_by == "price":
-            query = query.order_by(Product.price)
-        elif sort_by == "category":
-            query = query.order_by(Product.category_id)
+        if sort_by not in PRODUCT_SORT_KEYS:
+            sort_by = "name"
 
-        products = query.offset(skip).limit(limit).all()
-        logger.info(f"Найдено {len(products)} продуктов")
+        pagination = parse_pagination_params(skip, limit)
 
         # Преобразуем относительные URL изображений в абсолютные
         base_url = str(request.base_url).rstrip('/')
 
-        # Создаем копии продуктов с полными URL
-        result = []
-        for product in products:
-            product_dict = {
-                "id": product.id,
-                "name": product.name,
-                "description": product.description,
-                "price": product.price,
-                # Используем stock_quantity вместо stock
-                "stock": product.stock_quantity,
-                "category_id": product.category_id,
-                "image_url": f"{base_url}{product.image_url}" if product.image_url else None,
-                "created_at": product.created_at,
-                # Используем created_at вместо updated_at, т.к. updated_at отсутствует в БД
-                "updated_at": product.created_at,
-                # Добавляем поле weight
-                "weight": product.weight
-            }
-            result.append(product_dict)
-
-        return result
+        def build():
+            query = db.query(Product)
+
+            if category_id:
+                query = query.filter(Product.category_id == category_id)
+
+            products, next_cursor = paginate_products(
+                query, sort_by, pagination["limit"], cursor, offset=pagination["skip"]
+            )
+            logger.info(f"Найдено {len(products)} продуктов")
+
+            total = estimate_total(db, query) if with_total else None
+
+            # Создаем копии продуктов с полными URL
+            result = []
+            for product in products:
+                product_dict = {
+                    "id": product.id,
+                    "name": product.name,
+                    "description": product.description,
+                    "price": product.price,
+                    # Используем stock_quantity вместо stock
+                    "stock": product.stock_quantity,
+                    "category_id": product.category_id,
+                    "image_url": absolute_image_url(product.image_url, base_url),
+                    "images": image_variant_urls(product.image_variants, base_url),
+                    "created_at": product.created_at,
+                    # Используем created_at вместо updated_at, т.к. updated_at отсутствует в БД
+                    "updated_at": product.created_at,
+                    # Добавляем поле weight
+                    "weight": product.weight
+                }
+                result.append(product_dict)
+
+            return product_list_adapter.dump_python(product_list_adapter.validate_python(result)), \
+                pagination_headers(next_cursor, total)
+
+        key = ("products", base_url, category_id, sort_by, pagination["skip"], pagination["limit"], cursor, with_total)
+        return catalog_projection.respond(request, db, key, build)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Ошибка при получении товаров: {str(e)}")
         raise HTTPException(
@@ -102,45 +125,64 @@ async def get_categories(db: Session = Depends(get_db)):
         )
 
 
+def find_category_by_slug(db: Session, category_slug: str) -> Optional[Category]:
+    """
+    Ищет категорию по слагу. В таблице categories нет колонки slug,
+    поэтому слаг вычисляется из названия; также принимается числовой id.
+    """
+    if category_slug.isdigit():
+        return db.query(Category).filter(Category.id == int(category_slug)).first()
+    for category in db.query(Category).all():
+        if slugify(category.name) == category_slug:
+            return category
+    return None
+
+
 # Получить товары по слагу категории
 @router.get("/category/{category_slug}", response_model=List[ProductResponse])
 async def get_products_by_category(
         category_slug: str,
+        request: Request,
         db: Session = Depends(get_db),
-        skip: int = Query(0, ge=0, description="Сколько товаров пропустить"),
+        skip: int = Query(0, ge=0, description="Сколько товаров пропустить (устарело, используйте cursor)"),
         limit: int = Query(100, ge=1, le=100, description="Максимальное количество товаров"),
-        sort_by: Optional[str] = Query("name", description="Поле для сортировки (name, price, created_at)")
+        sort_by: Optional[str] = Query("name", description="Поле для сортировки (name, price, price_desc, created_at)"),
+        cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+        with_total: bool = Query(False, description="Вернуть оценку общего количества в X-Total-Count")
 ):
     """
     Получить список товаров из указанной категории по её слагу
     """
     try:
-        category = db.query(Category).filter(Category.slug == category_slug).first()
-        if not category:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Категория не найдена"
-            )
+        # По умолчанию сортируем по имени
+        if sort_by not in PRODUCT_SORT_KEYS:
+            sort_by = "name"
 
-        # Базовый запрос
-        query = db.query(Product).filter(Product.category_id == category.id)
+        def build():
+            category = find_category_by_slug(db, category_slug)
+            if not category:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Категория не найдена"
+                )
 
-        # Применяем сортировку
-        if sort_by == "price":
-            query = query.order_by(Product.price)
-        elif sort_by == "price_desc":
-            query = query.order_by(Product.price.desc())
-        elif sort_by == "created_at":
-            query = query.order_by(Product.created_at.desc())
-        else:  # По умолчанию сортируем по имени
-            query = query.order_by(Product.name)
+            # Базовый запрос
+            query = db.query(Product).filter(Product.category_id == category.id)
 
-        # Применяем пагинацию
-        products = query.offset(skip).limit(limit).all()
+            # Применяем пагинацию
+            products, next_cursor = paginate_products(query, sort_by, limit, cursor, offset=skip)
 
-        return products
+            total = estimate_total(db, query) if with_total else None
+
+            validated = category_product_list_adapter.validate_python(products, from_attributes=True)
+            return category_product_list_adapter.dump_python(validated), pagination_headers(next_cursor, total)
+
+        key = ("category", category_slug, sort_by, skip, limit, cursor, with_total)
+        return catalog_projection.respond(request, db, key, build)
     except HTTPException:
         raise
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Ошибка при получении товаров по категории {category_slug}: {str(e)}")
         raise HTTPException(
@@ -149,6 +191,69 @@ async def get_products_by_category(
         )
 
 
+# Поиск товаров
+@router.get("/search", response_model=List[ProductResponse])
+def search_products(
+        q: str = Query(..., min_length=1, description="Поисковый запрос"),
+        category_id: Optional[int] = None,
+        limit: int = Query(20, ge=1, le=100, description="Максимальное количество товаров"),
+        db: Session = Depends(get_db)
+):
+    """
+    Полнотекстовый поиск товаров с ранжированием по релевантности.
+    Учитывает словоформы ("лосося" найдет "лосось"), при опечатке
+    ищет по похожести названия.
+    """
+    try:
+        return [product for product, _ in product_search.search_products(db, q, limit, category_id)]
+    except Exception as e:
+        logger.error(f"Ошибка при поиске товаров по запросу '{q}': {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка сервера при поиске товаров: {str(e)}"
+        )
+
+
+# Подсказки для запроса с опечаткой
+@router.get("/search/suggest")
+def suggest_products(
+        q: str = Query(..., min_length=2, description="Поисковый запрос"),
+        limit: int = Query(5, ge=1, le=20),
+        db: Session = Depends(get_db)
+):
+    """
+    Возвращает похожие названия товаров ("возможно, вы искали")
+    """
+    try:
+        return {"query": q, "suggestions": product_search.suggest(db, q, limit)}
+    except Exception as e:
+        logger.error(f"Ошибка при получении подсказок для '{q}': {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка сервера при получении подсказок: {str(e)}"
+        )
+
+
+# Автодополнение в строке поиска
+@router.get("/search/autocomplete")
+def autocomplete_products(
+        q: str = Query(..., min_length=2, description="Начало запроса"),
+        limit: int = Query(10, ge=1, le=20),
+        db: Session = Depends(get_db)
+):
+    """
+    Возвращает товары, слова в которых начинаются с введенного текста
+    """
+    try:
+        return product_search.autocomplete(db, q, limit)
+    except Exception as e:
+        logger.error(f"Ошибка автодополнения для '{q}': {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка сервера при автодополнении: {str(e)}"
+        )
+
+
 # Получить товар по ID
 @router.get("/{product_id}", response_model=ProductResponse)
 async def get_product_by_id(
@@ -218,6 +323,7 @@ async def create_product(
 
         db.add(db_product)
         db.commit()
+        catalog_projection.invalidate()
         db.refresh(db_product)
 
         logger.info(f"Создан новый товар: {db_product.name} (ID: {db_product.id})")
@@ -270,6 +376,11 @@ async def update_product(
 
         # Обновляем только указанные поля
         update_data = product_data.dict(exclude_unset=True)
+
+        # Изображение заменено ссылкой: варианты прежнего к нему не относятся
+        if "image_url" in update_data and update_data["image_url"] != db_product.image_url:
+            db_product.image_variants = None
+
         for key, value in update_data.items():
             setattr(db_product, key, value)
 
@@ -277,6 +388,7 @@ async def update_product(
         db_product.updated_at = datetime.utcnow()
 
         db.commit()
+        catalog_projection.invalidate()
         db.refresh(db_product)
 
         logger.info(f"Обновлен товар: {db_product.name} (ID: {db_product.id})")
@@ -292,6 +404,21 @@ async def update_product(
         )
 
 
+def unused_image_files(db: Session, product: Product) -> Set[str]:
+    """
+    Файлы изображения товара, которые можно удалить: одинаковые изображения
+    хранятся под одним именем (хеш содержимого) и могут быть общими.
+    """
+    if not product.image_url:
+        return set()
+    shared = db.query(Product.id).filter(
+        Product.image_url == product.image_url, Product.id != product.id
+    ).first()
+    if shared:
+        return set()
+    return image_pipeline.stored_files(product.image_url, product.image_variants)
+
+
 # Удалить товар (только для админов)
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_product(
@@ -320,22 +447,17 @@ async def delete_product(
         # Сохраняем название товара для логирования
         product_name = db_product.name
 
-        # Сохраняем путь к изображению, если есть
-        image_path = None
-        if db_product.image_url:
-            image_filename = os.path.basename(db_product.image_url)
-            image_path = os.path.join(PRODUCTS_IMAGES_DIR, image_filename)
+        # Запоминаем файлы изображения, если они не нужны другим товарам
+        image_files = unused_image_files(db, db_product)
 
         # Удаляем товар из базы
         db.delete(db_product)
         db.commit()
+        catalog_projection.invalidate()
 
-        # Удаляем изображение, если оно существует
-        if image_path and os.path.exists(image_path):
-            try:
-                os.remove(image_path)
-            except Exception as e:
-                logger.warning(f"Ошибка при удалении файла изображения товара {product_id}: {e}")
+        # Удаляем файлы изображения и его вариантов
+        if image_files:
+            await image_storage.delete_many(image_files)
 
         logger.info(f"Удален товар: {product_name} (ID: {product_id})")
         return None
@@ -383,33 +505,38 @@ async def upload_product_image(
         )
 
     try:
-        # Создаем директорию для изображений, если её нет
-        os.makedirs(PRODUCTS_IMAGES_DIR, exist_ok=True)
-
-        # Удаляем старое изображение, если оно есть
-        if product.image_url:
-            old_filename = os.path.basename(product.image_url)
-            old_path = os.path.join(PRODUCTS_IMAGES_DIR, old_filename)
-            if os.path.exists(old_path):
-                os.remove(old_path)
-
-        # Генерируем уникальное имя файла
-        file_extension = os.path.splitext(file.filename)[1]
-        new_filename = f"product_{product_id}_{uuid.uuid4().hex}{file_extension}"
-        new_path = os.path.join(PRODUCTS_IMAGES_DIR, new_filename)
-
-        # Сохраняем файл
-        with open(new_path, 'wb') as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        # Обновляем URL изображения в базе данных
-        product.image_url = f"/images/{new_filename}"
+        # Читаем частями, прерывая загрузку сверх допустимого размера
+        try:
+            data = await read_upload(file, IMAGE_MAX_UPLOAD_SIZE)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+
+        # Миниатюра и варианты для srcset строятся в пуле процессов
+        try:
+            manifest, files = await image_pipeline.process_image(data)
+        except image_pipeline.InvalidImageError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+        await image_storage.save_files(files)
+
+        # Старое изображение удаляется после фиксации, если оно не нужно другим товарам
+        old_files = unused_image_files(db, product) - set(files)
+
+        # image_url указывает на самый большой JPEG для клиентов без srcset
+        product.image_url = image_url(manifest["fallback"])
+        product.image_variants = manifest
         product.updated_at = datetime.utcnow()
         db.commit()
+        catalog_projection.invalidate()
         db.refresh(product)
 
+        if old_files:
+            await image_storage.delete_many(old_files)
+
         logger.info(f"Загружено изображение для товара: {product.name} (ID: {product.id})")
         return product
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()  # Откатываем транзакцию в случае ошибки
         logger.error(f"Ошибка при загрузке изображения для товара с ID {product_id}: {str(e)}")
@@ -468,6 +595,7 @@ async def create_category(
 
         db.add(db_category)
         db.commit()
+        catalog_projection.invalidate()
         db.refresh(db_category)
 
         logger.info(f"Создана новая категория: {db_category.name} (ID: {db_category.id})")
@@ -525,6 +653,7 @@ async def update_category(
         db_category.description = category_data.description
 
         db.commit()
+        catalog_projection.invalidate()
         db.refresh(db_category)
 
         logger.info(f"Обновлена категория: {db_category.name} (ID: {db_category.id})")
@@ -588,6 +717,7 @@ async def delete_category(
         # Удаляем категорию
         db.delete(db_category)
         db.commit()
+        catalog_projection.invalidate()
 
         logger.info(f"Удалена категория: {category_name} (ID: {category_id})")
         return None
@@ -112,6 +112,20 @@ class Token(BaseModel):
 
 
 # Схемы для продуктов
+class ImageSource(BaseModel):
+    type: str
+    srcset: str
+
+
+class ProductImages(BaseModel):
+    """Варианты изображения товара для <picture>/srcset"""
+    thumbnail: Optional[str] = None
+    fallback: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    sources: List[ImageSource] = []
+
+
 class ProductBase(BaseModel):
     name: str
     description: Optional[str] = None
@@ -128,6 +142,7 @@ class ProductCreate(ProductBase):
 
 class Product(ProductBase):
     id: int
+    images: Optional[ProductImages] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
@@ -149,6 +164,7 @@ class ProductResponse(ProductBase):
     id: int
     description: Optional[str] = None
     image_url: Optional[str] = None
+    images: Optional[ProductImages] = None
     stock_quantity: Optional[int] = 0
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
@@ -203,6 +219,45 @@ class CartItemResponse(CartItemBase):
         from_attributes = True
 
 
+class CartSummaryLine(BaseModel):
+    id: int
+    product_id: int
+    name: str
+    image_url: Optional[str] = None
+    thumbnail: Optional[str] = None
+    quantity: int
+    price: float
+    stock: int = 0
+    available: bool = True
+    discount_id: Optional[int] = None
+    discount_type: Optional[str] = None
+    discount_value: float = 0
+    discount_amount: float = 0
+    total: float
+
+
+class CartPromo(BaseModel):
+    code: str
+    valid: bool
+    discount_type: Optional[str] = None
+    discount_value: Optional[float] = None
+    discount_amount: float = 0
+
+
+class CartSummaryResponse(BaseModel):
+    """Корзина с ценами, скидками по позициям, промо-кодом и итогами"""
+    lines: List[CartSummaryLine]
+    items_count: int
+    total_price: float
+    items_discount: float
+    promo: Optional[CartPromo] = None
+    promo_discount: float = 0
+    discount_amount: float
+    final_price: float
+    has_discount: bool
+    discount_percentage: float
+
+
 # Схемы для заказов
 class OrderStatus(str, Enum):
     PENDING = "pending"
@@ -257,7 +312,7 @@ class OrderItemCreate(BaseModel):
 
 class OrderItemResponse(BaseModel):
     id: int
-    product_id: int
+    product_id: Optional[int] = None
     order_id: int
     quantity: int
     price: float
@@ -0,0 +1,130 @@
+# app/services/cart_pricing.py
+"""
+Расчет корзины для GET /cart/summary: цены позиций, скидки, промо-код, итоги.
+
+Товары загружаются одним запросом (product_loader), скидки применяются за
+один проход по индексу правил (discount_service). Результат кешируется на
+корзину: версия расчета - это состав корзины, промо-код, номер снимка
+правил скидок и версия каталога (цены). Пока ни одна из них не изменилась,
+повторная отрисовка корзины не обращается к таблице товаров; в любом случае
+расчет живет не дольше CART_SUMMARY_MAX_AGE секунд.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services import discount_service
+from app.services.catalog_projection import catalog_projection
+from app.services.product_loader import load_products
+from app.utils.config import CART_SUMMARY_CACHE_SIZE, CART_SUMMARY_MAX_AGE
+
+logger = logging.getLogger(__name__)
+
+
+class CartSummaryCache:
+    """LRU: ключ корзины -> (версия расчета, время расчета, результат)"""
+
+    def __init__(self, max_size: int, max_age: float):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, cart_key: Hashable, version: Hashable) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(cart_key)
+            if entry is None or entry[0] != version or time.monotonic() - entry[1] > self.max_age:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(cart_key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, cart_key: Hashable, version: Hashable, summary: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[cart_key] = (version, time.monotonic(), summary)
+            self._entries.move_to_end(cart_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._entries)
+        return {"size": size, "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+
+cart_summary_cache = CartSummaryCache(CART_SUMMARY_CACHE_SIZE, CART_SUMMARY_MAX_AGE)
+
+
+def cart_version(items: List[Dict[str, Any]], promo_code: Optional[str], catalog_version: int) -> Hashable:
+    return (
+        tuple(sorted((item["id"], item["product_id"], item["quantity"]) for item in items)),
+        (promo_code or "").strip().upper(),
+        discount_service.discount_index.generation,
+        catalog_version
+    )
+
+
+async def summarize_cart(
+        db: AsyncSession,
+        cart_key: Optional[Hashable],
+        items: List[Dict[str, Any]],
+        promo_code: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Итоги корзины. cart_key - устойчивый идентификатор корзины
+    (None - корзины еще нет, расчет не кешируется).
+    """
+    # Версии читаются до товаров: расчет не попадет в кеш под версией новее своих цен
+    await discount_service.discount_index.refresh_async(db)
+    catalog_version = await catalog_projection.refresh_version_async(db)
+    # Переход границы окна действия скидки меняет номер снимка - до вычисления версии
+    discount_service.discount_index.snapshot()
+
+    # Без версии каталога (миграция не применена) цены могли измениться незаметно
+    version = None
+    if cart_key is not None and catalog_version is not None:
+        version = cart_version(items, promo_code, catalog_version)
+        cached = cart_summary_cache.get(cart_key, version)
+        if cached is not None:
+            return cached
+
+    products = await load_products(db, (item["product_id"] for item in items))
+
+    priced_items = []
+    details = []
+    for item in items:
+        product = products.get(item["product_id"])
+        if product is None:
+            # Товар удален из каталога
+            continue
+        priced_items.append({
+            "product_id": product.id,
+            "category_id": product.category_id,
+            "price": product.price or 0,
+            "quantity": item["quantity"]
+        })
+        images = product.images
+        details.append({
+            "id": item["id"],
+            "name": product.name,
+            "image_url": product.image_url,
+            "thumbnail": images["thumbnail"] if images else product.image_url,
+            "stock": product.stock_quantity or 0,
+            "available": (product.stock_quantity or 0) >= item["quantity"]
+        })
+
+    summary = discount_service.calculate_cart_discount(priced_items, promo_code)
+    for line, detail in zip(summary["lines"], details):
+        line.update(detail)
+    summary["items_count"] = sum(line["quantity"] for line in summary["lines"])
+
+    if version is not None:
+        cart_summary_cache.put(cart_key, version, summary)
+    return summary
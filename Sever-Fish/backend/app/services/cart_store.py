@@ -0,0 +1,394 @@
+# app/services/cart_store.py
+"""
+Серверное хранилище корзин.
+
+В сессии (подписанной cookie) хранится только непрозрачный идентификатор
+анонимной корзины, сами позиции лежат на сервере:
+- у авторизованного пользователя - в таблице cart_items (DatabaseCartStore),
+  корзина доступна с любого устройства;
+- у анонимного посетителя - в памяти процесса с TTL (MemoryCartStore).
+При входе анонимная корзина переносится в корзину пользователя.
+"""
+
+import logging
+import secrets
+from abc import ABC, abstractmethod
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Request
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import AsyncSessionLocal
+from app.models import CartItem, Product
+from app.utils.config import CART_ANONYMOUS_TTL, CART_ANONYMOUS_MAX_CARTS, MAX_CART_ITEMS
+
+logger = logging.getLogger(__name__)
+
+# Ключ сессии с идентификатором анонимной корзины
+CART_SESSION_KEY = "cart_id"
+
+
+class CartLimitError(Exception):
+    """Количество товара в корзине превысило бы допустимый максимум"""
+
+    def __init__(self, max_quantity: int):
+        super().__init__(f"Максимальное количество товара - {max_quantity}")
+        self.max_quantity = max_quantity
+
+
+def aggregate_items(items: Iterable[Dict[str, Any]]) -> Dict[int, int]:
+    """Суммирует количество по product_id (позиции из разных корзин/форматов)"""
+    quantities: Dict[int, int] = {}
+    for item in items:
+        product_id = int(item["product_id"])
+        quantities[product_id] = quantities.get(product_id, 0) + int(item["quantity"])
+    return quantities
+
+
+class CartStore(ABC):
+    """
+    Интерфейс хранилища корзин.
+
+    Позиция корзины - словарь с ключами id, product_id, quantity, added_at.
+    id позиции стабилен в пределах корзины и используется в URL /cart/{id}.
+    Для несуществующей корзины методы чтения возвращают пустой результат.
+    """
+
+    @abstractmethod
+    async def get_items(self, cart_id: Any) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def add_item(
+            self, cart_id: Any, product_id: int, quantity: int,
+            max_quantity: int = MAX_CART_ITEMS, clamp: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Добавляет товар или увеличивает его количество.
+        Если итог превышает max_quantity: при clamp=True количество обрезается,
+        иначе выбрасывается CartLimitError.
+        """
+
+    @abstractmethod
+    async def set_quantity(self, cart_id: Any, item_id: int, quantity: int) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def remove_item(self, cart_id: Any, item_id: int) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def clear(self, cart_id: Any) -> int:
+        ...
+
+    async def merge_items(
+            self, cart_id: Any, items: Iterable[Dict[str, Any]], max_quantity: int = MAX_CART_ITEMS
+    ) -> int:
+        """Переносит позиции в корзину, обрезая количество до max_quantity"""
+        quantities = aggregate_items(items)
+        for product_id, quantity in quantities.items():
+            await self.add_item(cart_id, product_id, quantity, max_quantity, clamp=True)
+        return len(quantities)
+
+
+class DatabaseCartStore(CartStore):
+    """Корзина авторизованного пользователя в таблице cart_items (cart_id = user_id)"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @staticmethod
+    def _row_to_item(row) -> Dict[str, Any]:
+        return {
+            "id": row.id,
+            "product_id": row.product_id,
+            "quantity": row.quantity,
+            "added_at": row.created_at.isoformat() if row.created_at else None
+        }
+
+    @staticmethod
+    def _columns():
+        return CartItem.id, CartItem.product_id, CartItem.quantity, CartItem.created_at
+
+    async def get_items(self, cart_id: Any) -> List[Dict[str, Any]]:
+        if not cart_id:
+            return []
+        result = await self.db.execute(
+            select(*self._columns()).where(CartItem.user_id == cart_id).order_by(CartItem.id)
+        )
+        return [self._row_to_item(row) for row in result]
+
+    def _upsert(self, cart_id: Any, quantities: Dict[int, int], max_quantity: int, clamp: bool):
+        # Атомарный upsert по уникальному индексу (user_id, product_id):
+        # параллельные запросы одного пользователя не создают дублей позиций
+        stmt = pg_insert(CartItem).values([
+            {
+                "user_id": cart_id,
+                "product_id": product_id,
+                "quantity": min(quantity, max_quantity) if clamp else quantity
+            }
+            for product_id, quantity in quantities.items()
+        ])
+        new_quantity = CartItem.quantity + stmt.excluded.quantity
+        if clamp:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[CartItem.user_id, CartItem.product_id],
+                set_={"quantity": func.least(new_quantity, max_quantity)}
+            )
+        else:
+            # Превышение лимита: строка не обновляется и RETURNING ничего не вернет
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[CartItem.user_id, CartItem.product_id],
+                set_={"quantity": new_quantity},
+                where=new_quantity <= max_quantity
+            )
+        return stmt.returning(*self._columns())
+
+    async def add_item(
+            self, cart_id: Any, product_id: int, quantity: int,
+            max_quantity: int = MAX_CART_ITEMS, clamp: bool = False
+    ) -> Dict[str, Any]:
+        result = await self.db.execute(self._upsert(cart_id, {product_id: quantity}, max_quantity, clamp))
+        row = result.first()
+        await self.db.commit()
+        if row is None:
+            raise CartLimitError(max_quantity)
+        return self._row_to_item(row)
+
+    async def set_quantity(self, cart_id: Any, item_id: int, quantity: int) -> Optional[Dict[str, Any]]:
+        result = await self.db.execute(
+            update(CartItem)
+            .where(CartItem.id == item_id, CartItem.user_id == cart_id)
+            .values(quantity=quantity)
+            .returning(*self._columns())
+        )
+        row = result.first()
+        await self.db.commit()
+        return self._row_to_item(row) if row else None
+
+    async def remove_item(self, cart_id: Any, item_id: int) -> Optional[Dict[str, Any]]:
+        result = await self.db.execute(
+            delete(CartItem)
+            .where(CartItem.id == item_id, CartItem.user_id == cart_id)
+            .returning(*self._columns())
+        )
+        row = result.first()
+        await self.db.commit()
+        return self._row_to_item(row) if row else None
+
+    async def clear(self, cart_id: Any) -> int:
+        if not cart_id:
+            return 0
+        result = await self.db.execute(delete(CartItem).where(CartItem.user_id == cart_id))
+        await self.db.commit()
+        return result.rowcount
+
+    async def merge_items(
+            self, cart_id: Any, items: Iterable[Dict[str, Any]], max_quantity: int = MAX_CART_ITEMS
+    ) -> int:
+        quantities = aggregate_items(items)
+        if not quantities:
+            return 0
+
+        # Товары могли быть удалены из каталога, пока лежали в анонимной корзине
+        result = await self.db.execute(select(Product.id).where(Product.id.in_(quantities.keys())))
+        existing = set(result.scalars())
+        quantities = {pid: qty for pid, qty in quantities.items() if pid in existing}
+        if not quantities:
+            return 0
+
+        # Одна вставка на все позиции вместо запроса на каждый товар
+        await self.db.execute(self._upsert(cart_id, quantities, max_quantity, clamp=True))
+        await self.db.commit()
+        return len(quantities)
+
+
+class MemoryCartStore(CartStore):
+    """
+    Анонимные корзины в памяти процесса.
+
+    Корзины упорядочены по последнему обращению: TTL продлевается при каждом
+    обращении, истекшие корзины вытесняются с начала словаря, а при превышении
+    max_carts удаляются самые давно неиспользуемые.
+    Все операции синхронны внутри (без await), поэтому атомарны в event loop.
+    """
+
+    def __init__(self, ttl: int, max_carts: int):
+        self.ttl = ttl
+        self.max_carts = max_carts
+        self._carts: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.evicted = 0
+
+    @staticmethod
+    def new_cart_id() -> str:
+        return secrets.token_urlsafe(24)
+
+    def _purge_expired(self, now: float) -> None:
+        while self._carts:
+            cart = next(iter(self._carts.values()))
+            if cart["expires_at"] > now:
+                break
+            self._carts.popitem(last=False)
+
+    def _touch(self, cart_id: Optional[str], create: bool = False) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        self._purge_expired(now)
+
+        cart = self._carts.get(cart_id) if cart_id else None
+        if cart is None:
+            if not create or not cart_id:
+                return None
+            cart = {"items": OrderedDict(), "next_id": 1}
+            self._carts[cart_id] = cart
+            while len(self._carts) > self.max_carts:
+                self._carts.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._carts.move_to_end(cart_id)
+
+        cart["expires_at"] = now + self.ttl
+        return cart
+
+    @staticmethod
+    def _public(item: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(item)
+
+    async def get_items(self, cart_id: Any) -> List[Dict[str, Any]]:
+        cart = self._touch(cart_id)
+        return [self._public(item) for item in cart["items"].values()] if cart else []
+
+    async def add_item(
+            self, cart_id: Any, product_id: int, quantity: int,
+            max_quantity: int = MAX_CART_ITEMS, clamp: bool = False
+    ) -> Dict[str, Any]:
+        cart = self._touch(cart_id, create=True)
+        if cart is None:
+            raise ValueError("Не задан идентификатор корзины")
+
+        for item in cart["items"].values():
+            if item["product_id"] == product_id:
+                new_quantity = item["quantity"] + quantity
+                if new_quantity > max_quantity:
+                    if not clamp:
+                        raise CartLimitError(max_quantity)
+                    new_quantity = max_quantity
+                item["quantity"] = new_quantity
+                item["updated_at"] = datetime.utcnow().isoformat()
+                return self._public(item)
+
+        if quantity > max_quantity:
+            if not clamp:
+                raise CartLimitError(max_quantity)
+            quantity = max_quantity
+
+        item = {
+            "id": cart["next_id"],
+            "product_id": product_id,
+            "quantity": quantity,
+            "added_at": datetime.utcnow().isoformat()
+        }
+        cart["items"][item["id"]] = item
+        cart["next_id"] += 1
+        return self._public(item)
+
+    async def set_quantity(self, cart_id: Any, item_id: int, quantity: int) -> Optional[Dict[str, Any]]:
+        cart = self._touch(cart_id)
+        item = cart["items"].get(item_id) if cart else None
+        if item is None:
+            return None
+        item["quantity"] = quantity
+        item["updated_at"] = datetime.utcnow().isoformat()
+        return self._public(item)
+
+    async def remove_item(self, cart_id: Any, item_id: int) -> Optional[Dict[str, Any]]:
+        cart = self._touch(cart_id)
+        return cart["items"].pop(item_id, None) if cart else None
+
+    async def clear(self, cart_id: Any) -> int:
+        cart = self._carts.pop(cart_id, None) if cart_id else None
+        return len(cart["items"]) if cart else 0
+
+    def pop_cart(self, cart_id: Any) -> List[Dict[str, Any]]:
+        """Извлекает корзину целиком (для переноса в корзину пользователя)"""
+        cart = self._carts.pop(cart_id, None) if cart_id else None
+        return list(cart["items"].values()) if cart else []
+
+    def stats(self) -> Dict[str, Any]:
+        self._purge_expired(time.monotonic())
+        return {
+            "carts": len(self._carts),
+            "max_carts": self.max_carts,
+            "ttl_seconds": self.ttl,
+            "evicted": self.evicted
+        }
+
+
+# Хранилище анонимных корзин (одно на процесс)
+anonymous_carts = MemoryCartStore(CART_ANONYMOUS_TTL, CART_ANONYMOUS_MAX_CARTS)
+
+
+def _pop_legacy_session_cart(request: Request, user_id: Optional[int]) -> List[Dict[str, Any]]:
+    """
+    Забирает корзину старого формата (список позиций прямо в cookie),
+    чтобы не потерять корзины, собранные до перехода на серверное хранилище.
+    """
+    keys = [f"cart_{user_id}"] if user_id else []
+    keys.append("cart")
+    items: List[Dict[str, Any]] = []
+    for key in keys:
+        legacy = request.session.pop(key, None)
+        if isinstance(legacy, list):
+            items.extend(item for item in legacy if "product_id" in item and "quantity" in item)
+    return items
+
+
+async def open_cart(
+        request: Request, db: AsyncSession, user_id: Optional[int], create: bool = False
+) -> Tuple[CartStore, Any]:
+    """
+    Возвращает хранилище и идентификатор корзины для текущего запроса.
+
+    Авторизованный пользователь - корзина в БД по user_id.
+    Анонимный - корзина в памяти по идентификатору из сессии; при create=True
+    идентификатор создается, если его еще нет.
+    """
+    legacy_items = _pop_legacy_session_cart(request, user_id)
+
+    if user_id:
+        store, cart_id = DatabaseCartStore(db), user_id
+    else:
+        store = anonymous_carts
+        cart_id = request.session.get(CART_SESSION_KEY)
+        if cart_id is None and (create or legacy_items):
+            cart_id = anonymous_carts.new_cart_id()
+            request.session[CART_SESSION_KEY] = cart_id
+
+    if legacy_items:
+        await store.merge_items(cart_id, legacy_items)
+
+    return store, cart_id
+
+
+async def merge_anonymous_cart(request: Request, user_id: int, db: Optional[AsyncSession] = None) -> int:
+    """
+    Переносит анонимную корзину текущей сессии в корзину пользователя.
+    Вызывается при входе; возвращает число перенесенных товаров.
+    """
+    items = anonymous_carts.pop_cart(request.session.pop(CART_SESSION_KEY, None))
+    items.extend(_pop_legacy_session_cart(request, None))
+    if not items:
+        return 0
+
+    if db is not None:
+        merged = await DatabaseCartStore(db).merge_items(user_id, items)
+    else:
+        async with AsyncSessionLocal() as session:
+            merged = await DatabaseCartStore(session).merge_items(user_id, items)
+
+    logger.info(f"Анонимная корзина перенесена пользователю {user_id}: {merged} товаров")
+    return merged
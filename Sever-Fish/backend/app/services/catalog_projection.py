@@ -0,0 +1,202 @@
+# app/services/catalog_projection.py
+"""
+Проекция каталога: готовые страницы списка товаров.
+
+Страница (категория, сортировка, курсор, лимит, базовый URL) собирается один
+раз, сериализуется orjson и хранится вместе со строгим ETag (хеш тела).
+Повторные запросы получают те же байты без обращения к таблице товаров,
+а клиент или шлюз с совпадающим If-None-Match - ответ 304.
+
+Актуальность обеспечивает версия каталога - строка catalog_version, которую
+триггеры на products и categories сдвигают в транзакции изменения (миграция
+АИС 4e8a1c7b5f20), поэтому новая версия видна не раньше новых данных. Версия
+читается до сборки страницы, сверяется не чаще раза в
+CATALOG_VERSION_CHECK_INTERVAL секунд; при ее изменении все страницы
+сбрасываются. Изменения, сделанные этим процессом, сбрасывают проекцию сразу.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import orjson
+from fastapi import Request, Response
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.utils.config import (
+    CATALOG_PROJECTION_ENABLED, CATALOG_PROJECTION_MAX_PAGES, CATALOG_VERSION_CHECK_INTERVAL,
+    CATALOG_PROJECTION_MAX_AGE, CATALOG_CACHE_CONTROL
+)
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION_QUERY = text("SELECT version FROM catalog_version WHERE id = 1")
+
+
+@dataclass
+class CatalogPage:
+    body: bytes
+    etag: str
+    headers: Dict[str, str]
+    version: Optional[int]
+    built_at: float
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Сравнение If-None-Match с ETag (список значений или *)"""
+    if not if_none_match:
+        return False
+    candidates = {value.strip() for value in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class CatalogProjection:
+    """
+    Хранилище готовых страниц каталога (LRU, не больше max_pages).
+    Списки товаров обрабатываются в пуле потоков, поэтому доступ под блокировкой.
+    """
+
+    def __init__(self, max_pages: int, check_interval: float, max_age: float):
+        self.max_pages = max_pages
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self.version: Optional[int] = None
+        self._checked_at = 0.0
+        self._pages: "OrderedDict[Hashable, CatalogPage]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._version_warning_logged = False
+
+    def refresh_version(self, db: Session) -> Optional[int]:
+        """Сверяет версию каталога с БД; при изменении сбрасывает страницы"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self.version
+
+        try:
+            version = db.execute(CATALOG_VERSION_QUERY).scalar()
+        except Exception as e:
+            # Миграция не применена или БД недоступна: страницы живут не дольше
+            # интервала проверки версии
+            db.rollback()
+            self._log_version_error(e)
+            version = None
+        return self._apply_version(version, now)
+
+    async def refresh_version_async(self, db: AsyncSession) -> Optional[int]:
+        """То же для асинхронной сессии (корзина)"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self.version
+
+        try:
+            version = (await db.execute(CATALOG_VERSION_QUERY)).scalar()
+        except Exception as e:
+            await db.rollback()
+            self._log_version_error(e)
+            version = None
+        return self._apply_version(version, now)
+
+    def _log_version_error(self, error: Exception) -> None:
+        if not self._version_warning_logged:
+            logger.warning(f"Не удалось прочитать версию каталога: {error}")
+            self._version_warning_logged = True
+
+    def _apply_version(self, version: Optional[int], now: float) -> Optional[int]:
+        with self._lock:
+            self._checked_at = now
+            if version is None or version != self.version:
+                self._pages.clear()
+                self.version = version
+        return version
+
+    def invalidate(self) -> None:
+        """Сбрасывает все страницы (изменение каталога в этом процессе)"""
+        with self._lock:
+            self._pages.clear()
+            # Следующий запрос перечитает версию из БД
+            self._checked_at = 0.0
+
+    def get(self, key: Hashable) -> Optional[CatalogPage]:
+        with self._lock:
+            page = self._pages.get(key)
+            if page is None:
+                return None
+            if page.version != self.version or time.monotonic() - page.built_at > self.max_age:
+                del self._pages[key]
+                return None
+            self._pages.move_to_end(key)
+            return page
+
+    def put(self, key: Hashable, data: Any, headers: Dict[str, str], version: Optional[int]) -> CatalogPage:
+        body = orjson.dumps(data)
+        page = CatalogPage(
+            body=body,
+            etag=f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+            headers=headers,
+            version=version,
+            built_at=time.monotonic()
+        )
+        with self._lock:
+            # Версия сменилась, пока страница собиралась - не сохраняем устаревшее
+            if CATALOG_PROJECTION_ENABLED and version == self.version:
+                self._pages[key] = page
+                self._pages.move_to_end(key)
+                while len(self._pages) > self.max_pages:
+                    self._pages.popitem(last=False)
+        return page
+
+    def respond(
+            self,
+            request: Request,
+            db: Session,
+            key: Hashable,
+            build: Callable[[], Tuple[Any, Dict[str, str]]]
+    ) -> Response:
+        """
+        Отдает страницу каталога: из проекции или собранную build().
+        build возвращает (данные для JSON, дополнительные заголовки).
+        """
+        version = self.refresh_version(db)
+        page = self.get(key)
+        if page is None:
+            self.misses += 1
+            data, headers = build()
+            page = self.put(key, data, headers, version)
+        else:
+            self.hits += 1
+
+        headers = dict(page.headers, ETag=page.etag)
+        headers["Cache-Control"] = CATALOG_CACHE_CONTROL
+
+        if etag_matches(request.headers.get("if-none-match"), page.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        return Response(content=page.body, media_type="application/json", headers=headers)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pages = len(self._pages)
+        return {
+            "enabled": CATALOG_PROJECTION_ENABLED,
+            "version": self.version,
+            "pages": pages,
+            "max_pages": self.max_pages,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified
+        }
+
+
+catalog_projection = CatalogProjection(
+    CATALOG_PROJECTION_MAX_PAGES, CATALOG_VERSION_CHECK_INTERVAL, CATALOG_PROJECTION_MAX_AGE
+)
@@ -1,84 +1,340 @@
 # app/services/discount_service.py
+"""
+Скидки на товары и категории и промо-коды на корзину.
+
+Правила хранятся в таблице discounts (миграция АИС c4a7e2d91b56) с окном
+действия starts_at/ends_at в UTC. Для расчета цен они компилируются в индекс
+в памяти: товар -> правила, категория -> правила, код -> правило, только
+действующие сейчас. Поиск скидки для позиции - обращение к словарю.
+
+Согласованность между воркерами uvicorn: любое изменение discounts сдвигает
+версию в строке discount_version (триггер в той же транзакции, миграция
+c4a7e2d91b56), поэтому новая версия видна не раньше новых правил. Воркер
+читает версию до правил, сверяет ее не чаще DISCOUNT_VERSION_CHECK_INTERVAL
+секунд и при изменении перечитывает правила, перекомпилируя только
+изменившиеся (по updated_at, который ставит триггер). Начало и конец окон индекс отслеживает
+сам: ближайшая граница хранится в снимке, после нее действующие правила
+пересобираются без обращения к БД.
+"""
 import logging
+import threading
 import time
-from typing import Dict, List, Optional
-from datetime import datetime, timedelta
-import random
-
-logger = logging.getLogger(__name__)
-
-# Хранилище скидок в памяти (в реальном приложении должно быть в БД)
-discounts = {}
-active_promotions = []
-
-
-def initialize():
-    """Инициализация сервиса скидок"""
-    logger.info("Инициализация сервиса скидок")
-    # В реальном приложении здесь должна быть загрузка скидок из БД
-    # Для примера создадим несколько тестовых скидок
-    create_sample_discounts()
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+from sqlalchemy import or_, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
-def create_sample_discounts():
-    """Создание тестовых скидок для демонстрации"""
-    global discounts, active_promotions
+from app.database import SessionLocal
+from app.models import Discount
+from app.utils.config import DISCOUNT_VERSION_CHECK_INTERVAL
 
-    # Очистка существующих скидок
-    discounts = {}
-    active_promotions = []
+logger = logging.getLogger(__name__)
 
-    # Создание скидок на категории продуктов
-    discounts["category:1"] = {"type": "percentage", "value": 10, "expires": datetime.now() + timedelta(days=30)}
-    discounts["category:2"] = {"type": "percentage", "value": 15, "expires": datetime.now() + timedelta(days=15)}
+PERCENTAGE = "percentage"
+FIXED = "fixed"
+
+SCOPE_PRODUCT = "product"
+SCOPE_CATEGORY = "category"
+SCOPE_PROMO = "promo"
+
+# Читается до правил: версия, зафиксированная вместе с изменением, гарантирует,
+# что следующий запрос правил это изменение уже видит
+DISCOUNT_VERSION_QUERY = text("SELECT version FROM discount_version WHERE id = 1")
+
+
+def _rules_query(now: datetime):
+    # Закончившиеся и выключенные правила в индекс не попадают
+    return select(Discount).where(
+        Discount.is_active.is_(True),
+        or_(Discount.ends_at.is_(None), Discount.ends_at > now)
+    )
+
+
+@dataclass(frozen=True)
+class DiscountRule:
+    id: int
+    scope: str
+    target_id: Optional[int]
+    code: Optional[str]
+    discount_type: str
+    value: float
+    name: Optional[str]
+    starts_at: Optional[datetime]
+    ends_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+    @classmethod
+    def from_model(cls, discount: Discount) -> "DiscountRule":
+        return cls(
+            id=discount.id,
+            scope=discount.scope,
+            target_id=discount.target_id,
+            code=discount.code.upper() if discount.code else None,
+            discount_type=discount.discount_type,
+            value=float(discount.value),
+            name=discount.name,
+            starts_at=discount.starts_at,
+            ends_at=discount.ends_at,
+            updated_at=discount.updated_at
+        )
+
+    @property
+    def key(self):
+        return self.code if self.scope == SCOPE_PROMO else self.target_id
+
+    def active_at(self, now: datetime) -> bool:
+        return (self.starts_at is None or self.starts_at <= now) and (self.ends_at is None or now < self.ends_at)
+
+    def next_boundary(self, now: datetime) -> Optional[datetime]:
+        """Ближайший момент после now, когда правило включится или выключится"""
+        moments = [moment for moment in (self.starts_at, self.ends_at) if moment is not None and moment > now]
+        return min(moments) if moments else None
+
+    def amount(self, price: float) -> float:
+        """Скидка на единицу товара (или на сумму - для промо-кода)"""
+        if self.discount_type == PERCENTAGE:
+            return price * self.value / 100
+        return min(self.value, price)
+
+    def describe(self) -> Dict[str, Any]:
+        return {"has_discount": True, "discount_value": self.value, "discount_type": self.discount_type}
+
+
+Bucket = Dict[Any, Tuple[DiscountRule, ...]]
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """Действующие правила на момент сборки; заменяется целиком, читается без блокировки"""
+    by_product: Bucket
+    by_category: Bucket
+    by_code: Bucket
+    valid_until: Optional[datetime]
+
+
+EMPTY_SNAPSHOT = IndexSnapshot({}, {}, {}, None)
+
+
+def compile_snapshot(rules: Iterable[DiscountRule], now: datetime) -> IndexSnapshot:
+    buckets = {scope: defaultdict(list) for scope in (SCOPE_PRODUCT, SCOPE_CATEGORY, SCOPE_PROMO)}
+    valid_until = None
+    for rule in sorted(rules, key=lambda rule: rule.id):
+        boundary = rule.next_boundary(now)
+        if boundary is not None and (valid_until is None or boundary < valid_until):
+            valid_until = boundary
+        if rule.active_at(now) and rule.scope in buckets:
+            buckets[rule.scope][rule.key].append(rule)
+
+    def freeze(bucket):
+        return {key: tuple(rules) for key, rules in bucket.items()}
+
+    return IndexSnapshot(
+        freeze(buckets[SCOPE_PRODUCT]), freeze(buckets[SCOPE_CATEGORY]), freeze(buckets[SCOPE_PROMO]), valid_until
+    )
+
+
+def patch_snapshot(
+        snapshot: IndexSnapshot,
+        changed: List[DiscountRule],
+        replaced: List[DiscountRule],
+        now: datetime
+) -> IndexSnapshot:
+    """
+    Новый снимок с учетом измененных правил: changed - новые версии,
+    replaced - прежние версии измененных и удаленных. Копируются только
+    затронутые словари, остальные правила не перекомпилируются.
+    """
+    buckets = {
+        SCOPE_PRODUCT: dict(snapshot.by_product),
+        SCOPE_CATEGORY: dict(snapshot.by_category),
+        SCOPE_PROMO: dict(snapshot.by_code),
+    }
+    stale_ids = {rule.id for rule in replaced}
+    for rule in replaced:
+        bucket = buckets.get(rule.scope)
+        if bucket is None or rule.key not in bucket:
+            continue
+        rules = tuple(other for other in bucket[rule.key] if other.id not in stale_ids)
+        if rules:
+            bucket[rule.key] = rules
+        else:
+            del bucket[rule.key]
+
+    valid_until = snapshot.valid_until
+    for rule in changed:
+        boundary = rule.next_boundary(now)
+        if boundary is not None and (valid_until is None or boundary < valid_until):
+            valid_until = boundary
+        bucket = buckets.get(rule.scope)
+        if bucket is not None and rule.active_at(now):
+            rules = tuple(other for other in bucket.get(rule.key, ()) if other.id != rule.id) + (rule,)
+            bucket[rule.key] = tuple(sorted(rules, key=lambda other: other.id))
+
+    return IndexSnapshot(buckets[SCOPE_PRODUCT], buckets[SCOPE_CATEGORY], buckets[SCOPE_PROMO], valid_until)
+
+
+def best_rule(rules: Iterable[DiscountRule], price: float) -> Tuple[Optional[DiscountRule], float]:
+    """Правило с наибольшей скидкой для цены и размер этой скидки"""
+    best, best_amount = None, 0.0
+    for rule in rules:
+        amount = rule.amount(price)
+        if amount > best_amount:
+            best, best_amount = rule, amount
+    return best, best_amount
+
+
+class DiscountIndex:
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self.version: Optional[int] = None
+        self._checked_at = 0.0
+        self._rules: Dict[int, DiscountRule] = {}
+        self._snapshot = EMPTY_SNAPSHOT
+        self._lock = threading.Lock()
+        self._version_warning_logged = False
+        self.reloads = 0
+        self.recompiled_rules = 0
+        # Номер снимка: меняется при любой замене действующих правил (ключ кешей расчета)
+        self.generation = 0
+
+    def _due(self, force: bool) -> bool:
+        return force or time.monotonic() - self._checked_at >= self.check_interval
+
+    def refresh(self, db: Session, force: bool = False) -> None:
+        """Сверяет версию правил с БД и при изменении применяет изменения"""
+        if self._due(force):
+            try:
+                version = db.execute(DISCOUNT_VERSION_QUERY).scalar()
+                if force or version is None or version != self.version:
+                    discounts = db.execute(_rules_query(datetime.utcnow())).scalars().all()
+                    self.load(discounts, version)
+            except SQLAlchemyError as e:
+                db.rollback()
+                self._log_version_error(e)
+            self._checked_at = time.monotonic()
+
+    async def refresh_async(self, db: AsyncSession, force: bool = False) -> None:
+        if self._due(force):
+            try:
+                version = (await db.execute(DISCOUNT_VERSION_QUERY)).scalar()
+                if force or version is None or version != self.version:
+                    discounts = (await db.execute(_rules_query(datetime.utcnow()))).scalars().all()
+                    self.load(discounts, version)
+            except SQLAlchemyError as e:
+                await db.rollback()
+                self._log_version_error(e)
+            self._checked_at = time.monotonic()
+
+    def _log_version_error(self, error: Exception) -> None:
+        # Миграция не применена или БД недоступна: работаем с последними загруженными правилами
+        if not self._version_warning_logged:
+            logger.warning(f"Не удалось обновить правила скидок: {error}")
+            self._version_warning_logged = True
+
+    def load(self, discounts: Iterable[Discount], version: Optional[int]) -> None:
+        """Применяет прочитанные из БД правила, перекомпилируя только изменившиеся"""
+        now = datetime.utcnow()
+        with self._lock:
+            fresh: Dict[int, DiscountRule] = {}
+            changed: List[DiscountRule] = []
+            replaced: List[DiscountRule] = []
+            for discount in discounts:
+                current = self._rules.get(discount.id)
+                if current is not None and discount.updated_at is not None and current.updated_at == discount.updated_at:
+                    fresh[discount.id] = current
+                    continue
+                rule = DiscountRule.from_model(discount)
+                fresh[rule.id] = rule
+                changed.append(rule)
+                if current is not None:
+                    replaced.append(current)
+            replaced.extend(rule for rule_id, rule in self._rules.items() if rule_id not in fresh)
+
+            self._rules = fresh
+            self.version = version
+            self.reloads += 1
+            if changed or replaced:
+                self.recompiled_rules += len(changed)
+                self._snapshot = patch_snapshot(self._snapshot, changed, replaced, now)
+                self.generation += 1
+                removed = sum(1 for rule in replaced if rule.id not in fresh)
+                logger.info(f"Правила скидок обновлены (версия {version}): изменено {len(changed)}, удалено {removed}")
+
+    def snapshot(self, now: Optional[datetime] = None) -> IndexSnapshot:
+        """Действующие правила; при переходе границы окна снимок пересобирается"""
+        snapshot = self._snapshot
+        if snapshot.valid_until is not None:
+            now = now or datetime.utcnow()
+            if now >= snapshot.valid_until:
+                with self._lock:
+                    if self._snapshot.valid_until is not None and now >= self._snapshot.valid_until:
+                        self._snapshot = compile_snapshot(self._rules.values(), now)
+                        self.generation += 1
+                    snapshot = self._snapshot
+        return snapshot
+
+    def rules(self) -> List[DiscountRule]:
+        return list(self._rules.values())
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "version": self.version,
+            "rules": len(self._rules),
+            "active_product_rules": len(snapshot.by_product),
+            "active_category_rules": len(snapshot.by_category),
+            "active_promo_codes": len(snapshot.by_code),
+            "valid_until": snapshot.valid_until.isoformat() if snapshot.valid_until else None,
+            "generation": self.generation,
+            "reloads": self.reloads,
+            "recompiled_rules": self.recompiled_rules
+        }
 
-    # Создание скидок на конкретные продукты
-    discounts["product:101"] = {"type": "fixed", "value": 100, "expires": datetime.now() + timedelta(days=7)}
-    discounts["product:102"] = {"type": "percentage", "value": 20, "expires": datetime.now() + timedelta(days=5)}
 
-    # Создание промо-кодов
-    discounts["promo:WELCOME"] = {"type": "percentage", "value": 10, "expires": datetime.now() + timedelta(days=90)}
-    discounts["promo:SUMMER"] = {"type": "fixed", "value": 500, "expires": datetime.now() + timedelta(days=60)}
+discount_index = DiscountIndex(DISCOUNT_VERSION_CHECK_INTERVAL)
 
-    # Активные промо-акции
-    active_promotions = [
-        {"id": 1, "name": "Летняя распродажа", "discount": 15, "expires": datetime.now() + timedelta(days=30)},
-        {"id": 2, "name": "Черная пятница", "discount": 30, "expires": datetime.now() + timedelta(days=3)},
-    ]
 
-    logger.info(f"Создано {len(discounts)} тестовых скидок и {len(active_promotions)} промо-акций")
+def initialize():
+    """Инициализация сервиса скидок: первая загрузка правил из БД"""
+    logger.info("Инициализация сервиса скидок")
+    db = SessionLocal()
+    try:
+        discount_index.refresh(db, force=True)
+    finally:
+        db.close()
+    logger.info(f"Загружено правил скидок: {len(discount_index.rules())}")
 
 
-def get_product_discount(product_id: int, category_id: Optional[int] = None) -> Dict:
+def get_product_discount(product_id: int, category_id: Optional[int] = None, price: Optional[float] = None) -> Dict:
     """
-    Получение скидки для конкретного продукта
+    Получение скидки для конкретного продукта.
+    Скидка на товар важнее скидки на категорию; из нескольких правил
+    выбирается наибольшее для указанной цены (без цены - первое).
 
     Args:
         product_id: ID продукта
         category_id: ID категории продукта
+        price: цена продукта
 
     Returns:
         Dict: Информация о скидке
     """
-    result = {"has_discount": False, "discount_value": 0, "discount_type": None}
+    snapshot = discount_index.snapshot()
+    rules = snapshot.by_product.get(product_id) or snapshot.by_category.get(category_id) or ()
+    if not rules:
+        return {"has_discount": False, "discount_value": 0, "discount_type": None}
+    rule = best_rule(rules, price)[0] if price is not None else rules[0]
+    return (rule or rules[0]).describe()
 
-    # Проверка скидки на продукт
-    product_key = f"product:{product_id}"
-    if product_key in discounts and datetime.now() < discounts[product_key]["expires"]:
-        result["has_discount"] = True
-        result["discount_value"] = discounts[product_key]["value"]
-        result["discount_type"] = discounts[product_key]["type"]
-        return result
 
-    # Проверка скидки на категорию
-    if category_id:
-        category_key = f"category:{category_id}"
-        if category_key in discounts and datetime.now() < discounts[category_key]["expires"]:
-            result["has_discount"] = True
-            result["discount_value"] = discounts[category_key]["value"]
-            result["discount_type"] = discounts[category_key]["type"]
-
-    return result
+def find_promo_code(promo_code: str) -> Optional[DiscountRule]:
+    rules = discount_index.snapshot().by_code.get(promo_code.strip().upper())
+    return rules[0] if rules else None
 
 
 def apply_promo_code(promo_code: str) -> Dict:
@@ -91,71 +347,113 @@ def apply_promo_code(promo_code: str) -> Dict:
     Returns:
         Dict: Результат применения промо-кода
     """
-    promo_key = f"promo:{promo_code.upper()}"
-
-    if promo_key in discounts and datetime.now() < discounts[promo_key]["expires"]:
-        return {
-            "valid": True,
-            "discount_value": discounts[promo_key]["value"],
-            "discount_type": discounts[promo_key]["type"],
-            "message": f"Промо-код успешно применен! Скидка: {discounts[promo_key]['value']}%"
-            if discounts[promo_key]["type"] == "percentage"
-            else f"Промо-код успешно применен! Скидка: {discounts[promo_key]['value']} руб."
-        }
-    else:
+    rule = find_promo_code(promo_code)
+    if rule is None:
         return {
             "valid": False,
             "message": "Промо-код недействителен или истек срок его действия"
         }
+    return {
+        "valid": True,
+        "discount_value": rule.value,
+        "discount_type": rule.discount_type,
+        "message": f"Промо-код успешно применен! Скидка: {rule.value:g}%"
+        if rule.discount_type == PERCENTAGE
+        else f"Промо-код успешно применен! Скидка: {rule.value:g} руб."
+    }
 
 
 def get_active_promotions() -> List[Dict]:
     """
-    Получение списка активных акций
+    Получение списка активных акций (действующих скидок с названием)
 
     Returns:
         List[Dict]: Список активных акций
     """
-    return [promo for promo in active_promotions if datetime.now() < promo["expires"]]
+    now = datetime.utcnow()
+    return [
+        {
+            "id": rule.id,
+            "name": rule.name,
+            "discount": rule.value,
+            "discount_type": rule.discount_type,
+            "scope": rule.scope,
+            "target_id": rule.target_id,
+            "expires": rule.ends_at
+        }
+        for rule in sorted(discount_index.rules(), key=lambda rule: rule.id)
+        if rule.name and rule.scope != SCOPE_PROMO and rule.active_at(now)
+    ]
 
 
-def calculate_cart_discount(cart_items: List[Dict]) -> Dict:
+def calculate_cart_discount(cart_items: List[Dict], promo_code: Optional[str] = None) -> Dict:
     """
-    Расчет общей скидки для корзины
+    Расчет скидок для корзины за один проход по позициям
 
     Args:
-        cart_items: Список товаров в корзине
+        cart_items: Позиции корзины (product_id, category_id, price, quantity)
+        promo_code: Промо-код на сумму корзины
 
     Returns:
-        Dict: Информация о скидке
+        Dict: Позиции с ценами и скидками и итоги по корзине
     """
-    total_price = sum(item.get("price", 0) * item.get("quantity", 1) for item in cart_items)
-    discount_amount = 0
+    snapshot = discount_index.snapshot()
+    by_product, by_category = snapshot.by_product, snapshot.by_category
 
-    # Расчет скидок для каждого товара
+    lines = []
+    total_price = 0.0
+    items_discount = 0.0
     for item in cart_items:
         product_id = item.get("product_id")
-        category_id = item.get("category_id")
         quantity = item.get("quantity", 1)
-        price = item.get("price", 0)
-
-        if product_id:
-            discount = get_product_discount(product_id, category_id)
-            if discount["has_discount"]:
-                if discount["discount_type"] == "percentage":
-                    # Процентная скидка
-                    item_discount = (price * discount["discount_value"] / 100) * quantity
-                else:
-                    # Фиксированная скидка
-                    item_discount = min(discount["discount_value"], price) * quantity
-
-                discount_amount += item_discount
-
-    # Общие данные о скидке
+        price = item.get("price") or 0
+
+        rules = by_product.get(product_id) or by_category.get(item.get("category_id")) or ()
+        rule, unit_discount = best_rule(rules, price) if rules else (None, 0.0)
+
+        line_price = price * quantity
+        line_discount = round(unit_discount * quantity, 2)
+        total_price += line_price
+        items_discount += line_discount
+        lines.append({
+            "product_id": product_id,
+            "quantity": quantity,
+            "price": price,
+            "discount_id": rule.id if rule else None,
+            "discount_type": rule.discount_type if rule else None,
+            "discount_value": rule.value if rule else 0,
+            "discount_amount": line_discount,
+            "total": round(line_price - line_discount, 2)
+        })
+
+    # Промо-код применяется к сумме после скидок на товары
+    promo = None
+    promo_discount = 0.0
+    if promo_code:
+        rules = snapshot.by_code.get(promo_code.strip().upper())
+        if rules:
+            rule = rules[0]
+            promo_discount = round(rule.amount(total_price - items_discount), 2)
+            promo = {
+                "code": rule.code,
+                "valid": True,
+                "discount_type": rule.discount_type,
+                "discount_value": rule.value,
+                "discount_amount": promo_discount
+            }
+        else:
+            promo = {"code": promo_code.strip().upper(), "valid": False, "discount_amount": 0}
+
+    total_price = round(total_price, 2)
+    discount_amount = round(items_discount + promo_discount, 2)
     return {
+        "lines": lines,
         "total_price": total_price,
+        "items_discount": round(items_discount, 2),
+        "promo": promo,
+        "promo_discount": promo_discount,
         "discount_amount": discount_amount,
-        "final_price": total_price - discount_amount,
+        "final_price": round(total_price - discount_amount, 2),
         "has_discount": discount_amount > 0,
         "discount_percentage": round((discount_amount / total_price) * 100, 2) if total_price > 0 else 0
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,188 @@
+# app/services/image_pipeline.py
+"""
+Обработка изображений товаров: миниатюра фиксированного размера, варианты
+AVIF/WebP/JPEG для srcset и исходник под именем из хеша содержимого.
+
+Декодирование и сжатие занимают процессор на сотни миллисекунд, поэтому
+выполняются в пуле процессов, а не в цикле событий. Файлы записывает
+app.services.image_storage. Манифест вариантов сохраняется
+в products.image_variants, адреса для API строит
+app.utils.images.image_variant_urls.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from PIL import Image, ImageOps, features
+
+from app.utils.config import (
+    IMAGE_VARIANT_WIDTHS, IMAGE_VARIANT_FORMATS, IMAGE_THUMBNAIL_SIZE, IMAGE_QUALITY, IMAGE_PROCESSING_WORKERS
+)
+from app.utils.images import image_name
+
+logger = logging.getLogger(__name__)
+
+# Меняется при изменении алгоритма обработки: входит в хеш, чтобы новые
+# варианты не совпали по имени с закешированными браузерами старыми
+PIPELINE_VERSION = 1
+
+FILE_EXTENSIONS = {"avif": "avif", "webp": "webp", "jpeg": "jpg", "png": "png", "gif": "gif"}
+
+SAVE_OPTIONS = {
+    "avif": {"speed": 6},
+    "webp": {"method": 4},
+    "jpeg": {"optimize": True, "progressive": True},
+}
+
+
+class InvalidImageError(ValueError):
+    """Загруженный файл не удалось прочитать как изображение"""
+
+
+def _avif_supported() -> bool:
+    try:
+        if features.check("avif"):
+            return True
+    except Exception:
+        pass
+    try:
+        # Для Pillow без встроенной поддержки AVIF
+        import pillow_avif  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _resolve_formats() -> List[str]:
+    formats = []
+    for fmt in (fmt.strip().lower() for fmt in IMAGE_VARIANT_FORMATS):
+        if fmt not in ("avif", "webp", "jpeg") or fmt in formats:
+            continue
+        if fmt == "avif" and not _avif_supported():
+            logger.warning("Pillow собран без поддержки AVIF, варианты AVIF не создаются")
+            continue
+        formats.append(fmt)
+    # JPEG нужен всегда: запасной источник в <picture> и image_url для старых клиентов
+    if "jpeg" not in formats:
+        formats.append("jpeg")
+    return formats
+
+
+IMAGE_FORMATS = _resolve_formats()
+
+
+def content_hash(data: bytes, widths: Iterable[int], formats: Iterable[str], thumbnail_size: int, quality: int) -> str:
+    """Хеш исходника вместе с настройками обработки (20 hex-символов)"""
+    digest = hashlib.sha256(data)
+    digest.update(f"{PIPELINE_VERSION}:{sorted(widths)}:{list(formats)}:{thumbnail_size}:{quality}".encode())
+    return digest.hexdigest()[:20]
+
+
+def _encode(image: Image.Image, fmt: str, quality: int) -> bytes:
+    if fmt == "jpeg" and image.mode != "RGB":
+        # У JPEG нет прозрачности: подкладываем белый фон
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A") if image.mode == "RGBA" else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt.upper(), quality=quality, **SAVE_OPTIONS[fmt])
+    return buffer.getvalue()
+
+
+def render_variants(
+        data: bytes,
+        widths: List[int],
+        formats: List[str],
+        thumbnail_size: int,
+        quality: int
+) -> Tuple[Dict[str, Any], Dict[str, bytes]]:
+    """
+    Строит все варианты изображения. Выполняется в процессе пула, поэтому
+    получает настройки аргументами и ничего не пишет на диск.
+    Возвращает (манифест, {имя файла: содержимое}).
+    """
+    digest = content_hash(data, widths, formats, thumbnail_size, quality)
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            source_format = (source.format or "jpeg").lower()
+            # Ориентация из EXIF (фото с телефона), первый кадр для анимаций
+            image = ImageOps.exif_transpose(source)
+            image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        raise InvalidImageError(f"Не удалось прочитать изображение: {e}")
+
+    files: Dict[str, bytes] = {}
+    original = f"{digest}.{FILE_EXTENSIONS.get(source_format, 'img')}"
+    files[original] = data
+
+    # Не увеличиваем: ширины больше исходника заменяются шириной исходника
+    largest = min(image.width, max(widths))
+    targets = sorted({width for width in widths if width < largest} | {largest})
+
+    variants: Dict[str, Dict[str, str]] = {fmt: {} for fmt in formats}
+    for width in targets:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        for fmt in formats:
+            name = f"{digest}-{width}w.{FILE_EXTENSIONS[fmt]}"
+            files[name] = _encode(resized, fmt, quality)
+            variants[fmt][str(width)] = name
+
+    thumbnail = ImageOps.fit(image, (thumbnail_size, thumbnail_size), Image.LANCZOS)
+    thumbnails = {}
+    for fmt in ("webp", "jpeg"):
+        name = f"{digest}-thumb.{FILE_EXTENSIONS[fmt]}"
+        files[name] = _encode(thumbnail, fmt, quality)
+        thumbnails[fmt] = name
+
+    manifest = {
+        "hash": digest,
+        "original": original,
+        "width": image.width,
+        "height": image.height,
+        "thumbnail": thumbnails,
+        "variants": variants,
+        "fallback": variants["jpeg"][str(largest)]
+    }
+    return manifest, files
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=max(1, IMAGE_PROCESSING_WORKERS))
+    return _executor
+
+
+async def process_image(data: bytes) -> Tuple[Dict[str, Any], Dict[str, bytes]]:
+    """Строит варианты изображения в пуле процессов"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(), render_variants,
+        data, IMAGE_VARIANT_WIDTHS, IMAGE_FORMATS, IMAGE_THUMBNAIL_SIZE, IMAGE_QUALITY
+    )
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def stored_files(image_url: Optional[str], manifest: Optional[Dict[str, Any]]) -> Set[str]:
+    """Имена всех файлов изображения товара (исходник, варианты, миниатюры)"""
+    names: Set[str] = {image_name(image_url)}
+    if manifest:
+        names.add(manifest.get("original"))
+        names.update((manifest.get("thumbnail") or {}).values())
+        for widths in (manifest.get("variants") or {}).values():
+            names.update(widths.values())
+    names.discard(None)
+    return names
@@ -0,0 +1,284 @@
+# app/services/image_storage.py
+"""
+Хранилище файлов изображений товаров с асинхронным интерфейсом.
+
+Файловые операции выполняются в пуле потоков, чтобы загрузка нескольких
+мегабайт не останавливала цикл событий воркера. Запись потоковая,
+частями: размер проверяется по мере записи, а файл становится видимым
+только целиком - локально через rename временного файла, в S3 через
+завершение multipart-загрузки.
+
+Бэкенд выбирается IMAGE_STORAGE_BACKEND: local (PRODUCTS_IMAGES_DIR,
+раздается через /images) или s3 (любое S3-совместимое хранилище, локально
+MinIO; адреса строятся от IMAGES_PUBLIC_URL).
+"""
+import asyncio
+import logging
+import mimetypes
+import os
+import uuid
+from abc import ABC, abstractmethod
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, Optional
+
+import anyio
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.utils.config import (
+    IMAGE_STORAGE_BACKEND, IMAGE_STORAGE_CHUNK_SIZE, PRODUCTS_IMAGES_DIR,
+    S3_ENDPOINT_URL, S3_BUCKET, S3_ACCESS_KEY, S3_SECRET_KEY, S3_REGION, S3_MULTIPART_CHUNK_SIZE
+)
+from app.utils.images import HASHED_NAME_RE, IMMUTABLE_CACHE_CONTROL
+
+logger = logging.getLogger(__name__)
+
+
+class UploadTooLargeError(ValueError):
+    """Загружаемый файл превышает допустимый размер"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"Файл больше допустимого размера {max_size / (1024 * 1024):g} МБ")
+
+
+def _check_name(name: str) -> str:
+    # Имена строит конвейер обработки, но путь за пределы хранилища недопустим
+    if not name or os.path.basename(name) != name or name.startswith("."):
+        raise ValueError(f"Недопустимое имя файла изображения: {name!r}")
+    return name
+
+
+async def iter_bytes(data: bytes, chunk_size: int = IMAGE_STORAGE_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+
+async def iter_upload(file: UploadFile, chunk_size: int = IMAGE_STORAGE_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def read_upload(file: UploadFile, max_size: int) -> bytes:
+    """
+    Читает загрузку частями и прерывает чтение, как только превышен
+    max_size, не дочитывая остаток в память
+    """
+    if file.size is not None and file.size > max_size:
+        raise UploadTooLargeError(max_size)
+    data = bytearray()
+    async for chunk in iter_upload(file):
+        if len(data) + len(chunk) > max_size:
+            raise UploadTooLargeError(max_size)
+        data += chunk
+    return bytes(data)
+
+
+class ImageStorage(ABC):
+    """Интерфейс хранилища; имена файлов плоские (хеш содержимого + суффикс)"""
+
+    @abstractmethod
+    async def save_stream(
+            self, name: str, chunks: AsyncIterable[bytes], max_size: Optional[int] = None
+    ) -> int:
+        """Записывает файл из потока частей, возвращает размер"""
+
+    @abstractmethod
+    async def exists(self, name: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def delete_many(self, names: Iterable[str]) -> None:
+        ...
+
+    async def save(self, name: str, content: bytes) -> int:
+        return await self.save_stream(name, iter_bytes(content))
+
+    async def save_files(self, files: Dict[str, bytes]) -> None:
+        """
+        Записывает варианты изображения. Имена содержат хеш содержимого,
+        поэтому уже существующий файл не перезаписывается.
+        """
+        async def save_missing(name: str, content: bytes) -> None:
+            if not await self.exists(name):
+                await self.save(name, content)
+
+        # Варианты независимы: пишем параллельно (для S3 это отдельные запросы)
+        await asyncio.gather(*(save_missing(name, content) for name, content in files.items()))
+
+    async def delete(self, name: str) -> None:
+        await self.delete_many([name])
+
+
+class LocalImageStorage(ImageStorage):
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, _check_name(name))
+
+    async def save_stream(
+            self, name: str, chunks: AsyncIterable[bytes], max_size: Optional[int] = None
+    ) -> int:
+        path = self._path(name)
+        # Временный файл в том же каталоге: rename атомарен в пределах файловой системы
+        tmp_path = os.path.join(self.directory, f".{name}.{uuid.uuid4().hex}.tmp")
+        handle = await run_in_threadpool(self._open_tmp, tmp_path)
+        size = 0
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise UploadTooLargeError(max_size)
+                await run_in_threadpool(handle.write, chunk)
+            await run_in_threadpool(self._commit, handle, tmp_path, path)
+        except BaseException:
+            # Синхронно: при отмене запроса await в обработчике тоже был бы отменен
+            self._discard(handle, tmp_path)
+            raise
+        return size
+
+    def _open_tmp(self, tmp_path: str):
+        os.makedirs(self.directory, exist_ok=True)
+        return open(tmp_path, "wb")
+
+    @staticmethod
+    def _commit(handle, tmp_path: str, path: str) -> None:
+        handle.close()
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _discard(handle, tmp_path: str) -> None:
+        handle.close()
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+    async def exists(self, name: str) -> bool:
+        return await run_in_threadpool(os.path.exists, self._path(name))
+
+    def _remove_files(self, names: Iterable[str]) -> None:
+        for name in names:
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Не удалось удалить файл изображения {name}: {e}")
+
+    async def delete_many(self, names: Iterable[str]) -> None:
+        await run_in_threadpool(self._remove_files, list(names))
+
+
+class S3ImageStorage(ImageStorage):
+    """
+    S3-совместимое хранилище (AWS S3, MinIO). Клиент boto3 синхронный
+    и потокобезопасный, поэтому вызовы выполняются в пуле потоков.
+    """
+
+    def __init__(self, bucket: str, endpoint_url: str, access_key: str, secret_key: str, region: str):
+        import boto3  # необязательная зависимость, нужна только для IMAGE_STORAGE_BACKEND=s3
+
+        self.bucket = bucket
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            region_name=region
+        )
+
+    def _object_params(self, name: str) -> Dict[str, str]:
+        params = {
+            "Bucket": self.bucket,
+            "Key": _check_name(name),
+            "ContentType": mimetypes.guess_type(name)[0] or "application/octet-stream"
+        }
+        if HASHED_NAME_RE.match(name):
+            params["CacheControl"] = IMMUTABLE_CACHE_CONTROL
+        return params
+
+    async def save_stream(
+            self, name: str, chunks: AsyncIterable[bytes], max_size: Optional[int] = None
+    ) -> int:
+        params = self._object_params(name)
+        buffer = bytearray()
+        parts = []
+        upload_id = None
+        size = 0
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise UploadTooLargeError(max_size)
+                buffer += chunk
+                if len(buffer) >= S3_MULTIPART_CHUNK_SIZE:
+                    if upload_id is None:
+                        upload = await run_in_threadpool(self._client.create_multipart_upload, **params)
+                        upload_id = upload["UploadId"]
+                    parts.append(await self._upload_part(params, upload_id, len(parts) + 1, bytes(buffer)))
+                    buffer.clear()
+
+            if upload_id is None:
+                # Небольшой файл - одним запросом
+                await run_in_threadpool(self._client.put_object, Body=bytes(buffer), **params)
+            else:
+                if buffer:
+                    parts.append(await self._upload_part(params, upload_id, len(parts) + 1, bytes(buffer)))
+                # Объект появляется в бакете только после завершения загрузки
+                await run_in_threadpool(
+                    self._client.complete_multipart_upload,
+                    Bucket=self.bucket, Key=params["Key"], UploadId=upload_id,
+                    MultipartUpload={"Parts": parts}
+                )
+        except BaseException:
+            if upload_id is not None:
+                # Незавершенные части занимают место в бакете, убираем их даже при отмене запроса
+                with anyio.CancelScope(shield=True):
+                    await run_in_threadpool(
+                        self._client.abort_multipart_upload, Bucket=self.bucket, Key=params["Key"], UploadId=upload_id
+                    )
+            raise
+        return size
+
+    async def _upload_part(self, params: Dict[str, str], upload_id: str, number: int, body: bytes) -> Dict:
+        response = await run_in_threadpool(
+            self._client.upload_part,
+            Bucket=self.bucket, Key=params["Key"], UploadId=upload_id, PartNumber=number, Body=body
+        )
+        return {"ETag": response["ETag"], "PartNumber": number}
+
+    async def exists(self, name: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            await run_in_threadpool(self._client.head_object, Bucket=self.bucket, Key=_check_name(name))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    async def delete_many(self, names: Iterable[str]) -> None:
+        keys = [{"Key": _check_name(name)} for name in names]
+        # DeleteObjects принимает не больше 1000 ключей за запрос
+        for start in range(0, len(keys), 1000):
+            response = await run_in_threadpool(
+                self._client.delete_objects,
+                Bucket=self.bucket, Delete={"Objects": keys[start:start + 1000], "Quiet": True}
+            )
+            for error in response.get("Errors", []):
+                logger.warning(f"Не удалось удалить файл изображения {error.get('Key')}: {error.get('Message')}")
+
+
+def create_image_storage() -> ImageStorage:
+    if IMAGE_STORAGE_BACKEND == "s3":
+        logger.info(f"Изображения хранятся в S3: {S3_ENDPOINT_URL}/{S3_BUCKET}")
+        return S3ImageStorage(S3_BUCKET, S3_ENDPOINT_URL, S3_ACCESS_KEY, S3_SECRET_KEY, S3_REGION)
+    return LocalImageStorage(PRODUCTS_IMAGES_DIR)
+
+
+image_storage = create_image_storage()
@@ -0,0 +1,48 @@
+# app/services/product_loader.py
+"""
+Пакетная загрузка товаров по списку id.
+
+Корзина, оформление и отмена заказа ссылаются на товары по product_id;
+вместо запроса на каждую позицию все товары загружаются одним
+SELECT ... WHERE id IN (...) и возвращаются словарем id -> Product.
+"""
+
+from typing import Dict, Iterable, List
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Product
+
+
+def _unique_ids(product_ids: Iterable[int]) -> List[int]:
+    """Убирает дубли, сохраняя порядок"""
+    return list(dict.fromkeys(int(product_id) for product_id in product_ids))
+
+
+def products_by_ids_query(product_ids: List[int], for_update: bool = False):
+    query = select(Product).where(Product.id.in_(product_ids))
+    if for_update:
+        # Блокировка строк в порядке id - одинаковом для всех транзакций;
+        # populate_existing перечитывает остаток у уже загруженных в сессию объектов
+        query = (
+            query.order_by(Product.id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+    return query
+
+
+async def load_products(
+        db: AsyncSession, product_ids: Iterable[int], for_update: bool = False
+) -> Dict[int, Product]:
+    """
+    Загружает товары одним запросом (асинхронная сессия).
+    for_update=True блокирует строки до конца транзакции.
+    """
+    ids = _unique_ids(product_ids)
+    if not ids:
+        return {}
+    result = await db.execute(products_by_ids_query(ids, for_update))
+    return {product.id: product for product in result.scalars()}
+
@@ -0,0 +1,92 @@
+# app/services/product_search.py
+"""
+Поиск по каталогу для витрины.
+
+Использует колонку products.search_vector (tsvector, конфигурация russian)
+и триграммный индекс по названию - обе создаются миграцией АИС d9b24e6f1c38,
+так как база у сервисов общая.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, literal, literal_column
+from sqlalchemy.orm import Session
+
+from app.models import Product
+from app.utils.images import image_variant_urls
+
+SEARCH_CONFIG = literal_column("'russian'::regconfig")
+
+# Колонка не объявлена в модели Product: вектор нужен только в условиях и ранжировании
+search_vector = literal_column("products.search_vector")
+
+
+def _prefix_query(text: str):
+    tokens = re.findall(r"\w+", text.lower())
+    if not tokens:
+        return None
+    return func.to_tsquery(SEARCH_CONFIG, " & ".join(f"{token}:*" for token in tokens))
+
+
+def search_products(
+        db: Session, text: str, limit: int = 20, category_id: Optional[int] = None
+) -> List[Tuple[Product, float]]:
+    """
+    Возвращает пары (товар, релевантность), лучшие совпадения первыми.
+    При пустом результате морфологического поиска (опечатка) ищет
+    по триграммному сходству названия.
+    """
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, text)
+    relevance = func.ts_rank_cd(search_vector, tsquery)
+    query = db.query(Product, relevance.label("rank")).filter(search_vector.op("@@")(tsquery))
+    if category_id:
+        query = query.filter(Product.category_id == category_id)
+    rows = query.order_by(relevance.desc(), Product.id).limit(limit).all()
+    if rows:
+        return rows
+
+    similarity = func.word_similarity(text, Product.name)
+    query = db.query(Product, similarity.label("rank")).filter(literal(text).op("<%")(Product.name))
+    if category_id:
+        query = query.filter(Product.category_id == category_id)
+    return query.order_by(similarity.desc(), Product.id).limit(limit).all()
+
+
+def suggest(db: Session, text: str, limit: int = 5) -> List[str]:
+    """Названия товаров, похожие на запрос (исправление опечаток)"""
+    similarity = func.word_similarity(text, Product.name)
+    rows = (
+        db.query(Product.name, func.max(similarity).label("score"))
+        .filter(literal(text).op("<%")(Product.name))
+        .group_by(Product.name)
+        .order_by(literal_column("score").desc())
+        .limit(limit)
+        .all()
+    )
+    return [row.name for row in rows]
+
+
+def autocomplete(db: Session, text: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """Товары, у которых слова начинаются с введенных символов"""
+    tsquery = _prefix_query(text)
+    if tsquery is None:
+        return []
+    rows = (
+        db.query(Product.id, Product.name, Product.price, Product.image_url, Product.image_variants)
+        .filter(search_vector.op("@@")(tsquery))
+        .order_by(func.ts_rank_cd(search_vector, tsquery).desc(), Product.name)
+        .limit(limit)
+        .all()
+    )
+    result = []
+    for row in rows:
+        images = image_variant_urls(row.image_variants)
+        result.append({
+            "id": row.id,
+            "name": row.name,
+            "price": row.price,
+            "image_url": row.image_url,
+            # Миниатюра для выпадающего списка вместо полноразмерного изображения
+            "thumbnail": images["thumbnail"] if images else row.image_url
+        })
+    return result
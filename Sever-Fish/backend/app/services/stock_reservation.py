@@ -0,0 +1,85 @@
+# app/services/stock_reservation.py
+"""
+Резервирование и возврат товаров на склад.
+
+Проверка остатка и списание выполняются в одной транзакции под блокировкой
+строк товаров (SELECT ... FOR UPDATE). Строки блокируются в порядке id,
+поэтому два параллельных заказа с пересекающимися товарами не могут
+взаимно заблокировать друг друга, а второй из них увидит уже уменьшенный
+остаток - перепродажа невозможна.
+
+Функции не делают commit: транзакцию завершает вызывающий код вместе
+с записью заказа, чтобы заказ и списание фиксировались атомарно.
+"""
+
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models import Product
+from app.services.product_loader import load_products
+
+
+class InsufficientStockError(Exception):
+    """На складе недостаточно товара для резервирования"""
+
+    def __init__(self, product: Product, requested: int):
+        self.product_id = product.id
+        self.product_name = product.name
+        self.available = product.stock_quantity or 0
+        self.requested = requested
+        super().__init__(
+            f"Недостаточно товара '{self.product_name}' на складе. В наличии: {self.available}"
+        )
+
+
+def aggregate_quantities(lines: Iterable[Tuple[int, int]]) -> Dict[int, int]:
+    """Суммирует количество по product_id и упорядочивает по id (порядок блокировок)"""
+    quantities: Dict[int, int] = {}
+    for product_id, quantity in lines:
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return dict(sorted(quantities.items()))
+
+
+async def reserve_stock(db: AsyncSession, quantities: Dict[int, int]) -> Dict[int, Product]:
+    """
+    Блокирует товары и списывает количество со склада.
+
+    Возвращает словарь id -> Product для существующих товаров (отсутствующие
+    в каталоге пропускаются). При нехватке любого товара выбрасывает
+    InsufficientStockError до каких-либо изменений.
+    """
+    products = await load_products(db, sorted(quantities), for_update=True)
+
+    for product_id, product in products.items():
+        if (product.stock_quantity or 0) < quantities[product_id]:
+            raise InsufficientStockError(product, quantities[product_id])
+
+    for product_id, product in products.items():
+        product.stock_quantity = (product.stock_quantity or 0) - quantities[product_id]
+
+    return products
+
+
+# Инкремент в SQL атомарен и не требует чтения остатка; executemany в порядке id
+# сохраняет детерминированный порядок блокировок
+_release_stmt = (
+    update(Product.__table__)
+    .where(Product.__table__.c.id == bindparam("product_id"))
+    .values(stock_quantity=Product.__table__.c.stock_quantity + bindparam("quantity"))
+)
+
+
+def _release_params(quantities: Dict[int, int]):
+    return [
+        {"product_id": product_id, "quantity": quantity}
+        for product_id, quantity in sorted(quantities.items())
+    ]
+
+
+def release_stock_sync(db: Session, quantities: Dict[int, int]) -> None:
+    """Возвращает товары на склад (синхронная сессия, отмена заказа)"""
+    if quantities:
+        db.execute(_release_stmt, _release_params(quantities))
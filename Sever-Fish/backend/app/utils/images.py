@@ -0,0 +1,112 @@
+# app/utils/images.py
+"""
+Адреса вариантов изображений товаров и раздача их с долгим кешированием.
+
+Варианты строит app/services/image_pipeline.py и описывает манифестом,
+который хранится в products.image_variants (JSON):
+
+    {
+        "hash": "3f9c...",                     # хеш содержимого и настроек обработки
+        "width": 1600, "height": 1200,         # размер исходника
+        "thumbnail": {"webp": "3f9c...-thumb.webp", "jpeg": "3f9c...-thumb.jpg"},
+        "variants": {"avif": {"320": "3f9c...-320w.avif", ...}, "webp": {...}, "jpeg": {...}}
+    }
+
+Имена файлов зависят только от содержимого, поэтому файл по такому имени
+никогда не меняется и может кешироваться браузером навсегда.
+"""
+import mimetypes
+import os
+import re
+from typing import Any, Dict, Optional
+
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+from app.utils.config import IMAGES_PUBLIC_URL
+
+IMAGES_URL_PREFIX = "/images"
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Порядок источников в <picture>: браузер берет первый поддерживаемый формат
+IMAGE_MIME_TYPES = {"avif": "image/avif", "webp": "image/webp", "jpeg": "image/jpeg"}
+
+HASHED_NAME_RE = re.compile(r"^[0-9a-f]{20}[.-]")
+
+# Не во всех версиях Python mimetypes знает современные форматы, а по нему
+# выставляется Content-Type при раздаче и загрузке в S3
+mimetypes.add_type("image/avif", ".avif")
+mimetypes.add_type("image/webp", ".webp")
+
+
+def image_url(filename: str, base_url: str = "") -> str:
+    # В S3 файлы раздает бакет или CDN по собственному адресу
+    if IMAGES_PUBLIC_URL:
+        return f"{IMAGES_PUBLIC_URL}/{filename}"
+    return f"{base_url}{IMAGES_URL_PREFIX}/{filename}"
+
+
+def absolute_image_url(url: Optional[str], base_url: str) -> Optional[str]:
+    """Полный адрес для image_url из БД (относительный /images/... или внешний)"""
+    if not url:
+        return None
+    return f"{base_url}{url}" if url.startswith("/") else url
+
+
+def image_name(url: Optional[str]) -> Optional[str]:
+    """Имя файла в хранилище по image_url; None для внешних ссылок"""
+    if not url:
+        return None
+    for prefix in (IMAGES_PUBLIC_URL, IMAGES_URL_PREFIX):
+        if prefix and url.startswith(f"{prefix}/"):
+            return url[len(prefix) + 1:]
+    return None
+
+
+def image_variant_urls(manifest: Optional[Dict[str, Any]], base_url: str = "") -> Optional[Dict[str, Any]]:
+    """
+    Адреса вариантов для ответа API: миниатюра, запасной JPEG и srcset
+    по форматам. Для изображений без манифеста (не обработанных) - None.
+    """
+    if not manifest or not manifest.get("variants"):
+        return None
+
+    sources = []
+    fallback = None
+    for fmt, mime_type in IMAGE_MIME_TYPES.items():
+        widths = manifest["variants"].get(fmt)
+        if not widths:
+            continue
+        ordered = sorted(widths.items(), key=lambda item: int(item[0]))
+        sources.append({
+            "type": mime_type,
+            "srcset": ", ".join(f"{image_url(name, base_url)} {width}w" for width, name in ordered)
+        })
+        if fmt == "jpeg":
+            fallback = image_url(ordered[-1][1], base_url)
+
+    thumbnails = manifest.get("thumbnail") or {}
+    thumbnail = thumbnails.get("webp") or thumbnails.get("jpeg")
+
+    return {
+        "thumbnail": image_url(thumbnail, base_url) if thumbnail else None,
+        "fallback": fallback,
+        "width": manifest.get("width"),
+        "height": manifest.get("height"),
+        "sources": sources
+    }
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    Раздача изображений: файлам с хешем содержимого в имени выставляется
+    immutable-кеширование, остальные (загруженные до обработки вариантов)
+    раздаются как раньше, с проверкой ETag/Last-Modified.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if HASHED_NAME_RE.match(os.path.basename(full_path)):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
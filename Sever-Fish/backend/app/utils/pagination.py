@@ -0,0 +1,155 @@
+# app/utils/pagination.py
+"""
+Keyset (курсорная) пагинация каталога.
+
+Вместо OFFSET/LIMIT следующая страница выбирается условием "после последней
+строки предыдущей страницы" по паре (ключ сортировки, id). При наличии
+индекса (ключ, id) стоимость любой страницы одинакова - база не перебирает
+пропущенные строки.
+
+Курсор - непрозрачная строка (base64url от JSON с ключом сортировки,
+значением и id последней строки). Клиент передает его без изменений.
+
+NULL в ключе сортировки обрабатываются в порядке PostgreSQL по умолчанию:
+ASC - NULLS LAST, DESC - NULLS FIRST (совпадает с обходом btree-индекса).
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select, text
+from sqlalchemy.orm import Query, Session
+
+from app.models import Product
+
+# sort_by -> (колонка, по убыванию)
+PRODUCT_SORT_KEYS: Dict[str, Tuple[Any, bool]] = {
+    "name": (Product.name, False),
+    "price": (Product.price, False),
+    "price_desc": (Product.price, True),
+    "category": (Product.category_id, False),
+    "created_at": (Product.created_at, True),
+}
+
+# Ниже этого порога оценка заменяется точным COUNT(*) - он все равно дешевый
+EXACT_COUNT_THRESHOLD = 1000
+
+
+class InvalidCursorError(ValueError):
+    """Курсор поврежден или выдан для другой сортировки"""
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(sort_by: str, value: Any, row_id: int) -> str:
+    payload = json.dumps({"s": sort_by, "v": _encode_value(value), "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str) -> Tuple[Any, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, row_id = _decode_value(payload["v"]), int(payload["id"])
+        cursor_sort = payload["s"]
+    except Exception:
+        raise InvalidCursorError("Некорректный курсор")
+    if cursor_sort != sort_by:
+        raise InvalidCursorError("Курсор выдан для другой сортировки")
+    return value, row_id
+
+
+def _order_by(column, descending: bool):
+    if descending:
+        return column.desc().nulls_first(), Product.id.desc()
+    return column.asc().nulls_last(), Product.id.asc()
+
+
+def _after(column, descending: bool, value: Any, row_id: int):
+    """Условие "строка идет после (value, row_id)" в порядке _order_by"""
+    if descending:
+        # NULLS FIRST: сначала группа NULL (id по убыванию), затем значения по убыванию
+        if value is None:
+            return or_(and_(column.is_(None), Product.id < row_id), column.isnot(None))
+        return or_(column < value, and_(column == value, Product.id < row_id))
+
+    # NULLS LAST: значения по возрастанию, затем группа NULL (id по возрастанию)
+    if value is None:
+        return and_(column.is_(None), Product.id > row_id)
+    return or_(column > value, and_(column == value, Product.id > row_id), column.is_(None))
+
+
+def paginate_products(
+        query: Query, sort_by: str, limit: int, cursor: Optional[str] = None, offset: int = 0
+) -> Tuple[List[Product], Optional[str]]:
+    """
+    Возвращает страницу товаров и курсор следующей страницы (None - страница последняя).
+    query - запрос по Product с уже примененными фильтрами, без сортировки и OFFSET/LIMIT.
+    offset - устаревший skip; учитывается только без курсора.
+    """
+    column, descending = PRODUCT_SORT_KEYS[sort_by]
+
+    query = query.order_by(*_order_by(column, descending))
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort_by)
+        query = query.filter(_after(column, descending, value, row_id))
+    elif offset:
+        query = query.offset(offset)
+
+    # Лишняя строка показывает, есть ли следующая страница, без отдельного запроса
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort_by, getattr(last, column.key), last.id)
+
+    return rows, next_cursor
+
+
+def estimate_total(db: Session, query: Query) -> Tuple[int, bool]:
+    """
+    Оценка количества строк запроса по плану PostgreSQL (EXPLAIN без выполнения).
+    Небольшие оценки уточняются точным COUNT(*). Возвращает (количество, точное ли).
+    """
+    statement = query.order_by(None).statement
+    try:
+        compiled = statement.compile(dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True})
+        # Точка сохранения: ошибка EXPLAIN откатывает только ее, и транзакция
+        # остается пригодной для COUNT(*) ниже
+        with db.begin_nested():
+            plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+    except Exception:
+        estimate = 0
+
+    if estimate >= EXACT_COUNT_THRESHOLD:
+        return estimate, False
+
+    count = db.execute(select(func.count()).select_from(statement.subquery())).scalar()
+    return count, True
+
+
+def pagination_headers(next_cursor: Optional[str], total: Optional[Tuple[int, bool]] = None) -> Dict[str, str]:
+    headers = {}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if total is not None:
+        headers["X-Total-Count"] = str(total[0])
+        headers["X-Total-Count-Exact"] = "true" if total[1] else "false"
+    return headers
@@ -0,0 +1,108 @@
+"""
+Нагрузочная проверка резервирования товаров при оформлении заказа.
+
+Создает временный товар с заданным остатком и запускает много параллельных
+"оформлений", каждое в своей сессии и транзакции. Проверяет, что продано
+не больше, чем было на складе, и что итоговый остаток сходится.
+
+Режим --naive воспроизводит прежнюю схему (чтение остатка без блокировки,
+проверка в Python, списание во второй транзакции) для сравнения.
+
+Запуск из каталога Sever-Fish/backend (нужна доступная БД из DATABASE_URL):
+    python bench_checkout_concurrency.py --stock 50 --buyers 200 --quantity 1
+    python bench_checkout_concurrency.py --naive
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+from app.database import AsyncSessionLocal, async_engine
+from app.models import Product
+from app.services.stock_reservation import InsufficientStockError, reserve_stock
+
+
+async def checkout_locked(product_id: int, quantity: int) -> bool:
+    async with AsyncSessionLocal() as db:
+        try:
+            await reserve_stock(db, {product_id: quantity})
+        except InsufficientStockError:
+            await db.rollback()
+            return False
+        await db.commit()
+        return True
+
+
+async def checkout_naive(product_id: int, quantity: int) -> bool:
+    async with AsyncSessionLocal() as db:
+        product = await db.get(Product, product_id)
+        if product.stock_quantity < quantity:
+            return False
+        # Запись заказа (первая транзакция)
+        await db.commit()
+        # Списание остатка по ранее прочитанному значению (вторая транзакция)
+        product.stock_quantity -= quantity
+        await db.commit()
+        return True
+
+
+async def run(args) -> int:
+    async with AsyncSessionLocal() as db:
+        product = Product(name="bench-checkout-concurrency", price=1.0, stock_quantity=args.stock)
+        db.add(product)
+        await db.commit()
+        product_id = product.id
+
+    checkout = checkout_naive if args.naive else checkout_locked
+    latencies = []
+
+    async def buyer() -> bool:
+        started = time.perf_counter()
+        try:
+            return await checkout(product_id, args.quantity)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    try:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(buyer() for _ in range(args.buyers)))
+        elapsed = time.perf_counter() - started
+
+        async with AsyncSessionLocal() as db:
+            final_stock = (await db.get(Product, product_id)).stock_quantity
+    finally:
+        async with AsyncSessionLocal() as db:
+            await db.delete(await db.get(Product, product_id))
+            await db.commit()
+        await async_engine.dispose()
+
+    sold = sum(results) * args.quantity
+    oversold = sold > args.stock or final_stock != args.stock - sold or final_stock < 0
+    latencies.sort()
+
+    print(f"Режим:                {'naive' if args.naive else 'FOR UPDATE'}")
+    print(f"Покупателей:          {args.buyers} (по {args.quantity} шт.)")
+    print(f"Начальный остаток:    {args.stock}")
+    print(f"Успешных заказов:     {sum(results)} (продано {sold} шт.)")
+    print(f"Итоговый остаток:     {final_stock} (ожидается {args.stock - sold})")
+    print(f"Время:                {elapsed:.3f} с, {args.buyers / elapsed:.1f} оформлений/с")
+    print(f"Задержка p50/p95:     {statistics.median(latencies) * 1000:.1f} / "
+          f"{latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} мс")
+    print("Результат:            " + ("ПЕРЕПРОДАЖА" if oversold else "OK, перепродажи нет"))
+
+    return 1 if oversold else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка резервирования остатков под параллельной нагрузкой")
+    parser.add_argument("--stock", type=int, default=50, help="начальный остаток товара")
+    parser.add_argument("--buyers", type=int, default=200, help="число параллельных оформлений")
+    parser.add_argument("--quantity", type=int, default=1, help="количество в одном заказе")
+    parser.add_argument("--naive", action="store_true", help="прежняя схема без блокировок")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
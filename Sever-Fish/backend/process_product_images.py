@@ -0,0 +1,83 @@
+"""
+Построение вариантов для изображений, загруженных до появления обработки
+(products.image_variants пуст): миниатюра, AVIF/WebP/JPEG по ширинам.
+
+Исходные файлы не удаляются - на них могут ссылаться закешированные
+страницы и сторонние сайты. Товары обрабатываются параллельно в пуле
+процессов с теми же настройками, что и при загрузке через API.
+
+Запуск из каталога Sever-Fish/backend (нужна БД из DATABASE_URL):
+    python process_product_images.py
+    python process_product_images.py --dry-run
+"""
+
+import argparse
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from app.database import SessionLocal
+from app.models import Product
+from app.services import image_pipeline
+from app.services.image_storage import image_storage
+from app.utils.config import (
+    PRODUCTS_IMAGES_DIR, IMAGE_VARIANT_WIDTHS, IMAGE_THUMBNAIL_SIZE, IMAGE_QUALITY, IMAGE_PROCESSING_WORKERS
+)
+from app.utils.images import IMAGES_URL_PREFIX, image_url
+
+
+def render_file(path):
+    with open(path, "rb") as source:
+        data = source.read()
+    return image_pipeline.render_variants(
+        data, IMAGE_VARIANT_WIDTHS, image_pipeline.IMAGE_FORMATS, IMAGE_THUMBNAIL_SIZE, IMAGE_QUALITY
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Варианты изображений для уже загруженных товаров")
+    parser.add_argument("--workers", type=int, default=IMAGE_PROCESSING_WORKERS, help="процессов обработки")
+    parser.add_argument("--dry-run", action="store_true", help="только показать, что будет обработано")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        products = db.query(Product).filter(
+            Product.image_url.like(f"{IMAGES_URL_PREFIX}/%"), Product.image_variants.is_(None)
+        ).order_by(Product.id).all()
+
+        pending = []
+        for product in products:
+            path = os.path.join(PRODUCTS_IMAGES_DIR, os.path.basename(product.image_url))
+            if os.path.exists(path):
+                pending.append((product, path))
+            else:
+                print(f"[{product.id}] файл не найден: {path}")
+
+        print(f"Товаров без вариантов изображения: {len(pending)}")
+        if args.dry_run or not pending:
+            return
+
+        processed = 0
+        with ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+            futures = [(product, executor.submit(render_file, path)) for product, path in pending]
+            for product, future in futures:
+                try:
+                    manifest, files = future.result()
+                except image_pipeline.InvalidImageError as e:
+                    print(f"[{product.id}] пропущен: {e}")
+                    continue
+                asyncio.run(image_storage.save_files(files))
+                product.image_url = image_url(manifest["fallback"])
+                product.image_variants = manifest
+                db.commit()
+                processed += 1
+                print(f"[{product.id}] {product.name}: {len(files)} файлов")
+
+        print(f"Обработано: {processed}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Тесты запускаются из Sever-Fish/backend: пакет app должен импортироваться
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
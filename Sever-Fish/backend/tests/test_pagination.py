@@ -0,0 +1,66 @@
+"""Пагинация каталога: курсор и устаревший skip на SQLite в памяти"""
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.models import Category, Product
+from app.utils.pagination import paginate_products
+
+PRICES = [30.0, 10.0, None, 20.0, 10.0, 50.0, None, 40.0]
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Category.__table__, Product.__table__])
+    with Session(engine) as session:
+        session.add(Category(id=1, name="Рыба"))
+        for index, price in enumerate(PRICES, start=1):
+            session.add(Product(id=index, name=f"Товар {index:02d}", price=price, category_id=1))
+        session.commit()
+        yield session
+
+
+def _all_pages(db, sort_by, limit, **kwargs):
+    ids, cursor = [], None
+    while True:
+        rows, cursor = paginate_products(db.query(Product), sort_by, limit, cursor, **kwargs)
+        ids.extend(product.id for product in rows)
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize("sort_by", ["name", "price", "price_desc"])
+def test_cursor_pages_cover_ordered_list(db, sort_by):
+    expected = [product.id for product in paginate_products(db.query(Product), sort_by, 100)[0]]
+    assert sorted(expected) == list(range(1, len(PRICES) + 1))
+    assert _all_pages(db, sort_by, 3) == expected
+
+
+@pytest.mark.parametrize("sort_by", ["name", "price", "price_desc"])
+def test_skip_pages_match_cursor_pages(db, sort_by):
+    expected = [product.id for product in paginate_products(db.query(Product), sort_by, 100)[0]]
+
+    ids = []
+    for skip in range(0, len(PRICES), 3):
+        rows, _ = paginate_products(db.query(Product), sort_by, 3, offset=skip)
+        ids.extend(product.id for product in rows)
+
+    assert ids == expected
+
+
+def test_skip_sets_next_cursor(db):
+    rows, cursor = paginate_products(db.query(Product), "name", 3, offset=3)
+    assert [product.id for product in rows] == [4, 5, 6]
+
+    rows, cursor = paginate_products(db.query(Product), "name", 3, cursor)
+    assert [product.id for product in rows] == [7, 8]
+    assert cursor is None
+
+
+def test_cursor_ignores_offset(db):
+    _, cursor = paginate_products(db.query(Product), "name", 3)
+    rows, _ = paginate_products(db.query(Product), "name", 3, cursor, offset=5)
+    assert [product.id for product in rows] == [4, 5, 6]
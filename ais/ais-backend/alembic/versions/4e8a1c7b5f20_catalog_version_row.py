@@ -0,0 +1,65 @@
+"""catalog_version_row
+
+Revision ID: 4e8a1c7b5f20
+Revises: d9b24e6f1c38
+Create Date: 2026-10-18 17:25:44.301862
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e8a1c7b5f20'
+down_revision: Union[str, None] = 'd9b24e6f1c38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Версия каталога для кешей витрины: любое изменение товаров или категорий
+    # (из АИС или Север-Рыбы) сдвигает версию. Это строка, а не последовательность:
+    # nextval виден другим сессиям до COMMIT, и воркер мог запомнить новую версию
+    # вместе со старыми данными. Строка обновляется в транзакции изменения и
+    # становится видна одновременно с данными
+    op.create_table(
+        'catalog_version',
+        sa.Column('id', sa.Integer(), server_default='1', nullable=False),
+        sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+        sa.CheckConstraint('id = 1', name='ck_catalog_version_single_row'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO catalog_version (id, version) VALUES (1, 0)")
+
+    # Версия сдвигается один раз за транзакцию (флаг - локальная настройка
+    # транзакции). Триггеры отложенные и срабатывают при COMMIT: блокировка строки
+    # версии держится только на время фиксации, поэтому параллельные оформления
+    # заказов, которые меняют остатки, не ждут друг друга до конца транзакции
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS trigger AS $$
+        BEGIN
+            IF current_setting('catalog.version_bumped', true) IS DISTINCT FROM 'on' THEN
+                UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+                PERFORM set_config('catalog.version_bumped', 'on', true);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+    for table in ('products', 'categories'):
+        op.execute(f"""
+            CREATE CONSTRAINT TRIGGER {table}_catalog_version
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW EXECUTE FUNCTION bump_catalog_version()
+        """)
+
+
+def downgrade() -> None:
+    for table in ('categories', 'products'):
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_catalog_version ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS bump_catalog_version()")
+    op.drop_table('catalog_version')
@@ -0,0 +1,51 @@
+"""cart_items_server_side_store
+
+Revision ID: 7c1e4b9a2d53
+Revises: bc02f5348534
+Create Date: 2026-10-18 11:02:14.512930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e4b9a2d53'
+down_revision: Union[str, None] = 'bc02f5348534'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Время добавления позиции (модель корзины Север-Рыбы уже ожидает эту колонку)
+    op.execute("ALTER TABLE cart_items ADD COLUMN IF NOT EXISTS created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now()")
+
+    # Схлопываем дубликаты (user_id, product_id) в одну строку с суммарным количеством
+    op.execute("""
+        UPDATE cart_items AS keep
+        SET quantity = dup.total
+        FROM (
+            SELECT MIN(id) AS id, SUM(quantity) AS total
+            FROM cart_items
+            GROUP BY user_id, product_id
+            HAVING COUNT(*) > 1
+        ) AS dup
+        WHERE keep.id = dup.id
+    """)
+    op.execute("""
+        DELETE FROM cart_items AS extra
+        USING cart_items AS keep
+        WHERE extra.user_id = keep.user_id
+          AND extra.product_id = keep.product_id
+          AND extra.id > keep.id
+    """)
+
+    # Одна строка на товар в корзине пользователя: позволяет делать атомарный upsert
+    op.create_index('uq_cart_items_user_product', 'cart_items', ['user_id', 'product_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_cart_items_user_product', table_name='cart_items')
+    op.drop_column('cart_items', 'created_at')
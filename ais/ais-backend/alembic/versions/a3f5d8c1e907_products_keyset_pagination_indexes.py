@@ -0,0 +1,40 @@
+"""products_keyset_pagination_indexes
+
+Revision ID: a3f5d8c1e907
+Revises: 7c1e4b9a2d53
+Create Date: 2026-10-18 13:40:52.118406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f5d8c1e907'
+down_revision: Union[str, None] = '7c1e4b9a2d53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Индексы (ключ сортировки, id) для курсорной пагинации каталога Север-Рыбы:
+# страница выбирается диапазоном по индексу, без OFFSET
+INDEXES = [
+    ('ix_products_name_id', ['name', 'id']),
+    ('ix_products_price_id', ['price', 'id']),
+    ('ix_products_created_at_id', ['created_at', 'id']),
+    ('ix_products_category_id_id', ['category_id', 'id']),
+    ('ix_products_category_name_id', ['category_id', 'name', 'id']),
+    ('ix_products_category_price_id', ['category_id', 'price', 'id']),
+]
+
+
+def upgrade() -> None:
+    for name, columns in INDEXES:
+        op.create_index(name, 'products', columns, unique=False)
+
+
+def downgrade() -> None:
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='products')
@@ -0,0 +1,29 @@
+"""product_image_variants
+
+Revision ID: b6d2f9a4c813
+Revises: 4e8a1c7b5f20
+Create Date: 2026-10-18 19:02:17.518340
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6d2f9a4c813'
+down_revision: Union[str, None] = '4e8a1c7b5f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Манифест вариантов изображения товара: миниатюра и AVIF/WebP/JPEG
+    # по ширинам для srcset. Пустой у изображений, загруженных до обработки
+    op.add_column('products', sa.Column('image_variants', JSONB(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('products', 'image_variants')
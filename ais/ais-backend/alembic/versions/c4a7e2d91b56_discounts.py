@@ -0,0 +1,101 @@
+"""discounts
+
+Revision ID: c4a7e2d91b56
+Revises: b6d2f9a4c813
+Create Date: 2026-10-18 20:11:36.904125
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a7e2d91b56'
+down_revision: Union[str, None] = 'b6d2f9a4c813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Скидки на товары и категории и промо-коды с окном действия
+    # (раньше витрина держала их в словаре в памяти)
+    op.create_table(
+        'discounts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('scope', sa.String(length=20), nullable=False),
+        sa.Column('target_id', sa.Integer(), nullable=True),
+        sa.Column('code', sa.String(length=50), nullable=True),
+        sa.Column('discount_type', sa.String(length=20), server_default='percentage', nullable=False),
+        sa.Column('value', sa.Float(), nullable=False),
+        sa.Column('starts_at', sa.DateTime(), nullable=True),
+        sa.Column('ends_at', sa.DateTime(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), server_default='true', nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.CheckConstraint("scope IN ('product', 'category', 'promo')", name='ck_discounts_scope'),
+        sa.CheckConstraint("discount_type IN ('percentage', 'fixed')", name='ck_discounts_type'),
+        sa.CheckConstraint('value >= 0', name='ck_discounts_value'),
+        sa.CheckConstraint(
+            "(scope = 'promo' AND code IS NOT NULL) OR (scope <> 'promo' AND target_id IS NOT NULL)",
+            name='ck_discounts_target'
+        ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('code')
+    )
+    op.create_index(op.f('ix_discounts_id'), 'discounts', ['id'], unique=False)
+    op.create_index('ix_discounts_scope_target', 'discounts', ['scope', 'target_id'], unique=False)
+
+    # updated_at ставит БД: по нему витрина перекомпилирует только измененные правила,
+    # в том числе после правок в обход ORM
+    op.execute("""
+        CREATE OR REPLACE FUNCTION discounts_touch_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := clock_timestamp();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER discounts_updated_at
+        BEFORE UPDATE ON discounts
+        FOR EACH ROW EXECUTE FUNCTION discounts_touch_updated_at()
+    """)
+
+    # Версия правил для воркеров витрины - строка, как версия каталога: она
+    # обновляется в транзакции изменения и становится видна одновременно с правилами
+    op.create_table(
+        'discount_version',
+        sa.Column('id', sa.Integer(), server_default='1', nullable=False),
+        sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+        sa.CheckConstraint('id = 1', name='ck_discount_version_single_row'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO discount_version (id, version) VALUES (1, 0)")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_discount_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE discount_version SET version = version + 1 WHERE id = 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    # Один раз на оператор: массовая правка правил сдвигает версию один раз
+    op.execute("""
+        CREATE TRIGGER discounts_version
+        AFTER INSERT OR UPDATE OR DELETE ON discounts
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_discount_version()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS discounts_version ON discounts")
+    op.execute("DROP TRIGGER IF EXISTS discounts_updated_at ON discounts")
+    op.execute("DROP FUNCTION IF EXISTS bump_discount_version()")
+    op.execute("DROP FUNCTION IF EXISTS discounts_touch_updated_at()")
+    op.drop_table('discount_version')
+    op.drop_index('ix_discounts_scope_target', table_name='discounts')
+    op.drop_index(op.f('ix_discounts_id'), table_name='discounts')
+    op.drop_table('discounts')
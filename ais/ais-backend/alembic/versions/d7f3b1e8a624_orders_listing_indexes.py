@@ -0,0 +1,37 @@
+"""orders_listing_indexes
+
+Revision ID: d7f3b1e8a624
+Revises: c4a7e2d91b56
+Create Date: 2026-10-18 21:05:47.382915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7f3b1e8a624'
+down_revision: Union[str, None] = 'c4a7e2d91b56'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Индексы для списка заказов АИС: фильтр по статусу или пользователю
+# с сортировкой по дате и курсорной пагинацией (ключ, id) без OFFSET
+INDEXES = [
+    ('ix_orders_created_at_id', ['created_at', 'id']),
+    ('ix_orders_status_created_at_id', ['status', 'created_at', 'id']),
+    ('ix_orders_user_id_created_at_id', ['user_id', 'created_at', 'id']),
+]
+
+
+def upgrade() -> None:
+    for name, columns in INDEXES:
+        op.create_index(name, 'orders', columns, unique=False)
+
+
+def downgrade() -> None:
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='orders')
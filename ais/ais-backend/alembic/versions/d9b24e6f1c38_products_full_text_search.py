@@ -0,0 +1,42 @@
+"""products_full_text_search
+
+Revision ID: d9b24e6f1c38
+Revises: a3f5d8c1e907
+Create Date: 2026-10-18 15:12:07.904331
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9b24e6f1c38'
+down_revision: Union[str, None] = 'a3f5d8c1e907'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Триграммы для нечеткого поиска (опечатки, подсказки) и индексируемого ILIKE
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # Поисковый вектор с русской морфологией: название весомее описания.
+    # Генерируемая колонка пересчитывается самой БД при любом изменении товара
+    op.execute("""
+        ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('russian', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('russian', coalesce(description, '')), 'B')
+        ) STORED
+    """)
+
+    op.execute("CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING gin (search_vector)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (name gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_products_name_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_products_search_vector")
+    op.drop_column('products', 'search_vector')
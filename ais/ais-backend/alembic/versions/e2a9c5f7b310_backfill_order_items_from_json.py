@@ -0,0 +1,126 @@
+"""backfill_order_items_from_json
+
+Revision ID: e2a9c5f7b310
+Revises: d7f3b1e8a624
+Create Date: 2026-10-18 21:48:13.560274
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a9c5f7b310'
+down_revision: Union[str, None] = 'd7f3b1e8a624'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+# Заказов за один INSERT ... SELECT
+BATCH_SIZE = 1000
+
+# Внешние ключи order_items.product_id (имя зависит от того, какой миграцией
+# создавалась таблица)
+DROP_PRODUCT_FKEYS = """
+    DO $$
+    DECLARE fk name;
+    BEGIN
+        FOR fk IN
+            SELECT c.conname
+            FROM pg_constraint c
+            JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = ANY(c.conkey)
+            WHERE c.conrelid = 'order_items'::regclass
+              AND c.contype = 'f'
+              AND a.attname = 'product_id'
+        LOOP
+            EXECUTE format('ALTER TABLE order_items DROP CONSTRAINT %I', fk);
+        END LOOP;
+    END $$
+"""
+
+# Позиции из JSON orders.order_items переносятся в order_items только для заказов,
+# у которых строк там еще нет (витрина уже пишет позиции в таблицу). JSON
+# разбирается на стороне базы. Позиции товаров, удаленных из каталога, тоже
+# переносятся - с product_id = NULL, названием и ценой из JSON, чтобы состав
+# заказа сходился с total_price.
+BACKFILL_BATCH = sa.text("""
+    WITH inserted AS (
+        INSERT INTO order_items (order_id, product_id, quantity, price, product_name)
+        SELECT o.id,
+               p.id,
+               COALESCE(round((item.value ->> 'quantity')::numeric)::integer, 1),
+               COALESCE((item.value ->> 'price')::double precision, 0),
+               COALESCE(item.value ->> 'product_name', item.value ->> 'name', p.name)
+        FROM orders o
+        CROSS JOIN LATERAL jsonb_array_elements(o.order_items::jsonb) WITH ORDINALITY AS item(value, position)
+        LEFT JOIN products p ON p.id = (item.value ->> 'product_id')::integer
+        WHERE o.id >= :first_id AND o.id < :next_id
+          AND jsonb_typeof(o.order_items::jsonb) = 'array'
+          AND NOT EXISTS (SELECT 1 FROM order_items oi WHERE oi.order_id = o.id)
+        ORDER BY o.id, item.position
+        RETURNING product_id
+    )
+    SELECT count(*) AS total, count(*) FILTER (WHERE product_id IS NULL) AS without_product
+    FROM inserted
+""")
+
+
+def upgrade() -> None:
+    # Позиции читаются пакетно по order_id = ANY(...)
+    op.create_index('ix_order_items_order_id', 'order_items', ['order_id'], unique=False)
+
+    # Название на момент заказа: колонку объявляют модели АИС и витрины, но
+    # миграция 632abaf5029e удалила ее из схемы, созданной миграциями
+    op.execute("ALTER TABLE order_items ADD COLUMN IF NOT EXISTS product_name VARCHAR")
+
+    # Позиция заказа переживает удаление товара: product_id обнуляется, название
+    # и цена остаются в строке (раньше ON DELETE CASCADE стирал позиции из истории)
+    op.execute(DROP_PRODUCT_FKEYS)
+    op.alter_column('order_items', 'product_id', existing_type=sa.Integer(), nullable=True)
+    op.create_foreign_key(
+        'order_items_product_id_fkey', 'order_items', 'products',
+        ['product_id'], ['id'], ondelete='SET NULL'
+    )
+
+    bind = op.get_bind()
+    bounds = bind.execute(sa.text(
+        "SELECT min(id), max(id) FROM orders WHERE order_items IS NOT NULL"
+    )).fetchone()
+    if bounds is None or bounds[0] is None:
+        return
+
+    first_id, last_id = bounds
+    total = without_product = 0
+    # Диапазонами id, а не одним запросом: ограничивает размер каждой вставки
+    for start in range(first_id, last_id + 1, BATCH_SIZE):
+        counts = bind.execute(BACKFILL_BATCH, {"first_id": start, "next_id": start + BATCH_SIZE}).fetchone()
+        total += counts.total
+        without_product += counts.without_product
+
+    logger.info("Перенесено позиций заказов из JSON: %s", total)
+    if without_product:
+        logger.warning(
+            "Позиций удаленных товаров (перенесены с product_id = NULL): %s", without_product
+        )
+
+    # Колонка orders.order_items больше не читается и не пишется; она остается
+    # до следующего релиза, чтобы откат кода не терял позиции старых заказов
+
+
+def downgrade() -> None:
+    # Перенесенные строки order_items не удаляются: их нельзя отличить от созданных
+    # витриной, а позиции в JSON сохранились. Исключение - позиции без товара:
+    # без них не вернуть NOT NULL на product_id
+    op.execute("DELETE FROM order_items WHERE product_id IS NULL")
+    op.drop_constraint('order_items_product_id_fkey', 'order_items', type_='foreignkey')
+    op.alter_column('order_items', 'product_id', existing_type=sa.Integer(), nullable=False)
+    op.create_foreign_key(
+        'order_items_product_id_fkey', 'order_items', 'products',
+        ['product_id'], ['id'], ondelete='CASCADE'
+    )
+    op.drop_index('ix_order_items_order_id', table_name='order_items')
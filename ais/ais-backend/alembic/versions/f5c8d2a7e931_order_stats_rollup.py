@@ -0,0 +1,118 @@
+"""order_stats_rollup
+
+Revision ID: f5c8d2a7e931
+Revises: e2a9c5f7b310
+Create Date: 2026-10-18 22:31:09.614052
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5c8d2a7e931'
+down_revision: Union[str, None] = 'e2a9c5f7b310'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# День сводки; у старых заказов без даты создания - условный день
+ORDER_DAY = "COALESCE({0}created_at::date, DATE '1970-01-01')"
+# Статус нормализуется так же, как в API: без пробелов, пустой - pending
+ORDER_STATUS = "COALESCE(NULLIF(btrim({0}status), ''), 'pending')"
+
+
+def upgrade() -> None:
+    # Сводка заказов по дню создания и статусу и итоги по статусам для дашборда
+    # (раньше каждый запрос статистики выполнял GROUP BY по всей таблице orders)
+    op.create_table(
+        'order_stats',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('order_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('total_amount', sa.Float(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('day', 'status')
+    )
+    op.create_table(
+        'order_status_totals',
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('order_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('total_amount', sa.Float(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('status')
+    )
+    # Журнал изменений, которые еще не свернуты в сводку. Триггер только дописывает
+    # в него строки: оформление заказов не ждет друг друга на строке сводки
+    # "сегодня / pending", а сворачивает журнал фоновая задача АИС
+    op.create_table(
+        'order_stats_deltas',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False),
+        sa.Column('total_amount', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_order_stats_deltas_day', 'order_stats_deltas', ['day'], unique=False)
+
+    # Журнал ведет БД: заказы создает и витрина, и АИС (create_order), статус меняют
+    # update_order_status, массовая смена статуса, update_order и автоматизация -
+    # триггер видит все пути
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION order_stats_apply() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                INSERT INTO order_stats_deltas (day, status, order_count, total_amount)
+                VALUES ({ORDER_DAY.format('OLD.')}, {ORDER_STATUS.format('OLD.')},
+                        -1, -COALESCE(OLD.total_price, 0));
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO order_stats_deltas (day, status, order_count, total_amount)
+                VALUES ({ORDER_DAY.format('NEW.')}, {ORDER_STATUS.format('NEW.')},
+                        1, COALESCE(NEW.total_price, 0));
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER orders_stats_insert_delete
+        AFTER INSERT OR DELETE ON orders
+        FOR EACH ROW EXECUTE FUNCTION order_stats_apply()
+    """)
+    # Трекинг-номер, адрес и прочие поля сводку не меняют
+    op.execute("""
+        CREATE TRIGGER orders_stats_update
+        AFTER UPDATE OF status, total_price, created_at ON orders
+        FOR EACH ROW
+        WHEN (OLD.status IS DISTINCT FROM NEW.status
+              OR OLD.total_price IS DISTINCT FROM NEW.total_price
+              OR OLD.created_at IS DISTINCT FROM NEW.created_at)
+        EXECUTE FUNCTION order_stats_apply()
+    """)
+
+    # Начальное заполнение: единственный полный проход по orders
+    op.execute(f"""
+        INSERT INTO order_stats (day, status, order_count, total_amount)
+        SELECT {ORDER_DAY.format('')}, {ORDER_STATUS.format('')},
+               count(*), COALESCE(sum(total_price), 0)
+        FROM orders
+        GROUP BY 1, 2
+    """)
+    op.execute("""
+        INSERT INTO order_status_totals (status, order_count, total_amount)
+        SELECT status, sum(order_count), sum(total_amount)
+        FROM order_stats
+        GROUP BY status
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS orders_stats_update ON orders")
+    op.execute("DROP TRIGGER IF EXISTS orders_stats_insert_delete ON orders")
+    op.execute("DROP FUNCTION IF EXISTS order_stats_apply()")
+    op.drop_index('ix_order_stats_deltas_day', table_name='order_stats_deltas')
+    op.drop_table('order_stats_deltas')
+    op.drop_table('order_status_totals')
+    op.drop_table('order_stats')
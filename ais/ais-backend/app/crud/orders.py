@@ -1,47 +1,16 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 import json
+from collections import Counter
 import traceback
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional, Tuple
 
 from app.models.order import Order
 from app.models.order_item import OrderItem
 from app.schemas.order import OrderCreate, OrderUpdate
 from app.services.logging_service import logger
-
-
-def parse_order_items(order_items_data):
-    """Парсит данные о товарах из JSON или списка"""
-    order_items = []
-
-    if not order_items_data:
-        return order_items
-
-    try:
-        # Если данные уже являются списком, используем их напрямую
-        if isinstance(order_items_data, list):
-            items_data = order_items_data
-        else:
-            # Иначе пробуем распарсить JSON строку
-            items_data = json.loads(order_items_data)
-
-        for i, item in enumerate(items_data, 1):
-            product_id = item.get("product_id", i)
-            product_name = item.get("product_name", f"Товар #{product_id}")
-            name = item.get("name", product_name)
-
-            order_items.append({
-                "id": i,
-                "product_id": product_id,
-                "name": name,
-                "product_name": product_name,
-                "quantity": item.get("quantity", 1),
-                "price": float(item.get("price", 0))
-            })
-    except Exception as e:
-        logger.warning(f"Не удалось обработать данные о товарах: {str(e)}")
-
-    return order_items
+from app.utils.pagination import InvalidCursorError, after_clause, decode_cursor, encode_cursor, order_by_clause
 
 
 def generate_tracking_number() -> str:
@@ -52,115 +21,293 @@ def generate_tracking_number() -> str:
     return f"{prefix}{digits}"
 
 
-def get_orders(db: Session):
+# Статус заказа -> статус доставки, который выставляется вместе с ним
+DELIVERY_STATUS_BY_ORDER_STATUS = {
+    "processing": "preparing",
+    "shipped": "in_transit",
+    "in_transit": "in_transit",
+    "delivered": "delivered",
+}
+
+# Статусы, для которых заказу нужен трекинг-номер
+TRACKED_STATUSES = ("shipped", "in_transit", "delivered")
+
+# Допустимые переходы для массовой смены статуса: текущий -> целевые
+ORDER_STATUS_TRANSITIONS = {
+    "pending": {"processing", "cancelled"},
+    "processing": {"shipped", "cancelled"},
+    "shipped": {"in_transit", "delivered", "returned"},
+    "in_transit": {"delivered", "returned"},
+    "delivered": {"completed", "returned"},
+    "completed": {"returned"},
+    "cancelled": set(),
+    "returned": set(),
+}
+
+
+ORDER_COLUMNS = """
+        o.id, o.user_id, o.total_price, o.created_at, o.status,
+        o.client_name, o.delivery_address, o.tracking_number,
+        o.delivery_notes, o.payment_method,
+        o.courier_name, o.estimated_delivery, o.actual_delivery, o.delivery_status,
+        o.contact_phone, u.full_name AS user_full_name, u.username AS user_username
+"""
+
+# Поля словаря заказа (order_to_dict), доступные для проекции fields=
+ORDER_FIELDS = (
+    "id", "user_id", "customer_name", "client_name", "status", "total_amount", "total_price",
+    "created_at", "tracking_number", "delivery_address", "estimated_delivery", "payment_method",
+    "delivery_notes", "courier_name", "items", "order_items", "delivery_status", "actual_delivery",
+    "contact_phone"
+)
+
+# Тяжелые колонки: не читаются, если проекция их не запрашивает
+# (товары загружаются отдельным запросом и тоже только по запросу)
+HEAVY_COLUMNS = {
+    "o.delivery_notes": ("delivery_notes",),
+}
+
+# sort_by -> (колонка, по убыванию); индексы (status, created_at) и (user_id, created_at)
+# обслуживают сортировку по дате внутри фильтра
+ORDER_SORT_KEYS = {
+    "created_at": ("o.created_at", True),
+    "created_at_asc": ("o.created_at", False),
+    "total_price": ("o.total_price", False),
+    "total_price_desc": ("o.total_price", True),
+}
+
+
+def order_columns(fields: Optional[Iterable[str]] = None) -> str:
+    """Список колонок запроса; тяжелые заменяются NULL, если не нужны проекции"""
+    if fields is None:
+        return ORDER_COLUMNS
+    columns = ORDER_COLUMNS
+    for column, needed_by in HEAVY_COLUMNS.items():
+        if not any(field in fields for field in needed_by):
+            columns = columns.replace(column, f"NULL AS {column[2:]}")
+    return columns
+
+
+def placeholder_items(order_id: int, total_price) -> list:
+    """Заглушка для заказа без сохраненных товаров (поле items обязательно для фронтенда)"""
+    return [
+        {
+            "id": 1,
+            "product_id": 1,
+            "name": f"Товары в заказе #{order_id}",
+            "product_name": f"Товары в заказе #{order_id}",
+            "quantity": 1,
+            "price": float(total_price or 0)
+        }
+    ]
+
+
+def load_order_items(order_ids: list, db: Session) -> dict:
+    """
+    Товары нескольких заказов одним запросом. Таблица order_items - единственный
+    источник позиций: JSON-колонка orders.order_items перенесена в нее миграцией
+    e2a9c5f7b310 и больше не читается и не пишется.
+    """
+    items_by_order = {}
+    if not order_ids:
+        return items_by_order
+
+    items_query = text("""
+    SELECT oi.id, oi.order_id, oi.product_id, oi.quantity, oi.price,
+           COALESCE(oi.product_name, p.name) AS name
+    FROM order_items oi
+    LEFT JOIN products p ON oi.product_id = p.id
+    WHERE oi.order_id = ANY(:order_ids)
+    ORDER BY oi.order_id, oi.id
+    """)
+
+    for item_row in db.execute(items_query, {"order_ids": list(order_ids)}).fetchall():
+        if item_row.name:
+            product_name = item_row.name
+        elif item_row.product_id is None:
+            product_name = "Удаленный товар"
+        else:
+            product_name = f"Товар #{item_row.product_id}"
+        items_by_order.setdefault(item_row.order_id, []).append({
+            "id": item_row.id,
+            "order_id": item_row.order_id,
+            "product_id": item_row.product_id,
+            "name": product_name,
+            "product_name": product_name,
+            "quantity": item_row.quantity,
+            "price": float(item_row.price or 0)
+        })
+    return items_by_order
+
+
+def order_to_dict(row, order_items: list) -> dict:
+    """Словарь заказа из строки запроса с ORDER_COLUMNS"""
+    # Имя клиента из заказа, иначе из таблицы пользователей
+    client_name = (
+        row.client_name or row.user_full_name or row.user_username or f"Клиент #{row.user_id}"
+    )
+    return {
+        "id": row.id,
+        "user_id": row.user_id or 0,
+        "customer_name": client_name,
+        "client_name": client_name,
+        "status": row.status.strip() if row.status else "pending",
+        "total_amount": float(row.total_price or 0),
+        "total_price": float(row.total_price or 0),
+        "created_at": row.created_at or datetime.now(),
+        "tracking_number": row.tracking_number,
+        "delivery_address": row.delivery_address or "",
+        "estimated_delivery": row.estimated_delivery,
+        "payment_method": row.payment_method,
+        "delivery_notes": row.delivery_notes,
+        "courier_name": row.courier_name,
+        "items": order_items,
+        "order_items": order_items,
+        "delivery_status": row.delivery_status,
+        "actual_delivery": row.actual_delivery,
+        "contact_phone": row.contact_phone
+    }
+
+
+def query_orders(
+        db: Session,
+        status: Optional[str] = None,
+        user_id: Optional[int] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        with_placeholders: bool = True,
+        sort_by: str = "created_at",
+        cursor: Optional[str] = None,
+        fields: Optional[Iterable[str]] = None
+) -> Tuple[list, Optional[str]]:
+    """
+    Страница заказов за фиксированное число запросов, независимо от их количества:
+    заказы вместе с именами пользователей (LEFT JOIN users) и один пакетный
+    запрос товаров всей страницы.
+    Даты фильтра включительные. Возвращает (заказы, курсор следующей страницы);
+    с курсором offset не применяется. fields - проекция полей заказа (id всегда).
+    """
+    column, descending = ORDER_SORT_KEYS[sort_by]
+    if fields is not None:
+        fields = set(fields) | {"id"}
+
+    conditions = []
+    params = {}
+    if status:
+        conditions.append("o.status = :status")
+        params["status"] = status
+    if user_id is not None:
+        conditions.append("o.user_id = :user_id")
+        params["user_id"] = user_id
+    if date_from:
+        conditions.append("o.created_at >= :date_from")
+        params["date_from"] = date_from
+    if date_to:
+        conditions.append("o.created_at < :date_to")
+        params["date_to"] = date_to + timedelta(days=1)
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort_by)
+        conditions.append(after_clause(column, "o.id", descending, value))
+        params["cursor_value"] = value
+        params["cursor_id"] = row_id
+        offset = 0
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    page_clause = ""
+    if limit is not None:
+        # Лишняя строка показывает, есть ли следующая страница, без отдельного запроса
+        page_clause += "LIMIT :limit "
+        params["limit"] = limit + 1
+    if offset:
+        page_clause += "OFFSET :offset"
+        params["offset"] = offset
+
+    query = text(f"""
+    SELECT {order_columns(fields)}
+    FROM orders o
+    LEFT JOIN users u ON u.id = o.user_id
+    {where}
+    ORDER BY {order_by_clause(column, "o.id", descending)}
+    {page_clause}
+    """)
+
+    rows = db.execute(query, params).fetchall()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort_by, getattr(last, column[2:]), last.id)
+
+    with_items = fields is None or "items" in fields or "order_items" in fields
+    # Товары всей страницы одним запросом
+    items_by_order = load_order_items([row.id for row in rows], db) if with_items else {}
+
+    orders = []
+    for row in rows:
+        order_items = []
+        if with_items:
+            order_items = items_by_order.get(row.id) or (
+                placeholder_items(row.id, row.total_price) if with_placeholders else []
+            )
+        order = order_to_dict(row, order_items)
+        if fields is not None:
+            order = {key: value for key, value in order.items() if key in fields}
+        orders.append(order)
+    return orders, next_cursor
+
+
+def get_orders_page(
+        db: Session,
+        status: Optional[str] = None,
+        user_id: Optional[int] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        sort_by: str = "created_at",
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        offset: int = 0,
+        fields: Optional[Iterable[str]] = None
+):
+    """Страница заказов для административного списка: (заказы, курсор следующей страницы)"""
     try:
-        logger.info("Запрос на получение всех заказов")
-
-        query = text("""
-        SELECT id, user_id, total_price, created_at, status, 
-               client_name, delivery_address, tracking_number, 
-               delivery_notes, payment_method, order_items,
-               courier_name, estimated_delivery, actual_delivery, delivery_status,
-               contact_phone
-        FROM orders 
-        ORDER BY created_at DESC
-        """)
-
-        orders_result = db.execute(query).fetchall()
+        logger.info(f"Запрос страницы заказов (sort_by={sort_by}, limit={limit})")
+        orders, next_cursor = query_orders(
+            db, status=status, user_id=user_id, date_from=date_from, date_to=date_to,
+            limit=limit, offset=offset, sort_by=sort_by, cursor=cursor, fields=fields
+        )
+        logger.info(f"Найдено {len(orders)} заказов")
+        return orders, next_cursor
+    except InvalidCursorError:
+        raise
+    except Exception as e:
+        stack_trace = traceback.format_exc()
+        logger.error(f"Ошибка при получении заказов: {str(e)}\n{stack_trace}")
+        return None
 
-        if not orders_result:
-            logger.warning("Заказы не найдены")
-            return []
 
-        orders = []
-        for row in orders_result:
-            # Получаем имя клиента либо из заказа, либо из таблицы пользователей
-            client_name = row.client_name or f"Клиент #{row.user_id}"
-            user_id = row.user_id or 0
-
-            if not row.client_name and user_id:
-                try:
-                    user_query = text("""
-                    SELECT full_name, username 
-                    FROM users 
-                    WHERE id = :user_id
-                    """)
+def get_orders(
+        db: Session,
+        status: Optional[str] = None,
+        user_id: Optional[int] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        limit: Optional[int] = None,
+        offset: int = 0
+):
+    try:
+        logger.info("Запрос на получение заказов")
 
-                    user_row = db.execute(user_query, {"user_id": user_id}).fetchone()
-                    if user_row:
-                        if user_row.full_name:
-                            client_name = user_row.full_name
-                        elif user_row.username:
-                            client_name = user_row.username
-                except Exception as e:
-                    logger.warning(f"Не удалось получить данные пользователя: {str(e)}")
-
-            # Получаем данные о товарах в заказе из поля order_items
-            order_items = parse_order_items(row.order_items)
-
-            # Если товары не найдены в JSON, пробуем получить их из таблицы order_items
-            if not order_items:
-                try:
-                    items_query = text("""
-                    SELECT oi.product_id, oi.quantity, oi.price, p.name
-                    FROM order_items oi
-                    LEFT JOIN products p ON oi.product_id = p.id
-                    WHERE oi.order_id = :order_id
-                    """)
+        orders, _ = query_orders(
+            db, status=status, user_id=user_id, date_from=date_from, date_to=date_to,
+            limit=limit, offset=offset
+        )
 
-                    items_result = db.execute(items_query, {"order_id": row.id}).fetchall()
-
-                    if items_result:
-                        for item_row in items_result:
-                            product_name = item_row.name or f"Товар #{item_row.product_id}"
-
-                            order_items.append({
-                                "id": item_row.product_id,
-                                "product_id": item_row.product_id,
-                                "name": product_name,
-                                "product_name": product_name,
-                                "quantity": item_row.quantity,
-                                "price": float(item_row.price or 0)
-                            })
-                except Exception as e:
-                    logger.warning(f"Не удалось получить данные о товарах из таблицы: {str(e)}")
-
-            # Если товары все еще не найдены, создаем заглушку для необходимого поля
-            if not order_items:
-                order_items = [
-                    {
-                        "id": 1,
-                        "product_id": 1,
-                        "name": f"Товары в заказе #{row.id}",
-                        "product_name": f"Товары в заказе #{row.id}",
-                        "quantity": 1,
-                        "price": float(row.total_price or 0)
-                    }
-                ]
-
-            # Создаем словарь с данными заказа
-            order_dict = {
-                "id": row.id,
-                "user_id": user_id,
-                "customer_name": client_name,
-                "client_name": client_name,
-                "status": row.status.strip() if row.status else "pending",
-                "total_amount": float(row.total_price or 0),
-                "total_price": float(row.total_price or 0),
-                "created_at": row.created_at or datetime.now(),
-                "tracking_number": row.tracking_number,
-                "delivery_address": row.delivery_address or "",
-                "estimated_delivery": row.estimated_delivery,
-                "payment_method": row.payment_method,
-                "delivery_notes": row.delivery_notes,
-                "courier_name": row.courier_name,
-                "items": order_items,
-                "order_items": order_items,
-                "delivery_status": row.delivery_status,
-                "actual_delivery": row.actual_delivery,
-                "contact_phone": row.contact_phone
-            }
-            orders.append(order_dict)
+        if not orders:
+            logger.warning("Заказы не найдены")
+            return []
 
         logger.info(f"Найдено {len(orders)} заказов")
         return orders
@@ -171,36 +318,12 @@ def get_orders(db: Session):
         return None
 
 
-def get_user_orders(user_id: int, db: Session):
+def get_user_orders(user_id: int, db: Session, limit: Optional[int] = None, offset: int = 0):
     try:
         logger.info(f"Запрос на получение заказов пользователя {user_id}")
 
-        query = text("""
-        SELECT id, user_id, total_price, created_at, status, order_items 
-        FROM orders 
-        WHERE user_id = :user_id
-        ORDER BY created_at DESC
-        """)
-
-        orders_result = db.execute(query, {"user_id": user_id}).fetchall()
-
-        if not orders_result:
-            return []
-
-        orders = []
-        for row in orders_result:
-            order_items = parse_order_items(row.order_items)
-
-            order = {
-                "id": row.id,
-                "user_id": row.user_id,
-                "status": row.status.strip() if row.status else "pending",
-                "created_at": row.created_at or datetime.now(),
-                "total_amount": float(row.total_price or 0),
-                "items": order_items
-            }
-            orders.append(order)
-
+        # Заглушка товаров нужна только административному списку
+        orders, _ = query_orders(db, user_id=user_id, limit=limit, offset=offset, with_placeholders=False)
         return orders
     except Exception as e:
         logger.error(f"Ошибка при получении заказов пользователя: {str(e)}")
@@ -211,14 +334,11 @@ def get_order_detail(order_id: int, db: Session):
     try:
         logger.info(f"Запрос на получение заказа с ID {order_id}")
 
-        query = text("""
-        SELECT id, user_id, total_price, created_at, status, 
-               client_name, delivery_address, tracking_number, 
-               delivery_notes, payment_method, order_items,
-               courier_name, estimated_delivery, actual_delivery, delivery_status,
-               contact_phone
-        FROM orders 
-        WHERE id = :order_id
+        query = text(f"""
+        SELECT {ORDER_COLUMNS}
+        FROM orders o
+        LEFT JOIN users u ON u.id = o.user_id
+        WHERE o.id = :order_id
         """)
 
         order_row = db.execute(query, {"order_id": order_id}).fetchone()
@@ -227,51 +347,12 @@ def get_order_detail(order_id: int, db: Session):
             logger.warning(f"Заказ с ID {order_id} не найден")
             return None
 
-        # Получаем имя клиента либо из заказа, либо из таблицы пользователей
-        client_name = order_row.client_name or f"Клиент #{order_row.user_id}"
-        user_id = order_row.user_id or 0
-
-        # Получаем данные о товарах в заказе из поля order_items
-        order_items = parse_order_items(order_row.order_items)
-
         # Если товары не найдены, создаем заглушку
-        if not order_items:
-            order_items = [
-                {
-                    "id": 1,
-                    "product_id": 1,
-                    "name": f"Товары в заказе #{order_id}",
-                    "product_name": f"Товары в заказе #{order_id}",
-                    "quantity": 1,
-                    "price": float(order_row.total_price or 0)
-                }
-            ]
-
-        # Создаем словарь с данными заказа
-        order_dict = {
-            "id": order_row.id,
-            "user_id": user_id,
-            "customer_name": client_name,
-            "client_name": client_name,
-            "status": order_row.status.strip() if order_row.status else "pending",
-            "total_amount": float(order_row.total_price or 0),
-            "total_price": float(order_row.total_price or 0),
-            "created_at": order_row.created_at or datetime.now(),
-            "tracking_number": order_row.tracking_number,
-            "delivery_address": order_row.delivery_address or "",
-            "estimated_delivery": order_row.estimated_delivery,
-            "payment_method": order_row.payment_method,
-            "delivery_notes": order_row.delivery_notes,
-            "courier_name": order_row.courier_name,
-            "items": order_items,
-            "order_items": order_items,
-            "delivery_status": order_row.delivery_status,
-            "actual_delivery": order_row.actual_delivery,
-            "contact_phone": order_row.contact_phone
-        }
+        order_items = load_order_items([order_id], db).get(order_id) or \
+            placeholder_items(order_id, order_row.total_price)
 
         logger.info(f"Заказ с ID {order_id} успешно получен")
-        return order_dict
+        return order_to_dict(order_row, order_items)
     except Exception as e:
         stack_trace = traceback.format_exc()
         logger.error(f"Ошибка при получении заказа: {str(e)}\n{stack_trace}")
@@ -290,21 +371,14 @@ def create_order(order_data: OrderCreate, db: Session):
             logger.warning(f"Пользователь с ID {order_data.user_id} не найден")
             return None
 
-        # Создаем заказ
-        order_items_json = json.dumps([{
-            "product_id": item.product_id,
-            "name": item.name,
-            "quantity": item.quantity,
-            "price": item.price
-        } for item in order_data.items])
-
+        # Создаем заказ; позиции - строками order_items в той же транзакции
         insert_query = text("""
         INSERT INTO orders (
-            user_id, total_price, created_at, status, order_items,
+            user_id, total_price, created_at, status,
             client_name, delivery_address, contact_phone, payment_method
         )
         VALUES (
-            :user_id, :total_price, CURRENT_TIMESTAMP, 'pending', :order_items,
+            :user_id, :total_price, CURRENT_TIMESTAMP, 'pending',
             :client_name, :delivery_address, :contact_phone, :payment_method
         )
         RETURNING id, created_at
@@ -312,17 +386,29 @@ def create_order(order_data: OrderCreate, db: Session):
 
         result = db.execute(insert_query, {
             "user_id": order_data.user_id,
-            "total_price": order_data.total_price,
-            "order_items": order_items_json,
-            "client_name": order_data.client_name,
+            "total_price": order_data.total_amount,
+            "client_name": order_data.name,
             "delivery_address": order_data.delivery_address,
-            "contact_phone": order_data.contact_phone,
+            "contact_phone": order_data.phone,
             "payment_method": order_data.payment_method
         }).fetchone()
 
         if not result:
             return None
 
+        if order_data.items:
+            items_query = text("""
+            INSERT INTO order_items (order_id, product_id, quantity, price, product_name)
+            VALUES (:order_id, :product_id, :quantity, :price, :product_name)
+            """)
+            db.execute(items_query, [{
+                "order_id": result.id,
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "price": item.price,
+                "product_name": item.product_name
+            } for item in order_data.items])
+
         db.commit()
 
         # Возвращаем созданный заказ
@@ -331,7 +417,7 @@ def create_order(order_data: OrderCreate, db: Session):
             "user_id": order_data.user_id,
             "status": "pending",
             "created_at": result.created_at,
-            "total_amount": order_data.total_price,
+            "total_amount": order_data.total_amount,
             "items": order_data.items
         }
     except Exception as e:
@@ -373,13 +459,7 @@ def update_order_status(order_id: int, status: str, db: Session):
             })
 
             # Определяем соответствующий статус доставки
-            delivery_status = None
-            if status == "processing":
-                delivery_status = "preparing"
-            elif status == "shipped":
-                delivery_status = "in_transit"
-            elif status == "delivered":
-                delivery_status = "delivered"
+            delivery_status = DELIVERY_STATUS_BY_ORDER_STATUS.get(status)
 
             # Обновляем статус доставки
             if delivery_status:
@@ -396,8 +476,8 @@ def update_order_status(order_id: int, status: str, db: Session):
 
                 logger.info(f"Статус доставки для заказа {order_id} обновлен: {delivery_status}")
 
-            # Обновление трекинг-номера для заказов в статусе shipped или delivered
-            if status in ["shipped", "delivered"]:
+            # Трекинг-номер для отправленных, находящихся в пути и доставленных заказов
+            if status in TRACKED_STATUSES:
                 # Проверяем, есть ли уже номер для этого заказа
                 check_tracking_query = text("""
                 SELECT tracking_number
@@ -454,6 +534,105 @@ def update_order_status(order_id: int, status: str, db: Session):
         return None
 
 
+def update_orders_status_batch(order_ids: list, status: str, db: Session):
+    """
+    Переводит несколько заказов в статус status одним UPDATE.
+    Переходы проверяются в памяти по ORDER_STATUS_TRANSITIONS, трекинг-номера
+    для отправленных и доставленных заказов выдаются пакетом. Возвращает
+    результат по каждому id: заказ, которому переход недоступен, не мешает остальным.
+    """
+    try:
+        order_ids = list(dict.fromkeys(order_ids))
+        logger.info(f"Запрос на массовое изменение статуса {len(order_ids)} заказов на {status}")
+
+        # Блокируем строки до UPDATE: проверенный статус не изменится параллельным запросом.
+        # Блокировки берутся по возрастанию id - пересекающиеся пакеты не дают взаимоблокировку
+        rows = db.execute(text("""
+        SELECT id, status, tracking_number
+        FROM orders
+        WHERE id = ANY(:order_ids)
+        ORDER BY id
+        FOR UPDATE
+        """), {"order_ids": order_ids}).fetchall()
+        current = {row.id: row for row in rows}
+
+        results = {}
+        to_update = []
+        for order_id in order_ids:
+            row = current.get(order_id)
+            if row is None:
+                results[order_id] = {
+                    "id": order_id, "success": False, "outcome": "failed", "error": "Заказ не найден"
+                }
+                continue
+            previous = row.status.strip() if row.status else "pending"
+            if previous == status:
+                results[order_id] = {
+                    "id": order_id, "success": True, "outcome": "unchanged", "status": status,
+                    "previous_status": previous, "tracking_number": row.tracking_number
+                }
+            elif status not in ORDER_STATUS_TRANSITIONS.get(previous, ()):
+                results[order_id] = {
+                    "id": order_id, "success": False, "outcome": "failed", "status": previous,
+                    "previous_status": previous,
+                    "error": f"Переход из статуса {previous} в {status} недопустим"
+                }
+            else:
+                results[order_id] = {
+                    "id": order_id, "success": True, "outcome": "updated", "previous_status": previous
+                }
+                to_update.append(order_id)
+
+        if to_update:
+            tracking_numbers = {}
+            if status in TRACKED_STATUSES:
+                issued = set()
+                for order_id in to_update:
+                    if current[order_id].tracking_number:
+                        continue
+                    number = generate_tracking_number()
+                    while number in issued:
+                        number = generate_tracking_number()
+                    issued.add(number)
+                    tracking_numbers[str(order_id)] = number
+
+            updated = db.execute(text("""
+            UPDATE orders
+            SET status = :status,
+                delivery_status = COALESCE(:delivery_status, delivery_status),
+                tracking_number = COALESCE(tracking_number, CAST(:tracking_numbers AS jsonb) ->> id::text),
+                actual_delivery = CASE
+                    WHEN :status = 'delivered' THEN COALESCE(actual_delivery, CURRENT_TIMESTAMP)
+                    ELSE actual_delivery
+                END
+            WHERE id = ANY(:order_ids)
+            RETURNING id, status, tracking_number
+            """), {
+                "status": status,
+                "delivery_status": DELIVERY_STATUS_BY_ORDER_STATUS.get(status),
+                "tracking_numbers": json.dumps(tracking_numbers),
+                "order_ids": to_update
+            }).fetchall()
+
+            for row in updated:
+                results[row.id].update(status=row.status, tracking_number=row.tracking_number)
+
+        db.commit()
+
+        results = [results[order_id] for order_id in order_ids]
+        counts = Counter(result["outcome"] for result in results)
+        logger.info(
+            f"Массовое изменение статуса на {status}: изменено {counts['updated']}, "
+            f"без изменений {counts['unchanged']}, ошибок {counts['failed']}"
+        )
+        return results
+    except Exception as e:
+        db.rollback()
+        stack_trace = traceback.format_exc()
+        logger.error(f"Ошибка при массовом изменении статуса заказов: {str(e)}\n{stack_trace}")
+        return None
+
+
 def update_order(order_id: int, data: dict, db: Session):
     try:
         logger.info(f"Запрос на обновление заказа {order_id} с данными: {data}")
@@ -502,72 +681,16 @@ def update_order(order_id: int, data: dict, db: Session):
         return None
 
 
-def get_orders_by_status(status: str, db: Session):
+def get_orders_by_status(status: str, db: Session, limit: Optional[int] = None, offset: int = 0):
     try:
         logger.info(f"Запрос на получение заказов со статусом '{status}'")
 
-        query = text("""
-        SELECT id, user_id, total_price, created_at, status, 
-               client_name, delivery_address, tracking_number, 
-               delivery_notes, payment_method, order_items,
-               courier_name, estimated_delivery, actual_delivery, delivery_status,
-               contact_phone
-        FROM orders 
-        WHERE status = :status
-        ORDER BY created_at DESC
-        """)
-
-        orders_result = db.execute(query, {"status": status}).fetchall()
+        orders, _ = query_orders(db, status=status, limit=limit, offset=offset)
 
-        if not orders_result:
+        if not orders:
             logger.info(f"Заказов со статусом '{status}' не найдено")
             return []
 
-        orders = []
-        for row in orders_result:
-            # Получаем имя клиента
-            client_name = row.client_name or f"Клиент #{row.user_id}"
-
-            # Получаем товары из JSON или списка
-            order_items = parse_order_items(row.order_items)
-
-            # Если товары не найдены, создаем заглушку
-            if not order_items:
-                order_items = [
-                    {
-                        "id": 1,
-                        "product_id": 1,
-                        "name": f"Товары в заказе #{row.id}",
-                        "product_name": f"Товары в заказе #{row.id}",
-                        "quantity": 1,
-                        "price": float(row.total_price or 0)
-                    }
-                ]
-
-            # Создаем словарь с данными заказа
-            order_dict = {
-                "id": row.id,
-                "user_id": row.user_id or 0,
-                "customer_name": client_name,
-                "client_name": client_name,
-                "status": row.status.strip() if row.status else "pending",
-                "total_amount": float(row.total_price or 0),
-                "total_price": float(row.total_price or 0),
-                "created_at": row.created_at or datetime.now(),
-                "tracking_number": row.tracking_number,
-                "delivery_address": row.delivery_address or "",
-                "estimated_delivery": row.estimated_delivery,
-                "payment_method": row.payment_method,
-                "delivery_notes": row.delivery_notes,
-                "courier_name": row.courier_name,
-                "items": order_items,
-                "order_items": order_items,
-                "delivery_status": row.delivery_status,
-                "actual_delivery": row.actual_delivery,
-                "contact_phone": row.contact_phone
-            }
-            orders.append(order_dict)
-
         logger.info(f"Найдено {len(orders)} заказов со статусом '{status}'")
         return orders
     except Exception as e:
@@ -576,20 +699,31 @@ def get_orders_by_status(status: str, db: Session):
         return None
 
 
+# Ключ advisory-блокировки сворачивания и сверки сводки заказов
+ORDER_STATS_LOCK_KEY = 724001
+
+# Сводка вместе с еще не свернутыми изменениями из журнала order_stats_deltas
+STATUS_TOTALS_QUERY = """
+    SELECT status, sum(order_count) AS order_count, sum(total_amount) AS total_amount
+    FROM (
+        SELECT status, order_count, total_amount FROM order_status_totals
+        UNION ALL
+        SELECT status, order_count, total_amount FROM order_stats_deltas
+    ) s
+    GROUP BY status
+    HAVING sum(order_count) > 0
+"""
+
+
 def get_orders_stats(db: Session):
+    """
+    Итоги по статусам из сводки order_status_totals (строк столько же, сколько
+    статусов) с учетом журнала изменений, еще не свернутых в сводку
+    """
     try:
         logger.info("Запрос на получение статистики по заказам")
 
-        query = text("""
-        SELECT 
-            status,
-            COUNT(*) as count,
-            SUM(total_price) as total_amount
-        FROM orders
-        GROUP BY status
-        """)
-
-        stats_result = db.execute(query).fetchall()
+        stats_result = db.execute(text(STATUS_TOTALS_QUERY)).fetchall()
 
         if not stats_result:
             logger.warning("Статистика по заказам не найдена")
@@ -597,9 +731,8 @@ def get_orders_stats(db: Session):
 
         stats = {}
         for row in stats_result:
-            status = row.status.strip() if row.status else "pending"
-            stats[status] = {
-                "count": row.count,
+            stats[row.status] = {
+                "count": row.order_count,
                 "total_amount": float(row.total_amount or 0)
             }
 
@@ -608,4 +741,205 @@ def get_orders_stats(db: Session):
     except Exception as e:
         stack_trace = traceback.format_exc()
         logger.error(f"Ошибка при получении статистики: {str(e)}\n{stack_trace}")
-        return None
\ No newline at end of file
+        return None
+
+
+def get_daily_orders_stats(db: Session, date_from: Optional[date] = None, date_to: Optional[date] = None):
+    """Заказы по дням создания и статусам из сводки order_stats (даты включительные)"""
+    try:
+        logger.info(f"Запрос статистики заказов по дням ({date_from} - {date_to})")
+
+        conditions = []
+        params = {}
+        if date_from:
+            conditions.append("day >= :date_from")
+            params["date_from"] = date_from
+        if date_to:
+            conditions.append("day <= :date_to")
+            params["date_to"] = date_to
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        query = text(f"""
+        SELECT day, status, sum(order_count) AS order_count, sum(total_amount) AS total_amount
+        FROM (
+            SELECT day, status, order_count, total_amount FROM order_stats {where}
+            UNION ALL
+            SELECT day, status, order_count, total_amount FROM order_stats_deltas {where}
+        ) s
+        GROUP BY day, status
+        HAVING sum(order_count) > 0
+        ORDER BY day, status
+        """)
+
+        return [
+            {
+                "day": row.day,
+                "status": row.status,
+                "count": row.order_count,
+                "total_amount": float(row.total_amount or 0)
+            }
+            for row in db.execute(query, params).fetchall()
+        ]
+    except Exception as e:
+        stack_trace = traceback.format_exc()
+        logger.error(f"Ошибка при получении статистики по дням: {str(e)}\n{stack_trace}")
+        return None
+
+
+def fold_order_stats(db: Session) -> int:
+    """
+    Сворачивает журнал order_stats_deltas в сводку одним оператором.
+    Одновременно сворачивает только один воркер (advisory-блокировка),
+    остальные пропускают ход. Возвращает число свернутых записей журнала.
+    """
+    try:
+        locked = db.execute(
+            text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": ORDER_STATS_LOCK_KEY}
+        ).scalar()
+        if not locked:
+            db.rollback()
+            return 0
+
+        folded = db.execute(text("""
+        WITH moved AS (
+            DELETE FROM order_stats_deltas
+            RETURNING day, status, order_count, total_amount
+        ),
+        daily AS (
+            INSERT INTO order_stats AS s (day, status, order_count, total_amount)
+            SELECT day, status, sum(order_count), sum(total_amount)
+            FROM moved
+            GROUP BY day, status
+            ON CONFLICT (day, status) DO UPDATE
+            SET order_count = s.order_count + EXCLUDED.order_count,
+                total_amount = s.total_amount + EXCLUDED.total_amount
+        ),
+        totals AS (
+            INSERT INTO order_status_totals AS t (status, order_count, total_amount)
+            SELECT status, sum(order_count), sum(total_amount)
+            FROM moved
+            GROUP BY status
+            ON CONFLICT (status) DO UPDATE
+            SET order_count = t.order_count + EXCLUDED.order_count,
+                total_amount = t.total_amount + EXCLUDED.total_amount
+        )
+        SELECT count(*) FROM moved
+        """)).scalar()
+        db.commit()
+        return folded
+    except Exception:
+        db.rollback()
+        raise
+
+
+# День сводки для заказов без даты создания (как в триггере миграции f5c8d2a7e931)
+UNDATED_ORDER_DAY = date(1970, 1, 1)
+
+# Фактические значения сводки по таблице orders (день и статус - как в триггере)
+ACTUAL_DAILY_STATS = """
+    SELECT COALESCE(created_at::date, DATE '1970-01-01') AS day,
+           COALESCE(NULLIF(btrim(status), ''), 'pending') AS status,
+           count(*) AS order_count, COALESCE(sum(total_price), 0) AS total_amount
+    FROM orders
+    {where}
+    GROUP BY 1, 2
+"""
+
+# Сводка вместе с журналом по дням
+RECORDED_DAILY_STATS = """
+    SELECT day, status, sum(order_count) AS order_count, sum(total_amount) AS total_amount
+    FROM (
+        SELECT day, status, order_count, total_amount FROM order_stats {where}
+        UNION ALL
+        SELECT day, status, order_count, total_amount FROM order_stats_deltas {where}
+    ) r
+    GROUP BY day, status
+    HAVING sum(order_count) <> 0
+"""
+
+
+def reconcile_order_stats(db: Session) -> int:
+    """
+    Сверяет сводку (с журналом) с таблицей orders и исправляет расхождения
+    (например, после правок заказов с отключенными триггерами).
+    Таблицы не блокируются: день пересчитывается как "факт минус несвернутый
+    журнал" одним оператором, то есть по одному снимку данных, а изменения,
+    не вошедшие в этот снимок, позже придут через журнал. Возвращает число
+    исправленных дней.
+    """
+    drift_query = text(f"""
+    WITH actual AS ({ACTUAL_DAILY_STATS.format(where="")}),
+    recorded AS ({RECORDED_DAILY_STATS.format(where="")})
+    SELECT DISTINCT COALESCE(a.day, r.day) AS day
+    FROM actual a
+    FULL JOIN recorded r ON r.day = a.day AND r.status = a.status
+    WHERE a.order_count IS DISTINCT FROM r.order_count
+       OR abs(a.total_amount - r.total_amount) > 0.005
+    ORDER BY 1
+    """)
+    days = [row.day for row in db.execute(drift_query).fetchall()]
+    db.rollback()
+
+    # Факт за день за вычетом журнала: после сворачивания журнала сводка совпадет с фактом
+    day_query = """
+    WITH actual AS ({actual}),
+    pending AS (
+        SELECT status, sum(order_count) AS order_count, sum(total_amount) AS total_amount
+        FROM order_stats_deltas
+        WHERE day = :day
+        GROUP BY status
+    )
+    SELECT COALESCE(a.status, p.status) AS status,
+           COALESCE(a.order_count, 0) - COALESCE(p.order_count, 0) AS order_count,
+           COALESCE(a.total_amount, 0) - COALESCE(p.total_amount, 0) AS total_amount
+    FROM actual a
+    FULL JOIN pending p ON p.status = a.status
+    """
+
+    for day in days:
+        # Условный день собирает заказы без даты создания
+        day_filter = "WHERE created_at >= :day AND created_at < :day + 1"
+        if day == UNDATED_ORDER_DAY:
+            day_filter = "WHERE created_at IS NULL OR created_at::date = :day"
+        try:
+            # Сводку меняют только сворачивание и сверка, обе под этой блокировкой
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ORDER_STATS_LOCK_KEY})
+            values = db.execute(
+                text(day_query.format(actual=ACTUAL_DAILY_STATS.format(where=day_filter))), {"day": day}
+            ).fetchall()
+            db.execute(text("DELETE FROM order_stats WHERE day = :day"), {"day": day})
+            if values:
+                db.execute(text("""
+                INSERT INTO order_stats (day, status, order_count, total_amount)
+                VALUES (:day, :status, :order_count, :total_amount)
+                """), [
+                    {"day": day, "status": row.status, "order_count": row.order_count,
+                     "total_amount": row.total_amount}
+                    for row in values
+                ])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+    if days:
+        try:
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ORDER_STATS_LOCK_KEY})
+            db.execute(text("""
+            INSERT INTO order_status_totals AS t (status, order_count, total_amount)
+            SELECT status, sum(order_count), sum(total_amount)
+            FROM order_stats
+            GROUP BY status
+            ON CONFLICT (status) DO UPDATE
+            SET order_count = EXCLUDED.order_count, total_amount = EXCLUDED.total_amount
+            """))
+            db.execute(text("""
+            UPDATE order_status_totals t SET order_count = 0, total_amount = 0
+            WHERE NOT EXISTS (SELECT 1 FROM order_stats s WHERE s.status = t.status)
+            """))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        logger.warning(f"Сводка заказов пересчитана за {len(days)} дн.: {days[0]} - {days[-1]}")
+    return len(days)
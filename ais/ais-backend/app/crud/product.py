@@ -1,9 +1,9 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
 from typing import List, Optional
 from datetime import datetime
 
 from app.models import Product, Category
+from app.crud import product_search
 from app.schemas import ProductCreate, ProductBase
 
 
@@ -18,11 +18,10 @@ def get_products(db: Session, category_id: Optional[int] = None, search: Optiona
         query = query.filter(Product.category_id == category_id)
 
     if search:
-        query = query.filter(
-            or_(
-                Product.name.ilike(f"%{search}%"),
-                Product.description.ilike(f"%{search}%")
-            )
+        # Полнотекстовый поиск по индексу вместо ILIKE по описанию (seq scan),
+        # самые релевантные товары - первыми
+        query = query.filter(product_search.matches(search)).order_by(
+            product_search.rank(search).desc(), Product.id
         )
 
     products = query.all()
@@ -129,6 +128,10 @@ def update_product(
             if hasattr(Product, key)
         }
 
+        # Варианты изображения (строит витрина) относятся к прежнему image_url
+        if "image_url" in valid_fields and valid_fields["image_url"] != db_product.image_url:
+            db_product.image_variants = None
+
         for key, value in valid_fields.items():
             setattr(db_product, key, value)
 
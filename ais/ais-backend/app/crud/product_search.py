@@ -0,0 +1,95 @@
+# app/crud/product_search.py
+"""
+Поиск товаров: полнотекстовый (tsvector, русская морфология) и нечеткий
+(pg_trgm) поверх индексов из миграции d9b24e6f1c38.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, literal, literal_column, or_
+from sqlalchemy.orm import Session
+
+from app.models import Product
+
+SEARCH_CONFIG = literal_column("'russian'::regconfig")
+
+# Генерируемая колонка не отображена в модели, чтобы не тянуть вектор в каждый SELECT
+search_vector = literal_column("products.search_vector")
+
+
+def search_query(text: str):
+    """Запрос в синтаксисе веб-поиска: слова, "фразы", -исключения, or"""
+    return func.websearch_to_tsquery(SEARCH_CONFIG, text)
+
+
+def prefix_query(text: str):
+    """Префиксный запрос для автодополнения: каждое слово как начало слова"""
+    tokens = re.findall(r"\w+", text.lower())
+    if not tokens:
+        return None
+    return func.to_tsquery(SEARCH_CONFIG, " & ".join(f"{token}:*" for token in tokens))
+
+
+def matches(text: str):
+    """
+    Условие поиска для списка товаров: совпадение по морфологии или подстрока
+    в названии (ILIKE по названию обслуживается триграммным индексом)
+    """
+    return or_(search_vector.op("@@")(search_query(text)), Product.name.ilike(f"%{text}%"))
+
+
+def rank(text: str):
+    return func.ts_rank_cd(search_vector, search_query(text))
+
+
+def search_products(
+        db: Session, text: str, limit: int = 20, category_id: Optional[int] = None
+) -> List[Tuple[Product, float]]:
+    """
+    Ранжированный поиск. Если морфологический поиск ничего не нашел
+    (например, запрос с опечаткой), используется триграммное сходство названия.
+    Возвращает пары (товар, релевантность).
+    """
+    relevance = rank(text)
+    query = db.query(Product, relevance.label("rank")).filter(search_vector.op("@@")(search_query(text)))
+    if category_id:
+        query = query.filter(Product.category_id == category_id)
+    rows = query.order_by(relevance.desc(), Product.id).limit(limit).all()
+    if rows:
+        return rows
+
+    similarity = func.word_similarity(text, Product.name)
+    query = db.query(Product, similarity.label("rank")).filter(literal(text).op("<%")(Product.name))
+    if category_id:
+        query = query.filter(Product.category_id == category_id)
+    return query.order_by(similarity.desc(), Product.id).limit(limit).all()
+
+
+def suggest(db: Session, text: str, limit: int = 5) -> List[str]:
+    """Подсказки "возможно, вы искали": названия, похожие на запрос"""
+    similarity = func.word_similarity(text, Product.name)
+    rows = (
+        db.query(Product.name, func.max(similarity).label("score"))
+        .filter(literal(text).op("<%")(Product.name))
+        .group_by(Product.name)
+        .order_by(literal_column("score").desc())
+        .limit(limit)
+        .all()
+    )
+    return [row.name for row in rows]
+
+
+def autocomplete(db: Session, text: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """Автодополнение по началу слов в названии и описании"""
+    tsquery = prefix_query(text)
+    if tsquery is None:
+        return []
+    relevance = func.ts_rank_cd(search_vector, tsquery)
+    rows = (
+        db.query(Product.id, Product.name)
+        .filter(search_vector.op("@@")(tsquery))
+        .order_by(relevance.desc(), Product.name)
+        .limit(limit)
+        .all()
+    )
+    return [{"id": row.id, "name": row.name} for row in rows]
@@ -1,21 +1,100 @@
 import os
-from sqlalchemy import create_engine
+import time
+import logging
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from dotenv import load_dotenv
 
+from app.utils.config import (
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+    DB_STATEMENT_TIMEOUT_MS, DB_LOCK_TIMEOUT_MS,
+    DB_SLOW_CHECKOUT_MS, DB_LONG_CHECKOUT_MS,
+    DATABASE_READ_REPLICA_URL, DB_REPORTING_STATEMENT_TIMEOUT_MS,
+    DB_REPLICA_MAX_LAG_SECONDS, DB_REPLICA_CHECK_INTERVAL,
+)
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Проверка и установка значения по умолчанию для DATABASE_URL
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./ais.db")
 
+# Счетчики событий пула соединений
+pool_stats = {
+    "checkouts": 0,
+    "slow_checkouts": 0,
+    "long_held": 0,
+}
+
+
+class MonitoredQueuePool(QueuePool):
+    """
+    QueuePool, который замеряет ожидание свободного соединения.
+    Событие checkout срабатывает уже после получения соединения, поэтому
+    время ожидания измеряется вокруг _do_get
+    """
+
+    def _do_get(self):
+        started = time.monotonic()
+        connection = super()._do_get()
+        waited_ms = (time.monotonic() - started) * 1000
+        if waited_ms > DB_SLOW_CHECKOUT_MS:
+            pool_stats["slow_checkouts"] += 1
+            logger.warning(
+                f"Ожидание соединения из пула заняло {waited_ms:.0f} мс ({self.status()})"
+            )
+        return connection
+
+
+def session_timeouts_options(statement_timeout_ms: int, lock_timeout_ms: int) -> str:
+    """Параметры PostgreSQL, устанавливаемые для каждого нового соединения"""
+    return f"-c statement_timeout={statement_timeout_ms} -c lock_timeout={lock_timeout_ms}"
+
+
+def create_monitored_engine(url: str, statement_timeout_ms: int = DB_STATEMENT_TIMEOUT_MS):
+    """
+    Создает engine PostgreSQL с настраиваемым пулом, таймаутами запросов и блокировок
+    и логированием долгих ожиданий и удержаний соединений
+    """
+    monitored_engine = create_engine(
+        url,
+        poolclass=MonitoredQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={"options": session_timeouts_options(statement_timeout_ms, DB_LOCK_TIMEOUT_MS)},
+    )
+
+    @event.listens_for(monitored_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_stats["checkouts"] += 1
+        connection_record.info["checked_out_at"] = time.monotonic()
+
+    @event.listens_for(monitored_engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is None:
+            return
+        held_ms = (time.monotonic() - checked_out_at) * 1000
+        if held_ms > DB_LONG_CHECKOUT_MS:
+            pool_stats["long_held"] += 1
+            logger.warning(f"Соединение с БД удерживалось {held_ms:.0f} мс")
+
+    return monitored_engine
+
+
 # Настройка подключения к БД для SQLite
 if DATABASE_URL.startswith("sqlite"):
     engine = create_engine(
         DATABASE_URL, connect_args={"check_same_thread": False}
     )
 else:
-    engine = create_engine(DATABASE_URL)
+    engine = create_monitored_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -26,4 +105,86 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# Реплика только для чтения для тяжелых отчетов, чтобы они не нагружали основную БД
+read_engine = None
+ReadSessionLocal = None
+if DATABASE_READ_REPLICA_URL:
+    read_engine = create_monitored_engine(
+        DATABASE_READ_REPLICA_URL, statement_timeout_ms=DB_REPORTING_STATEMENT_TIMEOUT_MS
+    )
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Результат последней проверки реплики (кэшируется на DB_REPLICA_CHECK_INTERVAL секунд)
+replica_state = {
+    "configured": read_engine is not None,
+    "healthy": False,
+    "lag_seconds": None,
+    "checked_at": 0.0,
+    "fallbacks": 0,
+}
+
+# Отставание реплики: 0, если все полученные WAL уже применены или это не реплика
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+def replica_available() -> bool:
+    """
+    Проверяет, что реплика доступна и ее отставание не превышает DB_REPLICA_MAX_LAG_SECONDS
+    """
+    if read_engine is None:
+        return False
+
+    now = time.monotonic()
+    if now - replica_state["checked_at"] < DB_REPLICA_CHECK_INTERVAL:
+        return replica_state["healthy"]
+
+    replica_state["checked_at"] = now
+    try:
+        with read_engine.connect() as connection:
+            lag = float(connection.execute(REPLICA_LAG_QUERY).scalar() or 0)
+        replica_state["lag_seconds"] = round(lag, 3)
+        replica_state["healthy"] = lag <= DB_REPLICA_MAX_LAG_SECONDS
+        if not replica_state["healthy"]:
+            logger.warning(f"Реплика отстает на {lag:.1f} с, отчеты читают основную БД")
+    except Exception as e:
+        replica_state["healthy"] = False
+        replica_state["lag_seconds"] = None
+        logger.error(f"Реплика БД недоступна, отчеты читают основную БД: {e}")
+    return replica_state["healthy"]
+
+
+def _set_reporting_timeout(session, transaction, connection):
+    # SET LOCAL действует до конца транзакции, поэтому повторяется в каждой
+    connection.execute(
+        text("SELECT set_config('statement_timeout', :timeout, true)"),
+        {"timeout": str(DB_REPORTING_STATEMENT_TIMEOUT_MS)}
+    )
+
+
+def get_read_db():
+    """
+    Dependency для отчетов и аналитики: сессия реплики только для чтения,
+    а если реплика не настроена, недоступна или сильно отстает — основной БД.
+    На основной БД отчеты получают тот же таймаут запросов, что и на реплике
+    """
+    if replica_available():
+        db = ReadSessionLocal()
+    else:
+        if read_engine is not None:
+            replica_state["fallbacks"] += 1
+        db = SessionLocal()
+        if engine.dialect.name == "postgresql":
+            event.listen(db, "after_begin", _set_reporting_timeout)
+    try:
+        yield db
+    finally:
+        db.close()
@@ -1,4 +1,5 @@
 import os
+import asyncio
 import logging
 from datetime import datetime
 from fastapi import FastAPI, HTTPException, Request
@@ -6,7 +7,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from sqlalchemy import text 
 
-from app.database import engine, Base, get_db, SessionLocal
+from app.database import engine, read_engine, Base, get_db, SessionLocal, pool_stats, replica_state
 from app.routers import (
     users, administrators, product,
     category, orders, payments,
@@ -16,6 +17,8 @@ from app.routers import (
 )
 from app.admin import create_default_admin
 from app.services.message_handlers import register_message_handlers
+from app.services.orders_service import run_order_stats_maintenance
+from app.utils.config import ORDER_STATS_FOLD_INTERVAL
 
 # Настройка логирования
 logging.basicConfig(
@@ -77,6 +80,8 @@ app.add_middleware(
     allow_credentials=True,  # Важно для передачи куки
     allow_methods=["*"],     # Разрешаем все методы
     allow_headers=["*"],     # Разрешаем все заголовки
+    # Курсор следующей страницы списка заказов должен быть доступен фронтенду
+    expose_headers=["X-Next-Cursor"],
 )
 logger.info("✅ CORS middleware подключен!")
 
@@ -133,6 +138,20 @@ def health_check():
     return {"status": "ok", "timestamp": str(datetime.now())}
 
 
+@app.get("/health/db-pool")
+def db_pool_status():
+    """Состояние пула соединений с БД и счетчики долгих ожиданий/удержаний"""
+    return {
+        "pool": engine.pool.status(),
+        **pool_stats,
+        "read_replica": {
+            **replica_state,
+            "pool": read_engine.pool.status() if read_engine is not None else None,
+        },
+        "timestamp": str(datetime.now())
+    }
+
+
 @app.api_route("/ais/administrators/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
 async def ais_admin_proxy(path: str, request: Request):
     """Проксирование запросов к AIS Administrators API"""
@@ -152,6 +171,8 @@ async def startup_event():
     logger.info("Запуск АИС Backend...")
     # Регистрация обработчиков сообщений
     register_message_handlers()
+    if ORDER_STATS_FOLD_INTERVAL > 0:
+        app.state.order_stats_task = asyncio.create_task(run_order_stats_maintenance())
     logger.info("АИС Backend успешно запущен!")
 
 
@@ -161,4 +182,7 @@ async def shutdown_event():
     Действия при остановке приложения
     """
     logger.info("Остановка АИС Backend...")
+    task = getattr(app.state, "order_stats_task", None)
+    if task is not None:
+        task.cancel()
     logger.info("АИС Backend успешно остановлен!")
@@ -17,4 +17,5 @@ from app.models.stock import Stock
 from app.models.stock_movement import StockMovement
 from app.models.supply import Supply, SupplyItem
 from app.models.supplier import Supplier
+from app.models.discount import Discount
 
@@ -9,7 +9,8 @@ from sqlalchemy import (
     Enum,
     Date,
     Boolean,
-    JSON
+    JSON,
+    Index
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -21,11 +22,15 @@ from app.database import Base
 # ------------------------------
 class CartItem(Base):
     __tablename__ = "cart_items"
+    __table_args__ = (
+        Index("uq_cart_items_user_product", "user_id", "product_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     quantity = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
     # Связи
     user = relationship("User", back_populates="cart_items")
@@ -0,0 +1,45 @@
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    DateTime,
+    Float,
+    Boolean,
+    CheckConstraint,
+    Index
+)
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+# ------------------------------
+#   Скидки и промо-коды (discounts)
+# ------------------------------
+class Discount(Base):
+    __tablename__ = "discounts"
+    __table_args__ = (
+        CheckConstraint("scope IN ('product', 'category', 'promo')", name="ck_discounts_scope"),
+        CheckConstraint("discount_type IN ('percentage', 'fixed')", name="ck_discounts_type"),
+        CheckConstraint("value >= 0", name="ck_discounts_value"),
+        CheckConstraint(
+            "(scope = 'promo' AND code IS NOT NULL) OR (scope <> 'promo' AND target_id IS NOT NULL)",
+            name="ck_discounts_target"
+        ),
+        Index("ix_discounts_scope_target", "scope", "target_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=True)
+    scope = Column(String(20), nullable=False)
+    # ID товара или категории (для скидок на товар/категорию)
+    target_id = Column(Integer, nullable=True)
+    # Промо-код в верхнем регистре
+    code = Column(String(50), nullable=True, unique=True)
+    discount_type = Column(String(20), nullable=False, server_default="percentage")
+    value = Column(Float, nullable=False)
+    # Окно действия (UTC); пустая граница - без ограничения
+    starts_at = Column(DateTime, nullable=True)
+    ends_at = Column(DateTime, nullable=True)
+    is_active = Column(Boolean, nullable=False, server_default="true")
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
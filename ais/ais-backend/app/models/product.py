@@ -6,7 +6,8 @@ from sqlalchemy import (
     ForeignKey,
     Text,
     DateTime,
-    Float
+    Float,
+    JSON
 )
 from sqlalchemy.orm import relationship
 from app.models.base import Base
@@ -26,6 +27,8 @@ class Product(Base):
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
     created_at = Column(DateTime, server_default="CURRENT_TIMESTAMP", nullable=True)
     image_url = Column(String, nullable=True)
+    # Манифест вариантов изображения (миниатюра, AVIF/WebP/JPEG), заполняет витрина
+    image_variants = Column(JSON, nullable=True)
     weight = Column(String(50), nullable=True)
 
     # Связи
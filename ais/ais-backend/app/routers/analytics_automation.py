@@ -9,7 +9,7 @@ from io import BytesIO
 import matplotlib.pyplot as plt
 import seaborn as sns
 from fastapi.responses import StreamingResponse
-from app.database import get_db
+from app.database import get_read_db
 from app.models import Order, OrderItem, Product, Category, User, StockMovement, MovementType
 
 router = APIRouter()
@@ -21,7 +21,7 @@ def generate_automated_sales_report(
     end_date: Optional[str] = Query(None, description="Конечная дата в формате YYYY-MM-DD"),
     category_id: Optional[int] = Query(None, description="ID категории товаров"),
     export_format: str = Query("json", description="Формат экспорта: json, excel, pdf"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Автоматическая генерация отчета по продажам с возможностью экспорта
@@ -212,7 +212,7 @@ def generate_automated_sales_report(
 def generate_customer_segmentation(
     min_orders: int = Query(1, description="Минимальное количество заказов для анализа"),
     days: int = Query(180, description="Период анализа в днях"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Автоматическая сегментация клиентов на основе их покупательского поведения
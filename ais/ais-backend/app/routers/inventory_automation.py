@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
 import logging
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models import Product, Stock, StockMovement, MovementType, Warehouse
 from app.services.notifications import send_email_notification
 from app.schemas.inventory import InventoryReport, StockThreshold, ReorderRecommendation
@@ -12,7 +12,7 @@ router = APIRouter()
 logger = logging.getLogger("inventory-automation")
 
 @router.get("/low-stock-alerts", response_model=List[ReorderRecommendation])
-def get_low_stock_alerts(db: Session = Depends(get_db)):
+def get_low_stock_alerts(db: Session = Depends(get_read_db)):
 
     # Находим товары с низким запасом
     threshold_query = db.query(
@@ -80,7 +80,7 @@ def get_low_stock_alerts(db: Session = Depends(get_db)):
 def get_automated_inventory_report(
     days: Optional[int] = 30,
     warehouse_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Автоматизированный отчет по движению запасов с аналитикой
@@ -1,12 +1,20 @@
-from fastapi import APIRouter, HTTPException, Depends, Path, Query
+from fastapi import APIRouter, HTTPException, Depends, Path, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
+from datetime import date
 
+from app.crud.orders import ORDER_FIELDS, ORDER_SORT_KEYS, ORDER_STATUS_TRANSITIONS
 from app.database import get_db
 from app.services.logging_service import logger
 from app.services.orders_service import OrderService
-from app.schemas.order import OrderCreate, OrderUpdate, OrderResponse, OrderWithPayment, OrderInDB
+from app.schemas.order import (
+    OrderCreate, OrderUpdate, OrderResponse, OrderWithPayment, OrderInDB,
+    OrderStatusBatchUpdate, OrderStatusBatchResponse
+)
 from app.routers.auth import get_current_user, get_current_user_optional
+from app.utils.pagination import InvalidCursorError, pagination_headers
 
 # Создаем роутер для заказов
 router = APIRouter(tags=["Orders"])
@@ -20,10 +28,55 @@ router = APIRouter(
 
 # Получить все заказы
 @router.get("/", response_model=List[OrderWithPayment])
-def get_orders(db: Session = Depends(get_db), current_user=Depends(get_current_user_optional)):
-    """Получить все заказы в системе"""
+def get_orders(
+        response: Response,
+        status: Optional[str] = Query(None, description="Фильтр по статусу"),
+        user_id: Optional[int] = Query(None, description="Фильтр по пользователю"),
+        date_from: Optional[date] = Query(None, description="Созданы не раньше (YYYY-MM-DD)"),
+        date_to: Optional[date] = Query(None, description="Созданы не позже (YYYY-MM-DD)"),
+        sort_by: str = Query(
+            "created_at", description="Сортировка (created_at, created_at_asc, total_price, total_price_desc)"
+        ),
+        limit: int = Query(100, ge=1, le=500, description="Размер страницы"),
+        cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+        offset: int = Query(0, ge=0, description="Сколько заказов пропустить (устарело, используйте cursor)"),
+        fields: Optional[str] = Query(None, description="Поля заказа через запятую, например id,status,total_price"),
+        db: Session = Depends(get_db),
+        current_user=Depends(get_current_user_optional)
+):
+    """
+    Получить заказы в системе с фильтрами и сортировкой на сервере.
+    Пагинация курсорная: следующая страница запрашивается с cursor из заголовка
+    X-Next-Cursor. С fields возвращаются только перечисленные поля (и id),
+    тяжелые колонки (товары, примечания) при этом не читаются из базы.
+    """
     try:
-        return OrderService.get_all_orders(db)
+        if sort_by not in ORDER_SORT_KEYS:
+            sort_by = "created_at"
+
+        projection = None
+        if fields:
+            projection = {field.strip() for field in fields.split(",") if field.strip()}
+            unknown = projection - set(ORDER_FIELDS)
+            if unknown:
+                raise HTTPException(
+                    status_code=400, detail=f"Неизвестные поля заказа: {', '.join(sorted(unknown))}"
+                )
+
+        orders, next_cursor = OrderService.get_orders_page(
+            db, status=status, user_id=user_id, date_from=date_from, date_to=date_to,
+            sort_by=sort_by, limit=limit, cursor=cursor, offset=offset, fields=projection
+        )
+        headers = pagination_headers(next_cursor)
+
+        if projection is not None:
+            # Мимо response_model: иначе отсутствующие поля вернулись бы со значением null
+            return JSONResponse(content=jsonable_encoder(orders), headers=headers)
+
+        response.headers.update(headers)
+        return orders
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -31,12 +84,49 @@ def get_orders(db: Session = Depends(get_db), current_user=Depends(get_current_u
         raise HTTPException(status_code=500, detail=f"Ошибка при получении заказов: {str(e)}")
 
 
+# Получить статистику по заказам
+@router.get("/stats", response_model=Dict[str, Dict[str, Any]])
+def get_orders_stats(db: Session = Depends(get_db), current_user=Depends(get_current_user_optional)):
+    """Получение статистики по заказам в разрезе статусов (из сводки, без прохода по заказам)"""
+    try:
+        return OrderService.get_orders_statistics(db)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Неожиданная ошибка при получении статистики заказов: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Ошибка при получении статистики: {str(e)}")
+
+
+# Получить статистику по заказам в разрезе дней
+@router.get("/stats/daily", response_model=List[Dict[str, Any]])
+def get_daily_orders_stats(
+        date_from: Optional[date] = Query(None, description="С дня (YYYY-MM-DD)"),
+        date_to: Optional[date] = Query(None, description="По день включительно (YYYY-MM-DD)"),
+        db: Session = Depends(get_db),
+        current_user=Depends(get_current_user_optional)
+):
+    """Количество и сумма заказов по дням создания и статусам"""
+    try:
+        return OrderService.get_daily_orders_statistics(db, date_from, date_to)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Неожиданная ошибка при получении статистики заказов по дням: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Ошибка при получении статистики: {str(e)}")
+
+
 # Получить все заказы пользователя
 @router.get("/user/{user_id}", response_model=List[OrderResponse])
-def get_user_orders(user_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user_optional)):
+def get_user_orders(
+        user_id: int,
+        limit: Optional[int] = Query(None, ge=1, le=500),
+        offset: int = Query(0, ge=0),
+        db: Session = Depends(get_db),
+        current_user=Depends(get_current_user_optional)
+):
     """Получить заказы конкретного пользователя"""
     try:
-        return OrderService.get_orders_for_user(user_id, db)
+        return OrderService.get_orders_for_user(user_id, db, limit=limit, offset=offset)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -79,6 +169,29 @@ def create_order(order_data: OrderCreate, db: Session = Depends(get_db),
         raise HTTPException(status_code=500, detail=f"Ошибка при создании заказа: {str(e)}")
 
 
+# Массовое обновление статуса заказов (до /{order_id}, иначе путь совпал бы с ним)
+@router.patch("/status:batch", response_model=OrderStatusBatchResponse)
+def update_orders_status_batch(
+        data: OrderStatusBatchUpdate,
+        db: Session = Depends(get_db),
+        current_user=Depends(get_current_user_optional)
+):
+    """
+    Перевести несколько заказов в один статус. Недопустимый переход или
+    отсутствующий заказ не отменяет изменение остальных - результат по каждому id
+    """
+    try:
+        if data.status not in ORDER_STATUS_TRANSITIONS:
+            raise HTTPException(status_code=400, detail=f"Неизвестный статус заказа: {data.status}")
+
+        return OrderService.update_orders_status(data.ids, data.status, db)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Неожиданная ошибка при массовом обновлении статуса заказов: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Ошибка при массовом обновлении статуса заказов: {str(e)}")
+
+
 # Обновление статуса заказа
 @router.patch("/{order_id}/status", response_model=OrderWithPayment)
 def update_order_status(
@@ -123,27 +236,16 @@ def update_order(
 @router.get("/status/{status}", response_model=List[OrderWithPayment])
 def get_orders_by_status(
         status: str = Path(...),
+        limit: Optional[int] = Query(None, ge=1, le=500),
+        offset: int = Query(0, ge=0),
         db: Session = Depends(get_db),
         current_user=Depends(get_current_user_optional)
 ):
     """Получить все заказы с указанным статусом"""
     try:
-        return OrderService.get_orders_with_status(status, db)
+        return OrderService.get_orders_with_status(status, db, limit=limit, offset=offset)
     except HTTPException as e:
         raise e
     except Exception as e:
         logger.error(f"Неожиданная ошибка при получении заказов со статусом {status}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при получении заказов по статусу: {str(e)}")
-
-
-# Получить статистику по заказам
-@router.get("/stats", response_model=Dict[str, Dict[str, Any]])
-def get_orders_stats(db: Session = Depends(get_db), current_user=Depends(get_current_user_optional)):
-    """Получение статистики по заказам в разрезе статусов"""
-    try:
-        return OrderService.get_orders_statistics(db)
-    except HTTPException as e:
-        raise e
-    except Exception as e:
-        logger.error(f"Неожиданная ошибка при получении статистики заказов: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Ошибка при получении статистики: {str(e)}")
\ No newline at end of file
@@ -1,11 +1,12 @@
 # app/routers/product.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
 from app.database import get_db
 from app.schemas import ProductCreate, ProductResponse, ProductBase, ProductUpdate
 from app.crud import product as product_crud
+from app.crud import product_search
 
 router = APIRouter()
 
@@ -20,6 +21,40 @@ def get_products(
     """
     return product_crud.get_products(db, category_id, search)
 
+@router.get("/search", response_model=List[ProductResponse])
+def search_products(
+    q: str = Query(..., min_length=1, description="Поисковый запрос"),
+    category_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """
+    Ранжированный поиск товаров (морфология + нечеткое совпадение названия)
+    """
+    return [product for product, _ in product_search.search_products(db, q, limit, category_id)]
+
+@router.get("/search/suggest")
+def suggest_products(
+    q: str = Query(..., min_length=2, description="Поисковый запрос"),
+    limit: int = Query(5, ge=1, le=20),
+    db: Session = Depends(get_db)
+):
+    """
+    Подсказки для запроса с опечаткой
+    """
+    return {"query": q, "suggestions": product_search.suggest(db, q, limit)}
+
+@router.get("/search/autocomplete")
+def autocomplete_products(
+    q: str = Query(..., min_length=2, description="Начало запроса"),
+    limit: int = Query(10, ge=1, le=20),
+    db: Session = Depends(get_db)
+):
+    """
+    Автодополнение названий товаров
+    """
+    return product_search.autocomplete(db, q, limit)
+
 @router.post("", response_model=ProductResponse)
 def create_product(product: ProductCreate, db: Session = Depends(get_db)):
     """
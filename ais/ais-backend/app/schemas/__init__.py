@@ -37,7 +37,8 @@ from app.schemas.order_item import (
 # Экспортируем схемы заказов
 from app.schemas.order import (
     OrderBase, OrderCreate, OrderUpdate, OrderInDB,
-    OrderResponse, OrderWithPayment
+    OrderResponse, OrderWithPayment,
+    OrderStatusBatchUpdate, OrderStatusBatchResult, OrderStatusBatchResponse
 )
 
 # Экспортируем схемы платежей
@@ -66,3 +66,26 @@ class OrderWithPayment(BaseModel):
     items: Optional[List[Dict[str, Any]]] = None
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class OrderStatusBatchUpdate(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=500)
+    status: str
+
+
+class OrderStatusBatchResult(BaseModel):
+    id: int
+    success: bool
+    # updated - статус изменен, unchanged - заказ уже был в этом статусе, failed - ошибка
+    outcome: str
+    status: Optional[str] = None
+    previous_status: Optional[str] = None
+    tracking_number: Optional[str] = None
+    error: Optional[str] = None
+
+
+class OrderStatusBatchResponse(BaseModel):
+    updated: int
+    unchanged: int
+    failed: int
+    results: List[OrderStatusBatchResult]
@@ -1,31 +1,50 @@
+import asyncio
+from collections import Counter
+from typing import Optional
+
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
 
 from app.schemas.order import OrderCreate, OrderUpdate, OrderWithPayment, OrderResponse
 from app.crud.orders import (
     get_orders,
+    get_orders_page,
     get_user_orders,
     get_order_detail,
     create_order,
     update_order_status,
+    update_orders_status_batch,
     update_order,
     get_orders_by_status,
-    get_orders_stats
+    get_orders_stats,
+    get_daily_orders_stats,
+    fold_order_stats,
+    reconcile_order_stats
 )
+from app.database import SessionLocal
 from app.services.logging_service import logger
+from app.utils.config import ORDER_STATS_FOLD_INTERVAL, ORDER_STATS_RECONCILE_INTERVAL
 
 
 class OrderService:
     @staticmethod
-    def get_all_orders(db: Session):
-        orders = get_orders(db)
+    def get_all_orders(db: Session, **filters):
+        orders = get_orders(db, **filters)
         if orders is None:
             raise HTTPException(status_code=500, detail="Ошибка при получении заказов")
         return orders
 
     @staticmethod
-    def get_orders_for_user(user_id: int, db: Session):
-        orders = get_user_orders(user_id, db)
+    def get_orders_page(db: Session, **params):
+        page = get_orders_page(db, **params)
+        if page is None:
+            raise HTTPException(status_code=500, detail="Ошибка при получении заказов")
+        return page
+
+    @staticmethod
+    def get_orders_for_user(user_id: int, db: Session, limit: Optional[int] = None, offset: int = 0):
+        orders = get_user_orders(user_id, db, limit=limit, offset=offset)
         if orders is None:
             raise HTTPException(status_code=500, detail=f"Ошибка при получении заказов пользователя {user_id}")
         return orders
@@ -51,6 +70,19 @@ class OrderService:
             raise HTTPException(status_code=500, detail=f"Ошибка при обновлении статуса заказа {order_id}")
         return order
 
+    @staticmethod
+    def update_orders_status(order_ids: list, status: str, db: Session):
+        results = update_orders_status_batch(order_ids, status, db)
+        if results is None:
+            raise HTTPException(status_code=500, detail="Ошибка при массовом изменении статуса заказов")
+        counts = Counter(result["outcome"] for result in results)
+        return {
+            "updated": counts["updated"],
+            "unchanged": counts["unchanged"],
+            "failed": counts["failed"],
+            "results": results
+        }
+
     @staticmethod
     def update_order_details(order_id: int, data: dict, db: Session):
         order = update_order(order_id, data, db)
@@ -59,8 +91,8 @@ class OrderService:
         return order
 
     @staticmethod
-    def get_orders_with_status(status: str, db: Session):
-        orders = get_orders_by_status(status, db)
+    def get_orders_with_status(status: str, db: Session, limit: Optional[int] = None, offset: int = 0):
+        orders = get_orders_by_status(status, db, limit=limit, offset=offset)
         if orders is None:
             raise HTTPException(status_code=500, detail=f"Ошибка при получении заказов со статусом {status}")
         return orders
@@ -70,4 +102,38 @@ class OrderService:
         stats = get_orders_stats(db)
         if stats is None:
             raise HTTPException(status_code=500, detail="Ошибка при получении статистики заказов")
-        return stats
\ No newline at end of file
+        return stats
+
+    @staticmethod
+    def get_daily_orders_statistics(db: Session, date_from=None, date_to=None):
+        stats = get_daily_orders_stats(db, date_from, date_to)
+        if stats is None:
+            raise HTTPException(status_code=500, detail="Ошибка при получении статистики заказов по дням")
+        return stats
+
+
+def _with_session(fn) -> int:
+    db = SessionLocal()
+    try:
+        return fn(db)
+    finally:
+        db.close()
+
+
+async def run_order_stats_maintenance():
+    """
+    Фоновое обслуживание сводки заказов: сворачивание журнала изменений раз
+    в ORDER_STATS_FOLD_INTERVAL и сверка с таблицей orders раз
+    в ORDER_STATS_RECONCILE_INTERVAL (0 - сверка отключена)
+    """
+    loop = asyncio.get_running_loop()
+    reconciled_at = loop.time()
+    while True:
+        await asyncio.sleep(ORDER_STATS_FOLD_INTERVAL)
+        try:
+            await run_in_threadpool(_with_session, fold_order_stats)
+            if ORDER_STATS_RECONCILE_INTERVAL > 0 and loop.time() - reconciled_at >= ORDER_STATS_RECONCILE_INTERVAL:
+                reconciled_at = loop.time()
+                await run_in_threadpool(_with_session, reconcile_order_stats)
+        except Exception as e:
+            logger.error(f"Ошибка при обслуживании сводки заказов: {str(e)}")
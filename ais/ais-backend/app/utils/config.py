@@ -7,6 +7,34 @@ SECRET_KEY = os.getenv("SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))  # 24 часа по умолчанию
 
+# Настройки пула соединений с БД
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # 30 минут
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "True").lower() == "true"
+
+# Таймауты для каждого соединения (мс): тяжелый запрос не должен занимать соединение бесконечно
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+DB_LOCK_TIMEOUT_MS = int(os.getenv("DB_LOCK_TIMEOUT_MS", "5000"))
+
+# Пороги логирования: долгое ожидание соединения и долгое удержание соединения (мс)
+DB_SLOW_CHECKOUT_MS = int(os.getenv("DB_SLOW_CHECKOUT_MS", "500"))
+DB_LONG_CHECKOUT_MS = int(os.getenv("DB_LONG_CHECKOUT_MS", "10000"))
+
+# Реплика только для чтения для отчетов (пусто — отчеты читают основную БД)
+DATABASE_READ_REPLICA_URL = os.getenv("DATABASE_READ_REPLICA_URL", "")
+DB_REPORTING_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_REPORTING_STATEMENT_TIMEOUT_MS", "120000"))
+# Допустимое отставание реплики (с) и период его проверки (с)
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "30"))
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+
+# Период сворачивания журнала изменений в сводку заказов (с); 0 - фоновое обслуживание
+# сводки отключено (статистика остается точной, но журнал растет)
+ORDER_STATS_FOLD_INTERVAL = float(os.getenv("ORDER_STATS_FOLD_INTERVAL", "60"))
+# Период сверки сводки заказов order_stats с таблицей orders (с); 0 - сверка отключена
+ORDER_STATS_RECONCILE_INTERVAL = float(os.getenv("ORDER_STATS_RECONCILE_INTERVAL", "3600"))
+
 
 def settings():
     return None
@@ -0,0 +1,85 @@
+"""
+Keyset (курсорная) пагинация списков АИС на сыром SQL.
+
+Следующая страница выбирается условием "после последней строки предыдущей
+страницы" по паре (ключ сортировки, id), поэтому при индексе по ключу
+стоимость страницы не зависит от ее номера - в отличие от OFFSET.
+
+Курсор - непрозрачная строка (base64url от JSON с именем сортировки,
+значением ключа и id последней строки), отдается в заголовке X-Next-Cursor.
+NULL обрабатываются в порядке PostgreSQL по умолчанию: ASC - NULLS LAST,
+DESC - NULLS FIRST (совпадает с обходом btree-индекса в обе стороны).
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Dict, Optional, Tuple
+
+
+class InvalidCursorError(ValueError):
+    """Курсор поврежден или выдан для другой сортировки"""
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    if isinstance(value, dict) and "d" in value:
+        return date.fromisoformat(value["d"])
+    return value
+
+
+def encode_cursor(sort_by: str, value: Any, row_id: int) -> str:
+    payload = json.dumps({"s": sort_by, "v": _encode_value(value), "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str) -> Tuple[Any, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, row_id = _decode_value(payload["v"]), int(payload["id"])
+        cursor_sort = payload["s"]
+    except Exception:
+        raise InvalidCursorError("Некорректный курсор")
+    if cursor_sort != sort_by:
+        raise InvalidCursorError("Курсор выдан для другой сортировки")
+    return value, row_id
+
+
+def order_by_clause(column: str, id_column: str, descending: bool) -> str:
+    if descending:
+        return f"{column} DESC NULLS FIRST, {id_column} DESC"
+    return f"{column} ASC NULLS LAST, {id_column} ASC"
+
+
+def after_clause(column: str, id_column: str, descending: bool, value: Any) -> str:
+    """
+    Условие "строка идет после курсора" в порядке order_by_clause.
+    Значения передаются параметрами :cursor_value и :cursor_id.
+    """
+    if descending:
+        # NULLS FIRST: сначала группа NULL (id по убыванию), затем значения по убыванию
+        if value is None:
+            return f"(({column} IS NULL AND {id_column} < :cursor_id) OR {column} IS NOT NULL)"
+        return f"({column} < :cursor_value OR ({column} = :cursor_value AND {id_column} < :cursor_id))"
+
+    # NULLS LAST: значения по возрастанию, затем группа NULL (id по возрастанию)
+    if value is None:
+        return f"({column} IS NULL AND {id_column} > :cursor_id)"
+    return (
+        f"({column} > :cursor_value OR ({column} = :cursor_value AND {id_column} > :cursor_id)"
+        f" OR {column} IS NULL)"
+    )
+
+
+def pagination_headers(next_cursor: Optional[str]) -> Dict[str, str]:
+    return {"X-Next-Cursor": next_cursor} if next_cursor else {}
@@ -0,0 +1,88 @@
+"""
+Сравнение поиска товаров: прежний ILIKE '%term%' по названию и описанию
+против полнотекстового поиска (tsvector + pg_trgm, миграция d9b24e6f1c38).
+
+Для каждого запроса выполняет EXPLAIN (ANALYZE, FORMAT JSON) несколько раз
+и печатает медианное время выполнения, число найденных строк и узлы плана
+(Seq Scan / Bitmap Index Scan), чтобы было видно, используется ли индекс.
+
+Запуск из каталога ais/ais-backend (нужна БД из DATABASE_URL):
+    python bench_product_search.py
+    python bench_product_search.py --terms лосось икра "копченая рыба" --repeat 20
+"""
+
+import argparse
+import json
+import statistics
+
+from sqlalchemy import or_, text
+
+from app.crud import product_search
+from app.database import SessionLocal
+from app.models import Product
+
+DEFAULT_TERMS = ["лосось", "икра", "копченая", "форель", "лососся", "сельдь"]
+
+
+def ilike_query(db, term):
+    return db.query(Product).filter(
+        or_(Product.name.ilike(f"%{term}%"), Product.description.ilike(f"%{term}%"))
+    )
+
+
+def fts_query(db, term):
+    return db.query(Product).filter(product_search.matches(term)).order_by(
+        product_search.rank(term).desc(), Product.id
+    )
+
+
+def explain(db, query):
+    compiled = query.statement.compile(dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True})
+    plan = db.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {compiled}")).scalar()
+    return json.loads(plan)[0] if isinstance(plan, str) else plan[0]
+
+
+def plan_nodes(node):
+    nodes = [node["Node Type"]]
+    for child in node.get("Plans", []):
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+
+def measure(db, query, repeat):
+    timings, rows, nodes = [], 0, []
+    for _ in range(repeat):
+        result = explain(db, query)
+        timings.append(result["Execution Time"])
+        rows = result["Plan"]["Actual Rows"]
+        nodes = plan_nodes(result["Plan"])
+    return statistics.median(timings), rows, nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ILIKE против полнотекстового поиска товаров")
+    parser.add_argument("--terms", nargs="+", default=DEFAULT_TERMS, help="поисковые запросы")
+    parser.add_argument("--repeat", type=int, default=10, help="повторов на запрос")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        total = db.query(Product).count()
+        print(f"Товаров в каталоге: {total}\n")
+        print(f"{'запрос':<20} {'ILIKE, мс':>10} {'строк':>6}   {'FTS, мс':>10} {'строк':>6}   план FTS")
+        for term in args.terms:
+            ilike_ms, ilike_rows, _ = measure(db, ilike_query(db, term), args.repeat)
+            fts_ms, fts_rows, fts_nodes = measure(db, fts_query(db, term), args.repeat)
+            scans = ", ".join(sorted({node for node in fts_nodes if "Scan" in node}))
+            print(f"{term:<20} {ilike_ms:>10.3f} {ilike_rows:>6}   {fts_ms:>10.3f} {fts_rows:>6}   {scans}")
+
+            if not fts_rows:
+                suggestions = product_search.suggest(db, term)
+                if suggestions:
+                    print(f"{'':<20} подсказки: {', '.join(suggestions)}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
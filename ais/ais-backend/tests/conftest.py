@@ -0,0 +1,100 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+# Тесты запускаются из ais/ais-backend: пакет app должен импортироваться
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Отдельная база PostgreSQL с примененными миграциями (alembic upgrade head).
+# Сырой SQL заказов (jsonb, ANY, advisory-блокировки, триггеры сводки) проверяется
+# только на ней; без переменной такие тесты пропускаются
+TEST_DATABASE_URL = os.getenv("AIS_TEST_DATABASE_URL")
+
+# Таблицы, которые каждый тест начинает пустыми
+ORDER_TABLES = (
+    "users", "categories", "products", "orders", "order_items",
+    "order_stats", "order_status_totals", "order_stats_deltas",
+)
+
+
+@pytest.fixture(scope="session")
+def pg_engine():
+    if not TEST_DATABASE_URL:
+        pytest.skip("AIS_TEST_DATABASE_URL не задан")
+    engine = create_engine(TEST_DATABASE_URL)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def pg_db(pg_engine):
+    """
+    Сессия внутри транзакции, которая откатывается после теста: commit() в коде
+    фиксирует только точку сохранения, и тест не оставляет данных в базе
+    """
+    connection = pg_engine.connect()
+    transaction = connection.begin()
+    db = Session(bind=connection, join_transaction_mode="create_savepoint")
+    db.execute(text(f"TRUNCATE {', '.join(ORDER_TABLES)} RESTART IDENTITY CASCADE"))
+    try:
+        yield db
+    finally:
+        db.close()
+        transaction.rollback()
+        connection.close()
+
+
+@pytest.fixture
+def make_user(pg_db):
+    def make(username: str, full_name=None) -> int:
+        return pg_db.execute(text("""
+        INSERT INTO users (username, email, password_hash, phone, full_name)
+        VALUES (:username, :username || '@example.com', 'x', :username, :full_name)
+        RETURNING id
+        """), {"username": username, "full_name": full_name}).scalar()
+    return make
+
+
+@pytest.fixture
+def make_product(pg_db):
+    def make(name: str, price: float = 100.0) -> int:
+        return pg_db.execute(
+            text("INSERT INTO products (name, price) VALUES (:name, :price) RETURNING id"),
+            {"name": name, "price": price}
+        ).scalar()
+    return make
+
+
+@pytest.fixture
+def make_order(pg_db, make_user):
+    """Заказ с позициями items: [(product_id, quantity, price, product_name)]"""
+    state = {}
+
+    def make(status="pending", total_price=100.0, created_at=datetime(2026, 10, 1, 12, 0),
+             user_id=None, items=(), client_name=None) -> int:
+        if user_id is None:
+            if "user_id" not in state:
+                state["user_id"] = make_user("buyer")
+            user_id = state["user_id"]
+        order_id = pg_db.execute(text("""
+        INSERT INTO orders (user_id, status, total_price, created_at, client_name)
+        VALUES (:user_id, :status, :total_price, :created_at, :client_name)
+        RETURNING id
+        """), {
+            "user_id": user_id, "status": status, "total_price": total_price,
+            "created_at": created_at, "client_name": client_name
+        }).scalar()
+        for product_id, quantity, price, product_name in items:
+            pg_db.execute(text("""
+            INSERT INTO order_items (order_id, product_id, quantity, price, product_name)
+            VALUES (:order_id, :product_id, :quantity, :price, :product_name)
+            """), {
+                "order_id": order_id, "product_id": product_id, "quantity": quantity,
+                "price": price, "product_name": product_name
+            })
+        return order_id
+    return make
@@ -0,0 +1,76 @@
+"""Перенос позиций из JSON orders.order_items (миграция e2a9c5f7b310)"""
+
+import importlib.util
+import json
+import os
+
+import pytest
+from sqlalchemy import text
+
+from app.crud.orders import load_order_items
+
+MIGRATION_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "alembic", "versions", "e2a9c5f7b310_backfill_order_items_from_json.py"
+)
+
+
+@pytest.fixture(scope="module")
+def migration():
+    spec = importlib.util.spec_from_file_location("backfill_order_items_from_json", MIGRATION_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _set_json_items(db, order_id, items):
+    db.execute(
+        text("UPDATE orders SET order_items = CAST(:items AS jsonb) WHERE id = :order_id"),
+        {"items": json.dumps(items), "order_id": order_id}
+    )
+
+
+def _backfill(db, migration):
+    return db.execute(migration.BACKFILL_BATCH, {"first_id": 0, "next_id": 10 ** 9}).fetchone()
+
+
+def test_items_of_deleted_products_are_kept(pg_db, make_order, make_product, migration):
+    salmon = make_product("Семга", 300.0)
+    order_id = make_order(total_price=700.0)
+    _set_json_items(pg_db, order_id, [
+        {"product_id": salmon, "quantity": 1, "price": 300.0},
+        {"product_id": 999, "quantity": 2, "price": 200.0, "name": "Снятая с продажи икра"},
+    ])
+
+    counts = _backfill(pg_db, migration)
+
+    assert (counts.total, counts.without_product) == (2, 1)
+    items = load_order_items([order_id], pg_db)[order_id]
+    assert [(item["product_id"], item["name"], item["quantity"]) for item in items] == [
+        (salmon, "Семга", 1), (None, "Снятая с продажи икра", 2)
+    ]
+    # Состав заказа сходится с его суммой
+    assert sum(item["price"] * item["quantity"] for item in items) == 700.0
+
+
+def test_orders_with_items_are_not_backfilled_twice(pg_db, make_order, make_product, migration):
+    product = make_product("Треска")
+    order_id = make_order(items=[(product, 1, 100.0, None)])
+    _set_json_items(pg_db, order_id, [{"product_id": product, "quantity": 5, "price": 100.0}])
+
+    assert _backfill(pg_db, migration).total == 0
+    assert [item["quantity"] for item in load_order_items([order_id], pg_db)[order_id]] == [1]
+
+
+def test_deleting_product_keeps_order_items(pg_db, make_order, make_product):
+    product = make_product("Краб")
+    order_id = make_order(items=[(product, 1, 100.0, None)])
+    unnamed_id = make_order(items=[(product, 1, 100.0, None)])
+    pg_db.execute(text("UPDATE order_items SET product_name = 'Краб камчатский' WHERE order_id = :id"),
+                  {"id": order_id})
+
+    pg_db.execute(text("DELETE FROM products WHERE id = :id"), {"id": product})
+
+    items = load_order_items([order_id, unnamed_id], pg_db)
+    assert [(item["product_id"], item["name"]) for item in items[order_id]] == [(None, "Краб камчатский")]
+    assert [(item["product_id"], item["name"]) for item in items[unnamed_id]] == [(None, "Удаленный товар")]
@@ -0,0 +1,132 @@
+"""Сводка заказов: журнал изменений, сворачивание и сверка (миграция f5c8d2a7e931)"""
+
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import text
+
+from app.crud.orders import (
+    ORDER_STATS_LOCK_KEY, fold_order_stats, get_daily_orders_stats, get_orders_stats,
+    reconcile_order_stats
+)
+
+FIRST_DAY = datetime(2026, 10, 1, 10, 0)
+SECOND_DAY = datetime(2026, 10, 2, 18, 30)
+
+
+def _actual_stats(db):
+    rows = db.execute(text("""
+    SELECT status, count(*) AS order_count, sum(total_price) AS total_amount
+    FROM orders GROUP BY status
+    """)).fetchall()
+    return {row.status: {"count": row.order_count, "total_amount": row.total_amount} for row in rows}
+
+
+def _commit(db):
+    """
+    Фиксирует изменения теста (точку сохранения pg_db): сворачивание и сверка
+    откатывают свою транзакцию, а в рабочей базе правки к этому моменту уже зафиксированы
+    """
+    db.commit()
+
+
+def _pending_deltas(db):
+    return db.execute(text("SELECT count(*) FROM order_stats_deltas")).scalar()
+
+
+@pytest.fixture
+def orders(pg_db, make_order):
+    return [
+        make_order(status="pending", total_price=100.0, created_at=FIRST_DAY),
+        make_order(status="pending", total_price=250.0, created_at=SECOND_DAY),
+        make_order(status="shipped", total_price=400.0, created_at=SECOND_DAY),
+    ]
+
+
+def test_stats_include_unfolded_deltas(pg_db, orders):
+    assert _pending_deltas(pg_db) == 3
+    assert get_orders_stats(pg_db) == _actual_stats(pg_db)
+
+
+def test_fold_moves_deltas_into_summary(pg_db, orders):
+    before = get_orders_stats(pg_db)
+
+    assert fold_order_stats(pg_db) == 3
+
+    assert _pending_deltas(pg_db) == 0
+    assert get_orders_stats(pg_db) == before
+    assert fold_order_stats(pg_db) == 0
+
+
+def test_status_change_moves_order_between_statuses(pg_db, orders):
+    fold_order_stats(pg_db)
+    pg_db.execute(text("UPDATE orders SET status = 'shipped' WHERE id = :id"), {"id": orders[0]})
+    pg_db.execute(text("UPDATE orders SET delivery_notes = 'у двери' WHERE id = :id"), {"id": orders[1]})
+
+    # Смена статуса - две записи журнала, правка примечания - ни одной
+    assert _pending_deltas(pg_db) == 2
+    assert get_orders_stats(pg_db) == _actual_stats(pg_db)
+
+    fold_order_stats(pg_db)
+    assert get_orders_stats(pg_db) == _actual_stats(pg_db)
+    assert get_daily_orders_stats(pg_db, date(2026, 10, 1), date(2026, 10, 1)) == [
+        {"day": date(2026, 10, 1), "status": "shipped", "count": 1, "total_amount": 100.0}
+    ]
+
+
+def test_undated_orders_are_counted(pg_db, make_order):
+    # В схеме миграций created_at NOT NULL, но в старых базах встречается NULL
+    pg_db.execute(text("ALTER TABLE orders ALTER COLUMN created_at DROP NOT NULL"))
+    make_order(status="pending", total_price=50.0, created_at=None)
+    fold_order_stats(pg_db)
+
+    assert get_daily_orders_stats(pg_db) == [
+        {"day": date(1970, 1, 1), "status": "pending", "count": 1, "total_amount": 50.0}
+    ]
+    assert reconcile_order_stats(pg_db) == 0
+
+
+def test_fold_skips_while_another_worker_folds(pg_db, pg_engine, orders):
+    _commit(pg_db)
+    with pg_engine.connect() as other:
+        with other.begin():
+            assert other.execute(
+                text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": ORDER_STATS_LOCK_KEY}
+            ).scalar()
+            assert fold_order_stats(pg_db) == 0
+
+    assert _pending_deltas(pg_db) == 3
+
+
+@pytest.mark.parametrize("fold_first", [True, False])
+def test_reconcile_repairs_drift(pg_db, orders, fold_first):
+    if fold_first:
+        fold_order_stats(pg_db)
+    # Правка в обход триггера (например, с отключенными триггерами при загрузке дампа)
+    pg_db.execute(text("ALTER TABLE orders DISABLE TRIGGER orders_stats_update"))
+    pg_db.execute(text("UPDATE orders SET status = 'delivered', total_price = 420 WHERE id = :id"),
+                  {"id": orders[2]})
+    pg_db.execute(text("ALTER TABLE orders ENABLE TRIGGER orders_stats_update"))
+    _commit(pg_db)
+    assert get_orders_stats(pg_db) != _actual_stats(pg_db)
+
+    assert reconcile_order_stats(pg_db) == 1
+
+    assert get_orders_stats(pg_db) == _actual_stats(pg_db)
+    # Несвернутый журнал после сверки сворачивается без повторного учета
+    fold_order_stats(pg_db)
+    assert get_orders_stats(pg_db) == _actual_stats(pg_db)
+    assert reconcile_order_stats(pg_db) == 0
+
+
+def test_reconcile_clears_vanished_status(pg_db, orders):
+    fold_order_stats(pg_db)
+    pg_db.execute(text("ALTER TABLE orders DISABLE TRIGGER orders_stats_insert_delete"))
+    pg_db.execute(text("DELETE FROM orders WHERE status = 'shipped'"))
+    pg_db.execute(text("ALTER TABLE orders ENABLE TRIGGER orders_stats_insert_delete"))
+    _commit(pg_db)
+
+    assert reconcile_order_stats(pg_db) == 1
+
+    assert get_orders_stats(pg_db) == _actual_stats(pg_db)
+    assert "shipped" not in get_orders_stats(pg_db)
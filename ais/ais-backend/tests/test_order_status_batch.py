@@ -0,0 +1,83 @@
+"""Массовая смена статуса заказов: результат по каждому id"""
+
+from sqlalchemy import text
+
+from app.crud.orders import update_orders_status_batch
+from app.services.orders_service import OrderService
+
+
+def _order(db, order_id):
+    return db.execute(text("""
+    SELECT status, delivery_status, tracking_number, actual_delivery FROM orders WHERE id = :id
+    """), {"id": order_id}).fetchone()
+
+
+def test_outcome_per_id(pg_db, make_order):
+    processing = make_order(status="processing")
+    shipped = make_order(status="shipped")
+    cancelled = make_order(status="cancelled")
+
+    results = update_orders_status_batch([cancelled, shipped, 999, processing, shipped], "shipped", pg_db)
+
+    # Порядок запроса сохраняется, повторный id дает один результат
+    assert [(result["id"], result["outcome"]) for result in results] == [
+        (cancelled, "failed"), (shipped, "unchanged"), (999, "failed"), (processing, "updated")
+    ]
+    assert results[0]["error"] == "Переход из статуса cancelled в shipped недопустим"
+    assert results[2]["error"] == "Заказ не найден"
+    assert results[3]["previous_status"] == "processing"
+    # Недопустимый переход не мешает остальным и не меняет заказ
+    assert _order(pg_db, cancelled).status == "cancelled"
+    assert _order(pg_db, processing).status == "shipped"
+
+
+def test_tracked_statuses_get_unique_tracking_numbers(pg_db, make_order):
+    first = make_order(status="processing")
+    second = make_order(status="processing")
+    numbered = make_order(status="processing")
+    pg_db.execute(text("UPDATE orders SET tracking_number = 'SF-KEEP' WHERE id = :id"), {"id": numbered})
+
+    results = update_orders_status_batch([first, second, numbered], "shipped", pg_db)
+
+    numbers = [result["tracking_number"] for result in results]
+    assert numbers[0] and numbers[1] and numbers[0] != numbers[1]
+    assert numbers[2] == "SF-KEEP"
+    assert [_order(pg_db, order_id).tracking_number for order_id in (first, second, numbered)] == numbers
+    assert _order(pg_db, first).delivery_status == "in_transit"
+
+
+def test_in_transit_then_delivered(pg_db, make_order):
+    order_id = make_order(status="shipped")
+    pg_db.execute(text("UPDATE orders SET tracking_number = 'SF-1' WHERE id = :id"), {"id": order_id})
+
+    [in_transit] = update_orders_status_batch([order_id], "in_transit", pg_db)
+    assert in_transit["outcome"] == "updated"
+    assert _order(pg_db, order_id).delivery_status == "in_transit"
+    assert _order(pg_db, order_id).actual_delivery is None
+
+    [delivered] = update_orders_status_batch([order_id], "delivered", pg_db)
+    order = _order(pg_db, order_id)
+    assert (delivered["outcome"], delivered["previous_status"]) == ("updated", "in_transit")
+    assert (order.status, order.delivery_status, order.tracking_number) == ("delivered", "delivered", "SF-1")
+    assert order.actual_delivery is not None
+
+
+def test_untracked_status_keeps_delivery_fields(pg_db, make_order):
+    order_id = make_order(status="pending")
+
+    [result] = update_orders_status_batch([order_id], "cancelled", pg_db)
+
+    order = _order(pg_db, order_id)
+    assert (result["outcome"], result["tracking_number"]) == ("updated", None)
+    assert (order.status, order.tracking_number, order.actual_delivery) == ("cancelled", None, None)
+
+
+def test_service_counts_outcomes(pg_db, make_order):
+    pending = make_order(status="pending")
+    processing = make_order(status="processing")
+    delivered = make_order(status="delivered")
+
+    response = OrderService.update_orders_status([pending, processing, delivered, 999], "processing", pg_db)
+
+    assert (response["updated"], response["unchanged"], response["failed"]) == (1, 1, 2)
+    assert [result["id"] for result in response["results"]] == [pending, processing, delivered, 999]
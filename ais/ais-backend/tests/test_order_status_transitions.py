@@ -0,0 +1,71 @@
+"""Таблица переходов статусов заказа для массовой смены статуса"""
+
+import pytest
+
+from app.crud.orders import (
+    DELIVERY_STATUS_BY_ORDER_STATUS, ORDER_STATUS_TRANSITIONS, TRACKED_STATUSES
+)
+
+# Статусы, которые админка АИС выставляет заказу (Orders.tsx, OrderEdit.tsx)
+UI_STATUSES = (
+    "pending", "processing", "shipped", "in_transit", "delivered", "completed", "cancelled", "returned"
+)
+
+
+def test_ui_statuses_are_known():
+    assert set(UI_STATUSES) <= set(ORDER_STATUS_TRANSITIONS)
+
+
+def test_targets_are_known_statuses():
+    for source, targets in ORDER_STATUS_TRANSITIONS.items():
+        assert targets <= set(ORDER_STATUS_TRANSITIONS), source
+        assert source not in targets
+
+
+@pytest.mark.parametrize("source, target", [
+    ("pending", "processing"),
+    ("processing", "shipped"),
+    ("shipped", "in_transit"),
+    ("shipped", "delivered"),
+    ("in_transit", "delivered"),
+    ("in_transit", "returned"),
+    ("delivered", "completed"),
+])
+def test_allowed_transitions(source, target):
+    assert target in ORDER_STATUS_TRANSITIONS[source]
+
+
+@pytest.mark.parametrize("source, target", [
+    ("pending", "in_transit"),
+    ("in_transit", "shipped"),
+    ("in_transit", "cancelled"),
+    ("delivered", "in_transit"),
+    ("cancelled", "processing"),
+])
+def test_forbidden_transitions(source, target):
+    assert target not in ORDER_STATUS_TRANSITIONS[source]
+
+
+def test_terminal_statuses():
+    assert ORDER_STATUS_TRANSITIONS["cancelled"] == set()
+    assert ORDER_STATUS_TRANSITIONS["returned"] == set()
+
+
+def test_every_status_reaches_a_terminal_status():
+    terminal = {status for status, targets in ORDER_STATUS_TRANSITIONS.items() if not targets}
+    for status in ORDER_STATUS_TRANSITIONS:
+        seen, stack = set(), [status]
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            stack.extend(ORDER_STATUS_TRANSITIONS[current])
+        assert seen & terminal, status
+
+
+def test_in_transit_is_tracked_like_shipped():
+    assert "in_transit" in TRACKED_STATUSES
+    assert DELIVERY_STATUS_BY_ORDER_STATUS["in_transit"] == DELIVERY_STATUS_BY_ORDER_STATUS["shipped"]
+    assert set(TRACKED_STATUSES) <= set(ORDER_STATUS_TRANSITIONS)
+    assert set(DELIVERY_STATUS_BY_ORDER_STATUS) <= set(ORDER_STATUS_TRANSITIONS)
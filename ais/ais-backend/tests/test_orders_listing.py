@@ -0,0 +1,70 @@
+"""Список заказов АИС: фиксированное число запросов на страницу"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app.crud.orders import query_orders
+
+
+@pytest.fixture
+def statements(pg_db):
+    """SQL-операторы, выполненные через сессию теста"""
+    executed = []
+    connection = pg_db.connection()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(connection, "before_cursor_execute", record)
+    yield executed
+    event.remove(connection, "before_cursor_execute", record)
+
+
+def _make_orders(make_order, make_user, make_product, count):
+    named = make_user("named", full_name="Иван Петров")
+    anonymous = make_user("anonymous")
+    product = make_product("Семга")
+    started = datetime(2026, 10, 1, 9, 0)
+    for index in range(count):
+        make_order(
+            user_id=named if index % 2 else anonymous,
+            created_at=started + timedelta(hours=index),
+            items=[(product, 1, 100.0, None), (product, 2, 50.0, "Семга слабосоленая")] if index % 3 else ()
+        )
+
+
+@pytest.mark.parametrize("count", [3, 30])
+def test_page_query_count_does_not_depend_on_orders(pg_db, make_order, make_user, make_product, statements, count):
+    _make_orders(make_order, make_user, make_product, count)
+    statements.clear()
+
+    orders, _ = query_orders(pg_db, limit=100)
+
+    assert len(orders) == count
+    # Заказы с пользователями и товары всей страницы
+    assert len(statements) == 2
+
+
+def test_page_fills_customer_names_and_items(pg_db, make_order, make_user, make_product):
+    _make_orders(make_order, make_user, make_product, 6)
+
+    orders, _ = query_orders(pg_db, limit=100, sort_by="created_at_asc")
+
+    assert [order["customer_name"] for order in orders[:2]] == ["anonymous", "Иван Петров"]
+    with_items = orders[1]
+    assert [item["name"] for item in with_items["items"]] == ["Семга", "Семга слабосоленая"]
+    assert with_items["items"] == with_items["order_items"]
+    # Заказ без позиций получает заглушку на всю сумму
+    without_items = orders[0]
+    assert len(without_items["items"]) == 1
+    assert without_items["items"][0]["price"] == without_items["total_price"]
+
+
+def test_client_name_from_order_wins(pg_db, make_order):
+    make_order(client_name="Покупатель с витрины")
+
+    orders, _ = query_orders(pg_db, limit=10)
+
+    assert orders[0]["customer_name"] == "Покупатель с витрины"
@@ -0,0 +1,115 @@
+"""Курсорная пагинация и проекция полей списка заказов"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.crud.orders import ORDER_SORT_KEYS, query_orders
+from app.database import get_db
+from app.routers import orders as orders_router
+from app.routers.auth import get_current_user_optional
+from app.utils.pagination import InvalidCursorError, after_clause, decode_cursor, encode_cursor
+
+
+@pytest.mark.parametrize("value", [
+    datetime(2026, 10, 18, 12, 30, 15, 250000),
+    date(2026, 10, 18),
+    None,
+    1234.5,
+    "текст",
+])
+def test_cursor_round_trip(value):
+    cursor = encode_cursor("created_at", value, 42)
+    assert decode_cursor(cursor, "created_at") == (value, 42)
+
+
+def test_cursor_for_other_sort_is_rejected():
+    cursor = encode_cursor("created_at", None, 1)
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, "total_price")
+
+
+@pytest.mark.parametrize("cursor", ["", "не-base64", "eyJ4IjoxfQ"])
+def test_damaged_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, "created_at")
+
+
+@pytest.mark.parametrize("descending, value, expected", [
+    (False, None, "(o.created_at IS NULL AND o.id > :cursor_id)"),
+    (True, None, "((o.created_at IS NULL AND o.id < :cursor_id) OR o.created_at IS NOT NULL)"),
+    (False, 1, "(o.created_at > :cursor_value OR (o.created_at = :cursor_value AND o.id > :cursor_id)"
+               " OR o.created_at IS NULL)"),
+    (True, 1, "(o.created_at < :cursor_value OR (o.created_at = :cursor_value AND o.id < :cursor_id))"),
+])
+def test_after_clause(descending, value, expected):
+    assert after_clause("o.created_at", "o.id", descending, value) == expected
+
+
+@pytest.fixture
+def mixed_orders(pg_db, make_order):
+    """Заказы с одинаковыми датами и суммами и заказы без даты создания"""
+    # В схеме миграций created_at NOT NULL, но в старых базах встречается NULL
+    pg_db.execute(text("ALTER TABLE orders ALTER COLUMN created_at DROP NOT NULL"))
+    started = datetime(2026, 10, 1, 9, 0)
+    for index in range(11):
+        created_at = None if index % 4 == 0 else started + timedelta(hours=index // 2)
+        make_order(created_at=created_at, total_price=float(100 * (index % 3)))
+
+
+def _walk(db, sort_by, limit):
+    ids, cursor = [], None
+    while True:
+        orders, cursor = query_orders(db, limit=limit, sort_by=sort_by, cursor=cursor, fields={"id"})
+        ids.extend(order["id"] for order in orders)
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize("sort_by", sorted(ORDER_SORT_KEYS))
+@pytest.mark.parametrize("limit", [1, 2, 4])
+def test_cursor_pages_match_single_query(pg_db, mixed_orders, sort_by, limit):
+    expected = [order["id"] for order in query_orders(pg_db, sort_by=sort_by, fields={"id"})[0]]
+    assert len(expected) == 11
+    assert _walk(pg_db, sort_by, limit) == expected
+
+
+def test_cursor_ignores_offset(pg_db, mixed_orders):
+    first, cursor = query_orders(pg_db, limit=3, fields={"id"})
+    second, _ = query_orders(pg_db, limit=3, cursor=cursor, offset=5, fields={"id"})
+    expected = [order["id"] for order in query_orders(pg_db, fields={"id"})[0]]
+    assert [order["id"] for order in first + second] == expected[:6]
+
+
+def test_projection_skips_items(pg_db, make_order, make_product):
+    product = make_product("Икра")
+    make_order(items=[(product, 1, 100.0, None)])
+
+    orders, _ = query_orders(pg_db, limit=10, fields={"status", "total_price"})
+
+    assert orders == [{"id": orders[0]["id"], "status": "pending", "total_price": 100.0}]
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(orders_router.router)
+    app.dependency_overrides[get_db] = lambda: None
+    app.dependency_overrides[get_current_user_optional] = lambda: None
+    return TestClient(app)
+
+
+def test_unknown_fields_are_rejected(client):
+    response = client.get("/orders/", params={"fields": "id,status,password,items"})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Неизвестные поля заказа: password"
+
+
+def test_damaged_cursor_is_bad_request(client):
+    response = client.get("/orders/", params={"cursor": "не-курсор"})
+
+    assert response.status_code == 400
@@ -1,8 +1,21 @@
 import os
+import asyncio
+import base64
+import json
 import logging
+import random
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
 import httpx
-from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi import FastAPI, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from starlette.background import BackgroundTask
 
@@ -22,6 +35,74 @@ SEVER_RYBA_API = os.getenv("SEVER_FISH_URL", "http://sever-fish-backend:8000")
 logger.info(f"AIS API URL: {AIS_API}")
 logger.info(f"SEVER RYBA API URL: {SEVER_RYBA_API}")
 
+# Настройки пула соединений к бэкендам
+UPSTREAM_TIMEOUT = float(os.getenv("GATEWAY_UPSTREAM_TIMEOUT", "30.0"))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("GATEWAY_CONNECT_TIMEOUT", "5.0"))
+UPSTREAM_POOL_TIMEOUT = float(os.getenv("GATEWAY_POOL_TIMEOUT", "5.0"))
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("GATEWAY_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("GATEWAY_MAX_KEEPALIVE_CONNECTIONS", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("GATEWAY_KEEPALIVE_EXPIRY", "30.0"))
+
+# Потоковая передача тел запросов и ответов без буферизации в памяти шлюза
+STREAMING_ENABLED = os.getenv("GATEWAY_STREAMING", "true").lower() == "true"
+
+# Заголовки, относящиеся к конкретному соединению, не передаются дальше
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "trailers", "transfer-encoding", "upgrade",
+}
+
+
+def env_list(name: str, default: str) -> List[str]:
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+
+# Настройки кэша ответов для GET-запросов каталога
+CACHE_ENABLED = os.getenv("GATEWAY_CACHE_ENABLED", "true").lower() == "true"
+CACHE_TTL = int(os.getenv("GATEWAY_CACHE_TTL", "60"))
+# Сколько устаревшая запись хранится для повторной проверки по ETag
+CACHE_STALE_TTL = int(os.getenv("GATEWAY_CACHE_STALE_TTL", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("GATEWAY_CACHE_MAX_ENTRIES", "1000"))
+CACHE_MAX_BODY_BYTES = int(os.getenv("GATEWAY_CACHE_MAX_BODY_BYTES", str(1024 * 1024)))
+CACHE_PREFIXES = env_list("GATEWAY_CACHE_PREFIXES", "/sever-ryba/products,/sever-ryba/api/products")
+CACHE_VARY_HEADERS = [h.lower() for h in env_list("GATEWAY_CACHE_VARY_HEADERS", "accept,accept-language")]
+# Общий кэш для нескольких экземпляров шлюза (Redis или совместимый сервер)
+CACHE_REDIS_URL = os.getenv("GATEWAY_CACHE_REDIS_URL", "")
+
+# Настройки отказоустойчивости обращений к бэкендам
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("GATEWAY_BREAKER_FAILURES", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("GATEWAY_BREAKER_RESET_TIMEOUT", "30"))
+RETRY_MAX_ATTEMPTS = int(os.getenv("GATEWAY_MAX_RETRIES", "2"))
+RETRY_BACKOFF = float(os.getenv("GATEWAY_RETRY_BACKOFF", "0.05"))
+# Повторы разрешены в пределах доли от числа запросов за окно (но не меньше минимума)
+RETRY_BUDGET_RATIO = float(os.getenv("GATEWAY_RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MIN = int(os.getenv("GATEWAY_RETRY_BUDGET_MIN", "10"))
+RETRY_BUDGET_WINDOW = float(os.getenv("GATEWAY_RETRY_BUDGET_WINDOW", "10"))
+RETRY_STATUS_CODES = {int(code) for code in env_list("GATEWAY_RETRY_STATUS_CODES", "502,503,504")}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# Дублирующий GET-запрос, если ответ не пришел за указанный перцентиль задержки
+HEDGE_ENABLED = os.getenv("GATEWAY_HEDGE_ENABLED", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("GATEWAY_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("GATEWAY_HEDGE_MIN_SAMPLES", "20"))
+LATENCY_HISTORY_SIZE = int(os.getenv("GATEWAY_LATENCY_HISTORY_SIZE", "200"))
+# Таймауты по префиксам путей шлюза: "/ais/analytics=120,/sever-ryba/products=5"
+ROUTE_TIMEOUTS = sorted(
+    (
+        (prefix.strip(), float(seconds))
+        for prefix, _, seconds in (item.partition("=") for item in env_list("GATEWAY_ROUTE_TIMEOUTS", ""))
+    ),
+    key=lambda item: len(item[0]),
+    reverse=True,
+)
+
+# Фоновая проверка состояния бэкендов для /health
+HEALTH_CHECK_INTERVAL = float(os.getenv("GATEWAY_HEALTH_INTERVAL", "10"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("GATEWAY_HEALTH_TIMEOUT", "5"))
+HEALTH_HISTORY_SIZE = int(os.getenv("GATEWAY_HEALTH_HISTORY_SIZE", "20"))
+
+# Токен для служебных операций шлюза (сброс кэша); пустой — без проверки
+GATEWAY_ADMIN_TOKEN = os.getenv("GATEWAY_ADMIN_TOKEN", "")
+
 app = FastAPI(
     title="NF API Gateway",
     description="API Gateway для системы NF, объединяющий АИС и Север-Рыба",
@@ -52,35 +133,604 @@ app.add_middleware(
 )
 
 
+class CircuitOpenError(Exception):
+    """Бэкенд временно исключен из обращений после серии ошибок"""
+
+    def __init__(self, upstream: str, retry_after: int):
+        super().__init__(f"Сервис {upstream} временно недоступен (circuit breaker открыт)")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Размыкатель цепи для бэкенда: после BREAKER_FAILURE_THRESHOLD ошибок подряд
+    запросы сразу отклоняются, через BREAKER_RESET_TIMEOUT пропускается один пробный
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < BREAKER_RESET_TIMEOUT:
+                self.rejected += 1
+                return False
+            self.state = "half_open"
+            self.probe_in_flight = False
+            logger.info(f"Circuit breaker {self.name}: пробный запрос")
+        if self.state == "half_open":
+            if self.probe_in_flight:
+                self.rejected += 1
+                return False
+            self.probe_in_flight = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        if self.state != "closed":
+            logger.info(f"Circuit breaker {self.name}: соединение восстановлено")
+        self.state = "closed"
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or (self.state == "closed" and self.failures >= BREAKER_FAILURE_THRESHOLD):
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+            logger.warning(f"Circuit breaker {self.name} открыт после {self.failures} ошибок")
+
+    def release_probe(self):
+        self.probe_in_flight = False
+
+    def retry_after(self) -> int:
+        return max(1, int(BREAKER_RESET_TIMEOUT - (time.monotonic() - self.opened_at)))
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "retry_after": self.retry_after() if self.state == "open" else 0,
+        }
+
+
+class RetryBudget:
+    """Ограничивает долю повторных запросов, чтобы повторы не усиливали перегрузку бэкенда"""
+
+    def __init__(self):
+        self.requests: deque = deque()
+        self.retries: deque = deque()
+        self.exhausted = 0
+
+    def _trim(self, now: float):
+        for events in (self.requests, self.retries):
+            while events and now - events[0] > RETRY_BUDGET_WINDOW:
+                events.popleft()
+
+    def record_request(self):
+        now = time.monotonic()
+        self._trim(now)
+        self.requests.append(now)
+
+    def try_acquire(self) -> bool:
+        now = time.monotonic()
+        self._trim(now)
+        if len(self.retries) < max(RETRY_BUDGET_MIN, RETRY_BUDGET_RATIO * len(self.requests)):
+            self.retries.append(now)
+            return True
+        self.exhausted += 1
+        return False
+
+    def snapshot(self) -> Dict[str, object]:
+        self._trim(time.monotonic())
+        return {
+            "requests_in_window": len(self.requests),
+            "retries_in_window": len(self.retries),
+            "exhausted": self.exhausted,
+        }
+
+
+class UpstreamClient:
+    """
+    Долгоживущий HTTP-клиент к одному бэкенду с пулом keep-alive соединений.
+    Клиент создается при старте шлюза и закрывается при остановке.
+    """
+
+    def __init__(self, name: str, base_url: str):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.client: Optional[httpx.AsyncClient] = None
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_requests = 0
+        self.retries = 0
+        self.hedged = 0
+        self.breaker = CircuitBreaker(name)
+        self.retry_budget = RetryBudget()
+        self.latencies: deque = deque(maxlen=LATENCY_HISTORY_SIZE)
+
+    async def start(self):
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                UPSTREAM_TIMEOUT,
+                connect=UPSTREAM_CONNECT_TIMEOUT,
+                pool=UPSTREAM_POOL_TIMEOUT,
+            ),
+            limits=httpx.Limits(
+                max_connections=UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+                keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+            ),
+            # Клиент общий для всех пользователей: cookie из ответов не должны
+            # сохраняться в нем, они передаются только через заголовки
+            cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+        )
+        logger.info(
+            f"Пул соединений к {self.name} создан: max_connections={UPSTREAM_MAX_CONNECTIONS}, "
+            f"keepalive={UPSTREAM_MAX_KEEPALIVE}, expiry={UPSTREAM_KEEPALIVE_EXPIRY}s"
+        )
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+            logger.info(f"Пул соединений к {self.name} закрыт")
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path}"
+
+    def acquire(self) -> httpx.AsyncClient:
+        """Учитывает начало запроса в метриках занятости пула"""
+        self.in_flight += 1
+        self.total_requests += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return self.client
+
+    def release(self):
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def track(self):
+        """Учитывает запрос в метриках занятости пула на время его выполнения"""
+        client = self.acquire()
+        try:
+            yield client
+        finally:
+            self.release()
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+
+    def resilience(self) -> Dict[str, object]:
+        return {
+            "circuit": self.breaker.snapshot(),
+            "retry_budget": self.retry_budget.snapshot(),
+            "retries": self.retries,
+            "hedged": self.hedged,
+        }
+
+    def metrics(self) -> Dict[str, object]:
+        # httpx не предоставляет публичного API для состояния пула,
+        # поэтому читаем его из транспорта httpcore, если он доступен
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        idle = sum(1 for conn in connections if conn.is_idle())
+        return {
+            "base_url": self.base_url,
+            "open": self.client is not None,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "total_requests": self.total_requests,
+            "connections": len(connections),
+            "idle_connections": idle,
+            "active_connections": len(connections) - idle,
+            "max_connections": UPSTREAM_MAX_CONNECTIONS,
+            "max_keepalive_connections": UPSTREAM_MAX_KEEPALIVE,
+        }
+
+
+upstreams: Dict[str, UpstreamClient] = {
+    "ais": UpstreamClient("ais", AIS_API),
+    "sever_ryba": UpstreamClient("sever_ryba", SEVER_RYBA_API),
+}
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    directives = {}
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, argument = part.partition("=")
+        directives[name.strip().lower()] = argument.strip().strip('"') or None
+    return directives
+
+
+@dataclass
+class CachedResponse:
+    """Ответ бэкенда, сохраненный в кэше шлюза"""
+    status_code: int
+    headers: List[Tuple[str, str]]
+    body: bytes
+    etag: Optional[str]
+    stored_at: float
+    expires_at: float
+
+    def is_fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    def refreshed(self, ttl: int) -> "CachedResponse":
+        now = time.time()
+        return CachedResponse(self.status_code, self.headers, self.body, self.etag, now, now + ttl)
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data["body"] = base64.b64encode(self.body).decode("ascii")
+        return json.dumps(data)
+
+    @classmethod
+    def from_json(cls, raw) -> "CachedResponse":
+        data = json.loads(raw)
+        data["body"] = base64.b64decode(data["body"])
+        data["headers"] = [tuple(pair) for pair in data["headers"]]
+        return cls(**data)
+
+
+class MemoryCacheBackend:
+    """Кэш в памяти процесса с вытеснением давно не использованных записей (LRU)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() > entry.expires_at + CACHE_STALE_TTL:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: CachedResponse):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def purge(self, prefix: str) -> int:
+        keys = [key for key in self._entries if key.startswith(prefix)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    async def close(self):
+        self._entries.clear()
+
+    def info(self) -> Dict[str, object]:
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+        }
+
+
+class RedisCacheBackend:
+    """
+    Общий кэш в Redis. Вытеснение по LRU выполняет сам сервер
+    (maxmemory-policy allkeys-lru), локально для разработки подходит любой
+    совместимый сервер
+    """
+
+    namespace = "gateway:cache:"
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis  # необязательная зависимость
+
+        self.url = url
+        self._redis = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        raw = await self._redis.get(self.namespace + key)
+        return CachedResponse.from_json(raw) if raw else None
+
+    async def set(self, key: str, entry: CachedResponse):
+        ttl = max(1, int(entry.expires_at - time.time()) + CACHE_STALE_TTL)
+        await self._redis.set(self.namespace + key, entry.to_json(), ex=ttl)
+
+    async def purge(self, prefix: str) -> int:
+        pattern = self.namespace + "".join(
+            f"\\{char}" if char in "*?[]\\" else char for char in prefix
+        ) + "*"
+        purged = 0
+        async for key in self._redis.scan_iter(match=pattern, count=500):
+            purged += await self._redis.delete(key)
+        return purged
+
+    async def close(self):
+        await self._redis.aclose()
+
+    def info(self) -> Dict[str, object]:
+        return {"backend": "redis", "url": self.url}
+
+
+class ResponseCache:
+    """
+    Кэш ответов на анонимные GET-запросы каталога.
+    Ключ строится из пути, параметров запроса, метода и заголовков из CACHE_VARY_HEADERS;
+    путь стоит первым, чтобы записи можно было сбрасывать по префиксу
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "stores": 0, "purged": 0, "errors": 0}
+
+    def matching_prefix(self, path: str) -> Optional[str]:
+        for prefix in CACHE_PREFIXES:
+            if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+                return prefix
+        return None
+
+    def is_cacheable_request(self, request: Request) -> bool:
+        return (
+            CACHE_ENABLED
+            and request.method == "GET"
+            and "authorization" not in request.headers
+            and self.matching_prefix(request.url.path) is not None
+        )
+
+    def key(self, request: Request) -> str:
+        query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+        vary = "&".join(f"{name}={request.headers.get(name, '')}" for name in CACHE_VARY_HEADERS)
+        return f"{request.url.path}?{query}|{request.method}|{vary}"
+
+    def response_ttl(self, response: httpx.Response) -> Optional[int]:
+        """Время жизни записи с учетом Cache-Control и Vary бэкенда; None — не кэшировать"""
+        if response.status_code != 200 or "set-cookie" in response.headers:
+            return None
+        if len(response.content) > CACHE_MAX_BODY_BYTES:
+            return None
+        vary = {h.strip().lower() for h in response.headers.get("vary", "").split(",") if h.strip()}
+        if "*" in vary or not vary <= set(CACHE_VARY_HEADERS) | {"accept-encoding", "origin"}:
+            return None
+        directives = parse_cache_control(response.headers.get("cache-control"))
+        if "no-store" in directives or "private" in directives:
+            return None
+        if "no-cache" in directives:
+            # Хранить имеет смысл только для повторной проверки по ETag
+            return 0 if "etag" in response.headers else None
+        for name in ("s-maxage", "max-age"):
+            value = directives.get(name)
+            if value and value.isdigit():
+                return int(value)
+        return CACHE_TTL
+
+    def response_ttl_for_revalidation(self, response: httpx.Response) -> int:
+        """Новое время жизни записи после ответа 304 от бэкенда"""
+        directives = parse_cache_control(response.headers.get("cache-control"))
+        for name in ("s-maxage", "max-age"):
+            value = directives.get(name)
+            if value and value.isdigit():
+                return int(value)
+        return 0 if "no-cache" in directives else CACHE_TTL
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        try:
+            return await self.backend.get(key)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Ошибка чтения из кэша ответов: {e}")
+            return None
+
+    async def put(self, key: str, entry: CachedResponse):
+        try:
+            await self.backend.set(key, entry)
+            self.stats["stores"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Ошибка записи в кэш ответов: {e}")
+
+    async def store(self, key: str, response: httpx.Response) -> Optional[CachedResponse]:
+        ttl = self.response_ttl(response)
+        if ttl is None:
+            return None
+        now = time.time()
+        headers = [
+            (name, value) for name, value in response.headers.multi_items()
+            if name.lower() not in HOP_BY_HOP_HEADERS
+            and name.lower() not in {"content-length", "content-encoding", "set-cookie", "age", "date"}
+        ]
+        entry = CachedResponse(
+            status_code=response.status_code,
+            headers=headers,
+            body=response.content,
+            etag=response.headers.get("etag"),
+            stored_at=now,
+            expires_at=now + ttl,
+        )
+        await self.put(key, entry)
+        return entry
+
+    async def purge(self, prefix: str) -> int:
+        try:
+            purged = await self.backend.purge(prefix)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Ошибка сброса кэша ответов по префиксу {prefix}: {e}")
+            return 0
+        self.stats["purged"] += purged
+        logger.info(f"Сброшено {purged} записей кэша по префиксу {prefix}")
+        return purged
+
+    def metrics(self) -> Dict[str, object]:
+        return {"enabled": CACHE_ENABLED, **self.backend.info(), **self.stats}
+
+
+response_cache = ResponseCache(MemoryCacheBackend(CACHE_MAX_ENTRIES))
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных запросов: первый выполняет обращение
+    к бэкенду, остальные ждут и получают тот же результат
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.stats = {"leaders": 0, "collapsed": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        task = self._calls.get(key)
+        if task is not None:
+            self.stats["collapsed"] += 1
+        else:
+            self.stats["leaders"] += 1
+            # Отдельная задача: отключение первого клиента не отменяет запрос для остальных
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # исключение уже передано ожидающим
+
+    def metrics(self) -> Dict[str, object]:
+        return {**self.stats, "in_flight": len(self._calls)}
+
+
+single_flight = SingleFlight()
+
+
+@app.on_event("startup")
+async def startup_event():
+    """Создание пулов соединений к бэкендам и подключение общего кэша"""
+    for upstream in upstreams.values():
+        await upstream.start()
+
+    if CACHE_ENABLED and CACHE_REDIS_URL:
+        try:
+            response_cache.backend = RedisCacheBackend(CACHE_REDIS_URL)
+            logger.info(f"Кэш ответов использует Redis: {CACHE_REDIS_URL}")
+        except ImportError:
+            logger.warning("Пакет redis не установлен, используется кэш в памяти")
+
+    health_monitor.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Закрытие пулов соединений к бэкендам"""
+    await health_monitor.stop()
+    for upstream in upstreams.values():
+        await upstream.close()
+    await response_cache.backend.close()
+
+
 # Функция для проверки работоспособности сервисов
-async def check_services():
-    services_status = {}
-    
-    # Проверка АИС
+async def probe_service(upstream: UpstreamClient) -> Dict[str, object]:
+    started = time.monotonic()
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{AIS_API}/health", timeout=5.0)
-            services_status["ais"] = {
-                "status": "online" if response.status_code == 200 else "error",
-                "message": response.json() if response.status_code == 200 else str(response.status_code)
-            }
+        response = await upstream.client.get(upstream.url("health"), timeout=HEALTH_CHECK_TIMEOUT)
+        result = {
+            "status": "online" if response.status_code == 200 else "error",
+            "message": response.json() if response.status_code == 200 else str(response.status_code)
+        }
     except Exception as e:
-        services_status["ais"] = {"status": "offline", "message": str(e)}
-        logger.error(f"Ошибка при проверке AIS: {e}")
-    
-    # Проверка Север-Рыба
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{SEVER_RYBA_API}/health", timeout=5.0)
-            services_status["sever_ryba"] = {
-                "status": "online" if response.status_code == 200 else "error",
-                "message": response.json() if response.status_code == 200 else str(response.status_code)
+        result = {"status": "offline", "message": str(e)}
+        logger.error(f"Ошибка при проверке {upstream.name}: {e}")
+    result["latency_ms"] = round((time.monotonic() - started) * 1000, 1)
+    return result
+
+
+async def check_services() -> Dict[str, Dict[str, object]]:
+    """Параллельная проверка всех бэкендов через общие пулы соединений"""
+    results = await asyncio.gather(*(probe_service(upstream) for upstream in upstreams.values()))
+    return dict(zip(upstreams.keys(), results))
+
+
+class HealthMonitor:
+    """
+    Периодически опрашивает бэкенды в фоне и хранит последний снимок состояния,
+    поэтому /health отвечает без обращения к бэкендам
+    """
+
+    def __init__(self):
+        self.snapshot: Dict[str, Dict[str, object]] = {}
+        self.checked_at: Optional[float] = None
+        self.history: Dict[str, deque] = {name: deque(maxlen=HEALTH_HISTORY_SIZE) for name in upstreams}
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def refresh(self):
+        async with self._lock:
+            self.snapshot = await check_services()
+            self.checked_at = time.time()
+            checked_at = datetime.fromtimestamp(self.checked_at, timezone.utc).isoformat()
+            for name, result in self.snapshot.items():
+                self.history[name].append({
+                    "checked_at": checked_at,
+                    "status": result["status"],
+                    "latency_ms": result["latency_ms"],
+                })
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Ошибка фоновой проверки сервисов: {e}")
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def report(self) -> Dict[str, object]:
+        if self.checked_at is None:
+            # Первый запрос до завершения фоновой проверки
+            await self.refresh()
+        age = time.time() - self.checked_at
+        services = {}
+        for name, result in self.snapshot.items():
+            latencies = [item["latency_ms"] for item in self.history[name]]
+            services[name] = {
+                **result,
+                "latency_ms_avg": round(sum(latencies) / len(latencies), 1) if latencies else None,
+                "history": list(self.history[name]),
             }
-    except Exception as e:
-        services_status["sever_ryba"] = {"status": "offline", "message": str(e)}
-        logger.error(f"Ошибка при проверке Север-Рыба: {e}")
-    
-    return services_status
+        return {
+            "checked_at": datetime.fromtimestamp(self.checked_at, timezone.utc).isoformat(),
+            "age_seconds": round(age, 1),
+            "stale": age > HEALTH_CHECK_INTERVAL * 2 + HEALTH_CHECK_TIMEOUT,
+            "services": services,
+        }
+
+
+health_monitor = HealthMonitor()
 
 
 @app.get("/")
@@ -90,66 +740,400 @@ async def read_root():
 
 @app.get("/health")
 async def health_check():
-    services_status = await check_services()
+    report = await health_monitor.report()
     return {
         "gateway": "online",
-        "services": services_status
+        **report,
+        "upstreams": {name: upstream.resilience() for name, upstream in upstreams.items()},
+    }
+
+
+@app.get("/metrics")
+async def gateway_metrics():
+    """Метрики занятости пулов соединений к бэкендам"""
+    return {
+        "pools": {name: upstream.metrics() for name, upstream in upstreams.items()},
+        "upstreams": {name: upstream.resilience() for name, upstream in upstreams.items()},
+        "cache": response_cache.metrics(),
+        "coalescing": single_flight.metrics(),
     }
 
 
+@app.post("/cache/purge")
+async def purge_cache(prefix: str, x_gateway_token: Optional[str] = Header(None)):
+    """Сброс записей кэша ответов по префиксу пути шлюза, например /sever-ryba/products"""
+    if GATEWAY_ADMIN_TOKEN and x_gateway_token != GATEWAY_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Недостаточно прав для сброса кэша")
+    if not prefix.startswith("/"):
+        raise HTTPException(status_code=400, detail="Префикс должен начинаться с /")
+    return {"prefix": prefix, "purged": await response_cache.purge(prefix)}
+
+
 # Проксирование запросов в АИС
 @app.api_route("/ais/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
 async def ais_proxy(request: Request, path: str):
-    target_url = f"{AIS_API}/{path}"
-    logger.info(f"Проксирование запроса в АИС: {request.method} {target_url}")
-    return await proxy_request(target_url, request)
+    upstream = upstreams["ais"]
+    logger.info(f"Проксирование запроса в АИС: {request.method} {upstream.url(path)}")
+    return await proxy_request(upstream, path, request)
 
 
 # Проксирование запросов в Север-Рыба
 @app.api_route("/sever-ryba/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
 async def sever_ryba_proxy(request: Request, path: str):
-    target_url = f"{SEVER_RYBA_API}/{path}"
-    logger.info(f"Проксирование запроса в Север-Рыба: {request.method} {target_url}")
-    return await proxy_request(target_url, request)
+    upstream = upstreams["sever_ryba"]
+    logger.info(f"Проксирование запроса в Север-Рыба: {request.method} {upstream.url(path)}")
+    return await proxy_request(upstream, path, request)
+
+
+def forward_headers(request: Request) -> Dict[str, str]:
+    """Заголовки входящего запроса для передачи в бэкенд"""
+    headers = {
+        key: value for key, value in request.headers.items()
+        if key.lower() not in HOP_BY_HOP_HEADERS
+    }
+    headers.pop("host", None)  # Убираем заголовок host, чтобы не было конфликта
+    return headers
+
+
+def copy_response_headers(target: Response, source: httpx.Headers, exclude: set):
+    """
+    Копирует заголовки ответа бэкенда, сохраняя повторяющиеся (например, Set-Cookie)
+    """
+    for key, value in source.multi_items():
+        if key.lower() in HOP_BY_HOP_HEADERS or key.lower() in exclude:
+            continue
+        target.raw_headers.append((key.lower().encode("latin-1"), value.encode("latin-1")))
+
+
+def request_has_body(request: Request) -> bool:
+    return "content-length" in request.headers or "transfer-encoding" in request.headers
+
+
+def upstream_error_response(target_url: str, exc: Exception) -> Response:
+    if isinstance(exc, CircuitOpenError):
+        logger.warning(f"Запрос к {target_url} отклонен: {exc}")
+        return Response(
+            content=str(exc).encode(),
+            status_code=503,
+            headers={"retry-after": str(exc.retry_after)}
+        )
+    logger.error(f"Ошибка при запросе к {target_url}: {exc}")
+    return Response(
+        content=f"Ошибка при запросе к сервису: {exc}".encode(),
+        status_code=503
+    )
+
+
+def route_timeout(path: str) -> httpx.Timeout:
+    """Таймаут чтения для пути шлюза с учетом GATEWAY_ROUTE_TIMEOUTS"""
+    seconds = UPSTREAM_TIMEOUT
+    for prefix, value in ROUTE_TIMEOUTS:
+        if path.startswith(prefix):
+            seconds = value
+            break
+    return httpx.Timeout(seconds, connect=UPSTREAM_CONNECT_TIMEOUT, pool=UPSTREAM_POOL_TIMEOUT)
+
+
+async def timed_send(upstream: UpstreamClient, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+    started = time.monotonic()
+    response = await send()
+    upstream.latencies.append(time.monotonic() - started)
+    return response
+
+
+async def hedged_send(upstream: UpstreamClient, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+    """
+    Если ответ не пришел за HEDGE_PERCENTILE-перцентиль задержки, отправляет
+    дублирующий запрос и возвращает первый успешный ответ
+    """
+    delay = upstream.latency_percentile(HEDGE_PERCENTILE)
+    if delay is None:
+        return await timed_send(upstream, send)
+
+    primary = asyncio.ensure_future(timed_send(upstream, send))
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done or not upstream.retry_budget.try_acquire():
+        return await primary
+
+    upstream.hedged += 1
+    tasks = [primary, asyncio.ensure_future(timed_send(upstream, send))]
+    winner: Optional[httpx.Response] = None
+    error: Optional[BaseException] = None
+    try:
+        pending = set(tasks)
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    winner = task.result()
+                    break
+                error = task.exception()
+        if winner is None:
+            raise error
+        return winner
+    finally:
+        # Проигравший запрос отменяется, а уже полученный ответ закрывается
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for task in tasks:
+            if task.cancelled() or task.exception() is not None:
+                continue
+            if task.result() is not winner:
+                await task.result().aclose()
+
+
+async def call_upstream(
+    upstream: UpstreamClient,
+    method: str,
+    send: Callable[[], Awaitable[httpx.Response]],
+    replayable: bool,
+) -> httpx.Response:
+    """
+    Выполняет запрос через circuit breaker бэкенда. Идемпотентные запросы с
+    повторяемым телом повторяются при сетевых ошибках и ответах из
+    RETRY_STATUS_CODES, пока это позволяет бюджет повторов
+    """
+    breaker = upstream.breaker
+    if not breaker.allow():
+        raise CircuitOpenError(upstream.name, breaker.retry_after())
+    upstream.retry_budget.record_request()
+    replayable = replayable and method in IDEMPOTENT_METHODS
+
+    def can_retry(attempt: int) -> bool:
+        return (
+            replayable
+            and attempt < RETRY_MAX_ATTEMPTS
+            and breaker.state == "closed"
+            and upstream.retry_budget.try_acquire()
+        )
+
+    attempt = 0
+    try:
+        while True:
+            try:
+                if HEDGE_ENABLED and method == "GET" and replayable:
+                    response = await hedged_send(upstream, send)
+                else:
+                    response = await timed_send(upstream, send)
+            except httpx.RequestError as exc:
+                breaker.record_failure()
+                if not can_retry(attempt):
+                    raise
+                logger.warning(f"Повтор запроса к {upstream.name} после ошибки: {exc}")
+            else:
+                if response.status_code not in RETRY_STATUS_CODES:
+                    breaker.record_success()
+                    return response
+                breaker.record_failure()
+                if not can_retry(attempt):
+                    return response
+                logger.warning(f"Повтор запроса к {upstream.name} после ответа {response.status_code}")
+                await response.aclose()
+
+            attempt += 1
+            upstream.retries += 1
+            await asyncio.sleep(RETRY_BACKOFF * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+    finally:
+        breaker.release_probe()
 
 
 # Универсальная функция проксирования запросов
-async def proxy_request(target_url: str, request: Request):
-    client = httpx.AsyncClient(timeout=30.0)  # Увеличиваем таймаут
-    
+async def proxy_request(upstream: UpstreamClient, path: str, request: Request):
+    if response_cache.is_cacheable_request(request):
+        return await cached_request(upstream, path, request)
+
+    if STREAMING_ENABLED:
+        proxied = await stream_request(upstream, path, request)
+    else:
+        proxied = await buffered_request(upstream, path, request)
+
+    # Успешное изменение каталога через шлюз делает устаревшими его закэшированные страницы
+    prefix = response_cache.matching_prefix(request.url.path)
+    if prefix and request.method not in ("GET", "HEAD", "OPTIONS") and proxied.status_code < 400:
+        await response_cache.purge(prefix)
+    return proxied
+
+
+async def fetch_upstream(
+    upstream: UpstreamClient,
+    path: str,
+    request: Request,
+    extra_headers: Optional[Dict[str, str]] = None,
+) -> httpx.Response:
+    """Выполняет запрос к бэкенду с полной буферизацией ответа"""
+    target_url = upstream.url(path)
+
     # Получение метода, заголовков и тела запроса
     method = request.method
-    headers = dict(request.headers)
-    headers.pop("host", None)  # Убираем заголовок host, чтобы не было конфликта
-    
+    headers = forward_headers(request)
+    # Значение None убирает заголовок из запроса к бэкенду
+    for name, value in (extra_headers or {}).items():
+        if value is None:
+            headers.pop(name, None)
+        else:
+            headers[name] = value
+
     # Получение тела запроса при необходимости
     content = await request.body()
-    
-    try:
-        logger.info(f"Отправка запроса: {method} {target_url}")
-        # Отправка запроса к целевому сервису
-        response = await client.request(
-            method=method,
-            url=target_url,
-            headers=headers,
-            content=content,
-            params=request.query_params,
-            cookies=request.cookies,
-            follow_redirects=True
-        )
-        
-        logger.info(f"Ответ получен: {response.status_code}")
-        # Закрываем клиент после завершения запроса
-        return Response(
-            content=response.content,
-            status_code=response.status_code,
-            headers=dict(response.headers),
-            background=BackgroundTask(client.aclose)
+
+    logger.info(f"Отправка запроса: {method} {target_url}")
+    # Отправка запроса к целевому сервису через общий пул соединений.
+    # Cookie клиента уже переданы в заголовке Cookie
+    async with upstream.track() as client:
+        response = await call_upstream(
+            upstream,
+            method,
+            lambda: client.request(
+                method=method,
+                url=target_url,
+                headers=headers,
+                content=content,
+                params=request.query_params,
+                timeout=route_timeout(request.url.path),
+                follow_redirects=True
+            ),
+            replayable=True,
         )
-    except httpx.RequestError as exc:
-        logger.error(f"Ошибка при запросе к {target_url}: {exc}")
-        return Response(
-            content=f"Ошибка при запросе к сервису: {exc}".encode(),
-            status_code=503,
-            background=BackgroundTask(client.aclose)
-        )
\ No newline at end of file
+    logger.info(f"Ответ получен: {response.status_code}")
+    return response
+
+
+def buffered_response(response: httpx.Response) -> Response:
+    # Тело уже распаковано httpx, поэтому исходные длина и кодировка не подходят
+    proxied = Response(content=response.content, status_code=response.status_code)
+    copy_response_headers(proxied, response.headers, {"content-length", "content-encoding"})
+    return proxied
+
+
+async def buffered_request(upstream: UpstreamClient, path: str, request: Request):
+    """Проксирование с полной буферизацией запроса и ответа"""
+    try:
+        response = await fetch_upstream(upstream, path, request)
+    except (httpx.RequestError, CircuitOpenError) as exc:
+        return upstream_error_response(upstream.url(path), exc)
+    return buffered_response(response)
+
+
+def cached_entry_response(entry: CachedResponse, request: Request, cache_status: str) -> Response:
+    """Ответ из записи кэша; при совпадении If-None-Match клиенту отдается 304"""
+    if entry.etag and entry.etag in {
+        tag.strip() for tag in request.headers.get("if-none-match", "").split(",")
+    }:
+        proxied = Response(status_code=304)
+        copy_response_headers(proxied, httpx.Headers(entry.headers), {"content-type", "content-length"})
+    else:
+        proxied = Response(content=entry.body, status_code=entry.status_code)
+        copy_response_headers(proxied, httpx.Headers(entry.headers), {"content-length"})
+    proxied.headers["age"] = str(max(0, int(time.time() - entry.stored_at)))
+    proxied.headers["x-cache"] = cache_status
+    return proxied
+
+
+async def cached_request(upstream: UpstreamClient, path: str, request: Request):
+    """
+    Проксирование GET-запроса каталога через кэш ответов.
+    Устаревшая запись с ETag проверяется у бэкенда условным запросом, а
+    одинаковые одновременные промахи объединяются в одно обращение к бэкенду;
+    общим становится только ответ, попавший в кэш
+    """
+    key = response_cache.key(request)
+    entry = await response_cache.get(key)
+    client_directives = parse_cache_control(request.headers.get("cache-control"))
+
+    if entry is not None and entry.is_fresh() and "no-cache" not in client_directives:
+        response_cache.stats["hits"] += 1
+        return cached_entry_response(entry, request, "HIT")
+
+    # Условные заголовки клиента не передаются: ответ может достаться и другим
+    # клиентам, а If-None-Match клиента проверяется на стороне шлюза
+    extra_headers = {
+        "if-none-match": entry.etag if entry is not None else None,
+        "if-modified-since": None,
+    }
+
+    led = False
+
+    async def load() -> Tuple[httpx.Response, Optional[CachedResponse]]:
+        nonlocal led
+        led = True
+        response = await fetch_upstream(upstream, path, request, extra_headers)
+        if response.status_code == 304 and extra_headers["if-none-match"]:
+            refreshed = entry.refreshed(response_cache.response_ttl_for_revalidation(response))
+            await response_cache.put(key, refreshed)
+            response_cache.stats["revalidated"] += 1
+            return response, refreshed
+        response_cache.stats["misses"] += 1
+        return response, await response_cache.store(key, response)
+
+    try:
+        response, stored = await single_flight.do(key, load)
+    except (httpx.RequestError, CircuitOpenError) as exc:
+        if entry is not None:
+            # Бэкенд недоступен — отдаем устаревшую запись вместо ошибки
+            logger.warning(f"Отдаем устаревший ответ из кэша для {request.url.path}: {exc}")
+            return cached_entry_response(entry, request, "STALE")
+        return upstream_error_response(upstream.url(path), exc)
+
+    if stored is not None:
+        return cached_entry_response(stored, request, "REVALIDATED" if response.status_code == 304 else "MISS")
+
+    if not led:
+        # Ответ, который нельзя кэшировать (Set-Cookie, private, не 200), может быть
+        # личным для первого клиента: остальные запрашивают бэкенд сами
+        return await buffered_request(upstream, path, request)
+
+    proxied = buffered_response(response)
+    proxied.headers["x-cache"] = "MISS"
+    return proxied
+
+
+async def stream_request(upstream: UpstreamClient, path: str, request: Request):
+    """
+    Потоковое проксирование: тело запроса и ответа передаются по частям,
+    поэтому память шлюза не зависит от размера выгрузок и изображений
+    """
+    target_url = upstream.url(path)
+    method = request.method
+    client = upstream.acquire()
+
+    try:
+        logger.info(f"Отправка потокового запроса: {method} {target_url}")
+        # Эквивалент client.stream(): ответ остается открытым, пока
+        # StreamingResponse не передаст его клиенту целиком
+        headers = forward_headers(request)
+        has_body = request_has_body(request)
+
+        def send():
+            upstream_request = client.build_request(
+                method=method,
+                url=target_url,
+                headers=headers,
+                content=request.stream() if has_body else None,
+                params=request.query_params,
+                timeout=route_timeout(request.url.path),
+            )
+            return client.send(upstream_request, stream=True, follow_redirects=True)
+
+        # Потоковое тело нельзя отправить повторно, поэтому повторы — только для запросов без тела
+        response = await call_upstream(upstream, method, send, replayable=not has_body)
+    except (httpx.RequestError, CircuitOpenError) as exc:
+        upstream.release()
+        return upstream_error_response(target_url, exc)
+    except BaseException:
+        upstream.release()
+        raise
+
+    async def close_upstream_response():
+        await response.aclose()
+        upstream.release()
+
+    logger.info(f"Ответ получен: {response.status_code}")
+    # Тело передается без распаковки, поэтому Content-Encoding и Content-Length сохраняются
+    proxied = StreamingResponse(
+        response.aiter_raw(),
+        status_code=response.status_code,
+        background=BackgroundTask(close_upstream_response),
+    )
+    copy_response_headers(proxied, response.headers, set())
+    return proxied